@@ -1,9 +1,10 @@
 from datetime import datetime, timedelta
 import json
 import csv
+import hashlib
 import os
 import uuid
-from typing import Optional
+from typing import NamedTuple, Optional
 import smtplib
 from email.message import EmailMessage
 from fastapi import (
@@ -11,6 +12,7 @@ from fastapi import (
     HTTPException,
     Depends,
     Header,
+    Query,
     Request,
     UploadFile,
     File,
@@ -24,16 +26,91 @@ import bcrypt
 for _p in ["http_proxy", "https_proxy", "HTTP_PROXY", "HTTPS_PROXY"]:
     os.environ.pop(_p, None)
 import httpx
-from openai import OpenAI
+from openai import BadRequestError, OpenAI
 import redis
 import asyncio
+import heapq
 import re
+import numpy as np
 from html import unescape
 import random
 from backend.app.schemas.resume import ResumeRequest
 from backend.app.schemas.description import DescriptionRequest
 from backend.app.services.resume import generate_resume_text
 from backend.app.services.description import generate_description_text
+from backend.app.services.student_index import (
+    IVF_CENTROIDS_KEY,
+    STUDENT_INDEX_VERSION_KEY,
+    ScoredPool,
+    StudentIndex,
+    claim_writer,
+    embedding_key,
+    encode_embedding,
+    load_student_embeddings,
+    ranked_blocks,
+    save_student_embedding,
+)
+from backend.app.services.candidates import (
+    ELIGIBILITY_KEY,
+    STUDENT_GEO_KEY,
+    UNAFFILIATED_STUDENTS_KEY,
+    add_student_location,
+    applicants_without_profile,
+    eligible_students,
+    institution_students_key,
+    remove_student_location,
+    students_within,
+    update_eligibility,
+)
+from backend.app.services.distance import (
+    DistanceCache,
+    DistanceMatrixClient,
+    beyond_travel_range,
+)
+from backend.app.services.embedding_batcher import EmbeddingBatcher
+from backend.app.services.embedding_cache import EmbeddingCache
+from backend.app.services.score_shards import (
+    gather,
+    scatter,
+    score_request,
+    score_shard,
+    serve_score_task,
+)
+from backend.app.services.match_queue import (
+    INTERACTIVE_LANE,
+    LANES,
+    ack_match_job,
+    enqueue_match,
+    enqueue_reverse_match,
+    get_match_job,
+    heartbeat,
+    next_match_job,
+    requeue_stale,
+    update_match_job,
+)
+from backend.app.services.match_store import (
+    MATCHED_JOBS_KEY,
+    delete_matches,
+    has_matches,
+    init_matched_jobs,
+    load_matches,
+    get_match_state,
+    match_tails,
+    matched_jobs,
+    merge_candidates,
+    migrate_legacy_matches,
+    pool_distances,
+    ranked_pool,
+    record_student_change,
+    remove_candidate,
+    save_match_pool,
+    save_matches,
+    save_pool_distances,
+    student_change_seqs,
+    student_change_watermark,
+    students_changed_since,
+    update_match_pool,
+)
 from backend.app.school_codes import SCHOOL_CODE_MAP
 
 
@@ -85,10 +162,73 @@ if not redis_url:
 
 # Redis connection
 redis_client = redis.Redis.from_url(redis_url, decode_responses=True)
+# Student embeddings are stored as raw float32 bytes and must not be decoded
+redis_bytes = redis.Redis.from_url(redis_url, decode_responses=False)
 
 # Key used to store activity log entries
 ACTIVITY_LOG_KEY = "activity_logs"
 
+EMBEDDING_MODEL = "text-embedding-3-small"
+# Matching scores candidates on this many leading embedding components (unset
+# keeps all 1536). While MATCH_RESCORE_DEPTH is above 0 full vectors are still
+# stored and that many of the best candidates are rescored on them; otherwise
+# embeddings are requested at the reduced size to begin with.
+EMBEDDING_DIMENSIONS = int(os.getenv("EMBEDDING_DIMENSIONS", "0")) or None
+MATCH_RESCORE_DEPTH = int(os.getenv("MATCH_RESCORE_DEPTH", "200"))
+# Store the in-memory student vectors as "float16" or "int8" (unset keeps float32);
+# the best MATCH_RESCORE_DEPTH candidates are then re-ranked on exact vectors
+STUDENT_INDEX_QUANTIZATION = os.getenv("STUDENT_INDEX_QUANTIZATION") or None
+# Score large student pools on this many threads in parallel (0 or 1 keeps one)
+MATCH_SCORING_THREADS = int(os.getenv("MATCH_SCORING_THREADS", "0"))
+# "approx" scores only the IVF_NPROBE inverted lists nearest each job instead
+# of every student. The inverted file is trained on first use once the pool
+# has IVF_MIN_STUDENTS students, with IVF_LISTS lists (0 picks sqrt of the pool).
+MATCH_SEARCH = os.getenv("MATCH_SEARCH", "exact")
+IVF_NPROBE = int(os.getenv("IVF_NPROBE", "8"))
+IVF_LISTS = int(os.getenv("IVF_LISTS", "0"))
+IVF_MIN_STUDENTS = int(os.getenv("IVF_MIN_STUDENTS", "5000"))
+# With a directory shared by every worker on the host, one worker holds the
+# writer lease and publishes the student matrix there every
+# STUDENT_INDEX_PUBLISH_SECONDS; the others map it read-only instead of each
+# keeping a private copy.
+STUDENT_INDEX_SHARED_DIR = os.getenv("STUDENT_INDEX_SHARED_DIR") or None
+STUDENT_INDEX_PUBLISH_SECONDS = float(os.getenv("STUDENT_INDEX_PUBLISH_SECONDS", "1"))
+STUDENT_INDEX_WRITER_TTL = int(os.getenv("STUDENT_INDEX_WRITER_TTL", "30"))
+# Without a shared directory the writer still snapshots the matrix here every
+# STUDENT_INDEX_SNAPSHOT_SECONDS so restarted workers need not reload from Redis
+STUDENT_INDEX_SNAPSHOT_DIR = os.getenv("STUDENT_INDEX_SNAPSHOT_DIR") or None
+STUDENT_INDEX_SNAPSHOT_SECONDS = float(os.getenv("STUDENT_INDEX_SNAPSHOT_SECONDS", "300"))
+WORKER_ID = f"{os.uname().nodename}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+# Number of matches kept per job unless the request or job asks for more
+DEFAULT_MATCH_LIMIT = 5
+MAX_MATCH_LIMIT = 100
+# Split full matches into this many shards scored by score workers on every
+# replica (0 scores locally). Each shard returns its MATCH_SCATTER_TOP_K best
+# candidates, and shards that miss MATCH_SCATTER_DEADLINE_SECONDS are left out.
+MATCH_SCATTER_SHARDS = int(os.getenv("MATCH_SCATTER_SHARDS", "0"))
+MATCH_SCATTER_TOP_K = int(os.getenv("MATCH_SCATTER_TOP_K", "200"))
+MATCH_SCATTER_DEADLINE_SECONDS = float(os.getenv("MATCH_SCATTER_DEADLINE_SECONDS", "2"))
+SCORE_WORKERS = int(os.getenv("SCORE_WORKERS", "1"))
+# Most jobs one POST /match/batch may score together
+MAX_MATCH_BATCH = 50
+# Only the best few matches are emailed, however deep the stored set is
+MATCH_NOTIFY_LIMIT = 5
+# Queued matches are run by this many asyncio workers per process (0 disables)
+MATCH_WORKERS = int(os.getenv("MATCH_WORKERS", "1"))
+MATCH_QUEUE_POLL_SECONDS = int(os.getenv("MATCH_QUEUE_POLL_SECONDS", "5"))
+# Jobs held by a process that has not renewed its heartbeat for this long are
+# requeued by the other processes
+MATCH_WORKER_HEARTBEAT_TTL = int(os.getenv("MATCH_WORKER_HEARTBEAT_TTL", "30"))
+match_worker_tasks: list[asyncio.Task] = []
+student_index_task: asyncio.Task | None = None
+
+# Student embeddings used by matching, loaded once per worker
+student_index = StudentIndex(
+    dimensions=EMBEDDING_DIMENSIONS,
+    quantization=STUDENT_INDEX_QUANTIZATION,
+    scoring_threads=MATCH_SCORING_THREADS,
+)
+
 def send_email(
     recipient: str,
     subject: str,
@@ -127,21 +267,35 @@ def send_email(
     except Exception as e:
         print(f"[email] Failed to send email to {recipient}: {e}")
 
-def get_driving_distance_miles(orig_lat: float, orig_lng: float, dest_lat: float, dest_lng: float) -> float:
-    """Return driving distance in miles between two coordinates using Google Distance Matrix."""
+# Shared Distance Matrix client so matches reuse keep-alive connections
+distance_client = DistanceMatrixClient(
+    max_concurrency=int(os.getenv("DISTANCE_MATRIX_CONCURRENCY", "4")),
+    timeout=float(os.getenv("DISTANCE_MATRIX_TIMEOUT", "10")),
+)
+# Driving distances keyed by geohash cells of origin and destination
+distance_cache = DistanceCache(
+    ttl=int(os.getenv("DISTANCE_CACHE_TTL", str(30 * 24 * 3600))),
+    lru_size=int(os.getenv("DISTANCE_CACHE_LRU_SIZE", "10000")),
+    precision=int(os.getenv("DISTANCE_CACHE_PRECISION", "7")),
+)
+
+def get_driving_distances_miles(
+    origins: list[tuple[float, float]], dest_lat: float, dest_lng: float
+) -> list[float | None]:
+    """Return driving distances in miles from many coordinates to one destination."""
+    distances = distance_cache.get_many(redis_client, origins, dest_lat, dest_lng)
+    missing = [i for i, d in enumerate(distances) if d is None]
+    if not missing:
+        return distances
     key = os.getenv("GOOGLE_KEY")
     if not key:
         raise RuntimeError("Missing GOOGLE_KEY")
-    params = {
-        "origins": f"{orig_lat},{orig_lng}",
-        "destinations": f"{dest_lat},{dest_lng}",
-        "units": "imperial",
-        "key": key,
-    }
-    resp = httpx.get("https://maps.googleapis.com/maps/api/distancematrix/json", params=params)
-    data = resp.json()
-    value_meters = data["rows"][0]["elements"][0]["distance"]["value"]
-    return value_meters / 1609.34
+    to_fetch = [origins[i] for i in missing]
+    fetched = distance_client.driving_distances_miles(to_fetch, dest_lat, dest_lng, key)
+    distance_cache.put_many(redis_client, to_fetch, dest_lat, dest_lng, fetched)
+    for i, dist in zip(missing, fetched):
+        distances[i] = dist
+    return distances
 
 JWT_SECRET = "secret"
 ALGORITHM = "HS256"
@@ -257,6 +411,52 @@ def on_startup():
     init_default_rss_feeds()
     keys = redis_client.keys("match_results:*")
     print(f"🔎 Found {len(keys)} saved match sets at startup.")
+    try:
+        migrated = migrate_legacy_matches(redis_client)
+        if migrated:
+            print(f"[startup] Migrated {migrated} match sets to sorted sets")
+        init_matched_jobs(redis_client)
+    except Exception as e:
+        print(f"[startup] Failed to migrate match results: {e}")
+    try:
+        migrate_student_embeddings()
+        sync_student_index()
+        init_student_geo_index()
+        init_eligibility_index()
+    except Exception as e:
+        print(f"[startup] Failed to load student index: {e}")
+
+@app.on_event("startup")
+async def start_match_workers():
+    if MATCH_WORKERS:
+        try:
+            heartbeat(redis_client, WORKER_ID, MATCH_WORKER_HEARTBEAT_TTL)
+            requeued = requeue_stale(redis_client)
+            if requeued:
+                print(f"[startup] Requeued {requeued} match jobs from stopped workers")
+        except Exception as e:
+            print(f"[startup] Failed to requeue stale match jobs: {e}")
+        match_worker_tasks.append(asyncio.create_task(match_worker_heartbeat()))
+    for _ in range(MATCH_WORKERS):
+        match_worker_tasks.append(asyncio.create_task(match_worker()))
+    print(f"[startup] Started {MATCH_WORKERS} match workers")
+    if MATCH_SCATTER_SHARDS:
+        for _ in range(SCORE_WORKERS):
+            match_worker_tasks.append(asyncio.create_task(score_worker()))
+        print(f"[startup] Started {SCORE_WORKERS} score workers")
+    global student_index_task
+    if STUDENT_INDEX_SHARED_DIR or STUDENT_INDEX_SNAPSHOT_DIR:
+        student_index_task = asyncio.create_task(student_index_publisher())
+
+@app.on_event("shutdown")
+def on_shutdown():
+    for task in match_worker_tasks:
+        task.cancel()
+    match_worker_tasks.clear()
+    if student_index_task:
+        student_index_task.cancel()
+    embedding_batcher.close()
+    distance_client.close()
 
 # -------- Models -------- #
 class RegisterRequest(BaseModel):
@@ -307,6 +507,27 @@ class StudentRequest(BaseModel):
             raise ValueError("max_travel must be positive")
         return v
 
+class StudentPatchRequest(BaseModel):
+    first_name: str | None = None
+    last_name: str | None = None
+    phone: str | None = None
+    education_level: str | None = None
+    skills: list[str] | None = None
+    experience_summary: str | None = None
+    interests: str | None = None
+    city: str | None = None
+    state: str | None = None
+    lat: float | None = None
+    lng: float | None = None
+    max_travel: float | None = None
+
+    @field_validator("max_travel")
+    @classmethod
+    def check_travel(cls, v):
+        if v is not None and v <= 0:
+            raise ValueError("max_travel must be positive")
+        return v
+
 class JobRequest(BaseModel):
     job_title: str
     job_description: str
@@ -319,6 +540,7 @@ class JobRequest(BaseModel):
     state: str
     lat: float
     lng: float
+    match_limit: int | None = Field(default=None, ge=1, le=MAX_MATCH_LIMIT)
 
     @field_validator("min_pay", "max_pay")
     @classmethod
@@ -335,6 +557,13 @@ class JobRequest(BaseModel):
 
 class JobCodeRequest(BaseModel):
     job_code: str
+    limit: int | None = Field(default=None, ge=1, le=MAX_MATCH_LIMIT)
+    search: str | None = Field(default=None, pattern="^(exact|approx)$")
+    nprobe: int | None = Field(default=None, ge=1)
+
+class BatchMatchRequest(BaseModel):
+    job_codes: list[str] = Field(min_length=1, max_length=MAX_MATCH_BATCH)
+    limit: int | None = Field(default=None, ge=1, le=MAX_MATCH_LIMIT)
 
 # -------- Auth -------- #
 def get_current_user(authorization: str = Header(..., alias="Authorization")):
@@ -347,6 +576,33 @@ def get_current_user(authorization: str = Header(..., alias="Authorization")):
         raise HTTPException(status_code=401, detail="Invalid token")
     return payload
 
+# -------- Match eligibility -------- #
+def refresh_eligibility(email: str):
+    """Re-file an email in the institution eligibility sets used by matching."""
+    user = None
+    raw = redis_client.get(f"user:{email}")
+    if raw:
+        try:
+            user = json.loads(raw)
+        except Exception:
+            user = None
+    if update_eligibility(redis_client, email, user, bool(redis_client.exists(f"student:{email}"))):
+        record_student_change(redis_client, email)
+
+
+def init_eligibility_index():
+    """Build the eligibility sets from existing users and students if missing."""
+    if redis_client.exists(ELIGIBILITY_KEY):
+        return
+    emails = set()
+    for key in redis_client.scan_iter("user:*"):
+        emails.add(key.split("user:", 1)[1])
+    for key in redis_client.scan_iter("student:*"):
+        emails.add(key.split("student:", 1)[1])
+    for email in emails:
+        refresh_eligibility(email)
+    print(f"[startup] Indexed eligibility for {len(emails)} users and students")
+
 # -------- Routes -------- #
 @app.get("/")
 def read_root():
@@ -387,6 +643,7 @@ def register(req: RegisterRequest):
             }
         ),
     )
+    refresh_eligibility(req.email)
     return {"message": "Registration submitted. Awaiting admin approval"}
 
 @app.post("/login")
@@ -445,6 +702,7 @@ def approve(req: ApproveRequest, current_user: dict = Depends(get_current_user))
     if req.role is not None:
         user["role"] = req.role
     redis_client.set(key, json.dumps(user))
+    refresh_eligibility(req.email)
     return {"message": f"{req.email} approved as {user['role']}"}
 
 @app.post("/reject")
@@ -513,6 +771,7 @@ def update_user(email: str, req: UpdateUserRequest, current_user: dict = Depends
     if req.active is not None:
         user["active"] = req.active
     redis_client.set(key, json.dumps(user))
+    refresh_eligibility(email)
     return {"message": "User updated"}
 
 
@@ -527,6 +786,7 @@ def delete_user(email: str, current_user: dict = Depends(get_current_user)):
         raise HTTPException(status_code=404, detail="User not found")
 
     redis_client.delete(key)
+    refresh_eligibility(email)
     return {"message": f"Deleted {email}"}
 
 
@@ -624,6 +884,187 @@ def delete_rss_feed(name: str, current_user: dict = Depends(get_current_user)):
     redis_client.delete(key)
     return {"message": "Feed deleted"}
 
+def requested_dimensions() -> int | None:
+    """Return the ``dimensions`` to request, or ``None`` for full-size embeddings."""
+    if EMBEDDING_DIMENSIONS and not MATCH_RESCORE_DEPTH:
+        return EMBEDDING_DIMENSIONS
+    return None
+
+
+def embedding_signature() -> str:
+    """Identify the model and size of stored embeddings."""
+    dims = requested_dimensions()
+    return f"{EMBEDDING_MODEL}:{dims}" if dims else EMBEDDING_MODEL
+
+
+# Embeddings keyed by hash(model, dimensions, normalized text), shared by
+# students and jobs; the least recently used go past EMBEDDING_CACHE_MAX_ENTRIES
+embedding_cache = EmbeddingCache(
+    max_entries=int(os.getenv("EMBEDDING_CACHE_MAX_ENTRIES", "100000")),
+)
+
+
+def create_embeddings(texts: list[str]) -> list[list[float]]:
+    """Embed texts with the configured model and size, in the order given.
+
+    Texts already in the embedding cache are not sent; the rest go in one call.
+    """
+    dims = requested_dimensions()
+    embeddings = embedding_cache.get_many(redis_bytes, EMBEDDING_MODEL, dims, texts)
+    missing = sorted({t for t, e in zip(texts, embeddings) if e is None}, key=texts.index)
+    if not missing:
+        return embeddings
+    kwargs = {"dimensions": dims} if dims else {}
+    # A lone text is sent as a plain string, as the API has always been called
+    inputs = missing[0] if len(missing) == 1 else missing
+    resp = client.embeddings.create(input=inputs, model=EMBEDDING_MODEL, **kwargs)
+    ordered = sorted(enumerate(resp.data), key=lambda d: getattr(d[1], "index", d[0]))
+    fetched = [d.embedding for _, d in ordered]
+    if len(fetched) == len(missing):
+        embedding_cache.put_many(redis_bytes, EMBEDDING_MODEL, dims, missing, fetched)
+    by_text = dict(zip(missing, fetched))
+    return [e if e is not None else by_text.get(t) for t, e in zip(texts, embeddings)]
+
+
+# Concurrent embedding requests are sent together, at most EMBEDDING_BATCH_SIZE
+# per call, after waiting up to EMBEDDING_BATCH_WAIT_MS for more to arrive
+embedding_batcher = EmbeddingBatcher(
+    create_embeddings,
+    max_batch=int(os.getenv("EMBEDDING_BATCH_SIZE", "64")),
+    max_wait=float(os.getenv("EMBEDDING_BATCH_WAIT_MS", "5")) / 1000,
+    # Only a rejected input is worth retrying on its own
+    input_errors=(BadRequestError,),
+)
+
+
+def embed_text(text: str) -> list[float]:
+    """Embed text, sharing an API call with any concurrent requests."""
+    return embedding_batcher.embed(text)
+
+
+async def embed_text_async(text: str) -> list[float]:
+    """``embed_text`` for async handlers, leaving the event loop free while the batch fills."""
+    return await asyncio.wrap_future(embedding_batcher.submit(text))
+
+
+def embed_texts(texts: list[str]) -> list[list[float]]:
+    """Embed several texts in as few API calls as the batch size allows."""
+    return embedding_batcher.embed_many(texts)
+
+
+# email -> embedding_signature() of the student's stored embedding
+STUDENT_EMBEDDING_SIGNATURES_KEY = "student_embedding_signatures"
+
+
+def save_student(email: str, data: dict, embedding: list[float]):
+    """Store a student profile and, under its own key, its embedding."""
+    data.pop("embedding", None)
+    redis_client.set(f"student:{email}", json.dumps(data))
+    save_student_embedding(redis_bytes, email, embedding)
+    redis_client.hset(STUDENT_EMBEDDING_SIGNATURES_KEY, email, embedding_signature())
+
+
+def sync_student_index(publish: bool = False):
+    """Bring this worker's view of the student index up to date.
+
+    Without ``STUDENT_INDEX_SHARED_DIR`` every worker keeps its own copy. With
+    it, the worker holding the writer lease replays changes into its copy
+    (publishing it when ``publish`` is set) and the rest map the latest
+    published copy, keeping a private one only until the writer has published.
+
+    A worker that has not loaded yet starts from the published copy or
+    ``STUDENT_INDEX_SNAPSHOT_DIR`` snapshot and replays the changes since.
+    A published copy behind ``student_index:version`` is not mapped; the
+    worker replays the log into a private copy instead, so every change
+    logged before the sync is in the index it scores.
+    """
+    directory = STUDENT_INDEX_SHARED_DIR or STUDENT_INDEX_SNAPSHOT_DIR
+    if not directory:
+        student_index.sync(redis_client, redis_bytes)
+        return
+    writer = claim_writer(redis_client, WORKER_ID, STUDENT_INDEX_WRITER_TTL)
+    if STUDENT_INDEX_SHARED_DIR and not writer:
+        current = int(redis_client.get(STUDENT_INDEX_VERSION_KEY) or 0)
+        if student_index.attach(directory, min_version=current):
+            return
+    if not student_index.loaded:
+        student_index.restore(redis_client, redis_bytes, directory)
+    student_index.sync(redis_client, redis_bytes)
+    if writer and publish:
+        os.makedirs(directory, exist_ok=True)
+        student_index.publish(directory)
+
+
+async def student_index_publisher():
+    while True:
+        try:
+            await asyncio.to_thread(sync_student_index, True)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            print(f"[index] Shared index refresh failed: {e}")
+        await asyncio.sleep(
+            STUDENT_INDEX_PUBLISH_SECONDS if STUDENT_INDEX_SHARED_DIR else STUDENT_INDEX_SNAPSHOT_SECONDS
+        )
+
+
+def index_student(email: str, data: dict, embedding: list[float]):
+    """Update the matching indexes after a student profile is saved."""
+    student_index.upsert(redis_client, email, data, embedding)
+    add_student_location(redis_client, email, data.get("lat"), data.get("lng"))
+    refresh_eligibility(email)
+    record_student_change(redis_client, email)
+
+
+def unindex_student(email: str):
+    """Remove a deleted student from the matching indexes."""
+    student_index.remove(redis_client, email)
+    remove_student_location(redis_client, email)
+    refresh_eligibility(email)
+    record_student_change(redis_client, email)
+
+
+# Set once every profile's inline embedding has been moved to its binary key
+STUDENT_EMBEDDINGS_MIGRATED_KEY = "migrations:student_embeddings"
+
+
+def migrate_student_embeddings():
+    """Move embeddings still stored inside profile JSON to their binary keys.
+
+    This scans every profile, so it runs once per Redis and is skipped on
+    later boots.
+    """
+    if redis_client.exists(STUDENT_EMBEDDINGS_MIGRATED_KEY):
+        return
+    moved = 0
+    for key in list(redis_client.scan_iter("student:*")):
+        raw = redis_client.get(key)
+        if not raw or '"embedding"' not in raw:
+            continue
+        try:
+            data = json.loads(raw)
+        except Exception:
+            continue
+        embedding = data.pop("embedding", None)
+        if embedding:
+            redis_bytes.set(embedding_key(key.split("student:", 1)[1]), encode_embedding(embedding))
+        redis_client.set(key, json.dumps(data))
+        moved += 1
+    redis_client.set(STUDENT_EMBEDDINGS_MIGRATED_KEY, "1")
+    if moved:
+        print(f"[startup] Moved {moved} student embeddings to binary keys")
+
+
+def init_student_geo_index():
+    """Backfill the student GEO set from the index if it does not exist yet."""
+    if redis_client.exists(STUDENT_GEO_KEY):
+        return
+    locations = student_index.locations()
+    for email, lat, lng in locations:
+        add_student_location(redis_client, email, lat, lng)
+    print(f"[startup] Indexed {len(locations)} student locations")
+
+
 @app.post("/students")
 async def create_student(request: Request, current_user: dict = Depends(get_current_user)):
     content_type = request.headers.get("content-type", "")
@@ -703,8 +1144,7 @@ async def create_student(request: Request, current_user: dict = Depends(get_curr
         student_data.interests,
     ])
     try:
-        resp = client.embeddings.create(input=combined, model="text-embedding-3-small")
-        embedding = resp.data[0].embedding
+        embedding = await embed_text_async(combined)
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Embedding failed: {str(e)}")
 
@@ -722,12 +1162,13 @@ async def create_student(request: Request, current_user: dict = Depends(get_curr
             school_label = None
 
     data = student_data.model_dump()
-    data["embedding"] = embedding
     if institutional_code is not None:
         data["institutional_code"] = institutional_code
     if school_label is not None:
         data["school_label"] = school_label
-    redis_client.set(f"student:{student_data.email}", json.dumps(data))
+    save_student(student_data.email, data, embedding)
+    index_student(student_data.email, data, embedding)
+    refresh_student_matches([student_data.email])
 
     if profile_json is not None:
         return {"message": "Resume parsed by GPT successfully.", "profile": profile_json}
@@ -752,20 +1193,8 @@ def update_student(
     except Exception:
         existing = {}
 
-    combined = " ".join([
-        ", ".join(updated.skills),
-        updated.experience_summary,
-        updated.interests,
-    ])
-    try:
-        resp = client.embeddings.create(input=combined, model="text-embedding-3-small")
-        embedding = resp.data[0].embedding
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Embedding failed: {str(e)}")
-
     data = updated.model_dump()
     data["email"] = email
-    data["embedding"] = embedding
     inst_code = existing.get("institutional_code") or existing.get("school_code")
     school_label = existing.get("school_label")
     if inst_code is not None:
@@ -775,14 +1204,79 @@ def update_student(
     if "school_code" in existing:
         data["school_code"] = existing.get("school_code")
 
-    redis_client.set(key, json.dumps(data))
+    apply_student_update(email, existing, data)
     return {"message": "Student updated successfully"}
 
+
+@app.patch("/students/{email}")
+def patch_student(
+    email: str, changes: StudentPatchRequest, current_user: dict = Depends(get_current_user)
+):
+    """Merge the given fields into a stored student profile."""
+    key = f"student:{email}"
+    raw = redis_client.get(key)
+    if not raw:
+        raise HTTPException(status_code=404, detail="Student not found")
+
+    if current_user.get("role") == "applicant" and email != current_user.get("sub"):
+        raise HTTPException(status_code=403, detail="Applicants can only edit their own profile")
+
+    try:
+        existing = json.loads(raw)
+    except Exception:
+        existing = {}
+
+    data = {**existing, **changes.model_dump(exclude_none=True), "email": email}
+    apply_student_update(email, existing, data)
+    return {"message": "Student updated successfully"}
+
+
+# Profile fields that make up a student's embedding text
+EMBEDDED_STUDENT_FIELDS = ("skills", "experience_summary", "interests")
+# Profile fields the student index and GEO set keep alongside the embedding
+INDEXED_STUDENT_FIELDS = ("first_name", "last_name", "lat", "lng", "max_travel")
+
+
+def student_embedding_text(data: dict) -> str:
+    return " ".join([
+        ", ".join(data.get("skills") or []),
+        data.get("experience_summary") or "",
+        data.get("interests") or "",
+    ])
+
+
+def apply_student_update(email: str, existing: dict, data: dict):
+    """Save an edited profile, re-embedding and re-indexing only as far as needed.
+
+    The stored embedding is kept unless a field in ``EMBEDDED_STUDENT_FIELDS``
+    changed or it was made with another model or size. Edits that leave
+    ``INDEXED_STUDENT_FIELDS`` alone as well (a new phone number or city) only
+    rewrite the profile.
+    """
+    embedding = None
+    if student_embedding_text(data) == student_embedding_text(existing) and (
+        redis_client.hget(STUDENT_EMBEDDING_SIGNATURES_KEY, email) == embedding_signature()
+    ):
+        embedding = load_student_embeddings(redis_bytes, [email])[0]
+    if embedding is None:
+        try:
+            embedding = embed_text(student_embedding_text(data))
+        except Exception as e:
+            raise HTTPException(status_code=500, detail=f"Embedding failed: {str(e)}")
+        save_student(email, data, embedding)
+    else:
+        data.pop("embedding", None)
+        redis_client.set(f"student:{email}", json.dumps(data))
+        if all(data.get(f) == existing.get(f) for f in INDEXED_STUDENT_FIELDS):
+            return
+    index_student(email, data, embedding)
+    refresh_student_matches([email])
+
 @app.post("/students/upload")
 def upload_students(file: UploadFile = File(...), current_user: dict = Depends(get_current_user)):
     content = file.file.read().decode("utf-8").splitlines()
     reader = csv.DictReader(content)
-    count = 0
+    parsed = []
     for row in reader:
         try:
             skills = [s.strip() for s in row.get("skills", "").split(",") if s.strip()]
@@ -812,20 +1306,84 @@ def upload_students(file: UploadFile = File(...), current_user: dict = Depends(g
             student.experience_summary,
             student.interests
         ])
+        parsed.append((student, combined))
+
+    # Queue every row at once so the batcher sends them in a few large calls
+    futures = [embedding_batcher.submit(combined) for _, combined in parsed]
+    count = 0
+    saved = []
+    for (student, _), future in zip(parsed, futures):
         try:
-            resp = client.embeddings.create(input=combined, model="text-embedding-3-small")
-            embedding = resp.data[0].embedding
+            embedding = future.result()
         except Exception:
             continue
 
         data = student.model_dump()
-        data["embedding"] = embedding
-        redis_client.set(f"student:{student.email}", json.dumps(data))
+        save_student(student.email, data, embedding)
+        index_student(student.email, data, embedding)
+        saved.append(student.email)
 
         count += 1
 
+    refresh_student_matches(saved)
     return {"message": f"Processed {count} students", "count": count}
 
+def job_embedding_text(job: dict) -> str:
+    """Return the job text that is embedded for matching."""
+    return job.get("job_description", "") + " " + ", ".join(job.get("desired_skills", []))
+
+
+def _job_embedding_digest(text: str) -> str:
+    return hashlib.sha256(f"{embedding_signature()}\n{text}".encode("utf-8")).hexdigest()
+
+
+def _cached_job_embedding(raw, digest: str) -> list[float] | None:
+    if raw:
+        try:
+            cached = json.loads(raw)
+            if cached.get("hash") == digest and cached.get("embedding"):
+                return cached["embedding"]
+        except Exception:
+            pass
+    return None
+
+
+def get_job_embedding(job_code: str, job: dict) -> list[float]:
+    """Return a job's stored embedding, re-embedding only when its text changed."""
+    text = job_embedding_text(job)
+    digest = _job_embedding_digest(text)
+    key = f"job_embedding:{job_code}"
+    cached = _cached_job_embedding(redis_client.get(key), digest)
+    if cached:
+        return cached
+
+    embedding = embed_text(text)
+    redis_client.set(key, json.dumps({"hash": digest, "embedding": embedding}))
+    return embedding
+
+
+def get_job_embeddings(jobs: dict[str, dict]) -> dict[str, list[float]]:
+    """Return embeddings for several jobs, embedding every stale one in a single call."""
+    codes = list(jobs)
+    texts = [job_embedding_text(jobs[c]) for c in codes]
+    digests = [_job_embedding_digest(t) for t in texts]
+    cached = redis_client.mget([f"job_embedding:{c}" for c in codes])
+    embeddings = {}
+    for code, digest, raw in zip(codes, digests, cached):
+        embedding = _cached_job_embedding(raw, digest)
+        if embedding:
+            embeddings[code] = embedding
+    missing = [i for i, code in enumerate(codes) if code not in embeddings]
+    if missing:
+        for i, embedding in zip(missing, embed_texts([texts[i] for i in missing])):
+            embeddings[codes[i]] = embedding
+            redis_client.set(
+                f"job_embedding:{codes[i]}", json.dumps({"hash": digests[i], "embedding": embedding})
+            )
+        print(f"[match] Embedded {len(missing)} of {len(codes)} batch jobs in one call")
+    return embeddings
+
+
 @app.post("/jobs")
 def create_job(job: JobRequest, current_user: dict = Depends(get_current_user)):
     generated_code = str(uuid.uuid4())[:8]
@@ -860,6 +1418,10 @@ def create_job(job: JobRequest, current_user: dict = Depends(get_current_user)):
 
     redis_client.set(key, json.dumps(data))
     print(f"Stored job at {key}: {data}")
+    try:
+        get_job_embedding(generated_code, data)
+    except Exception as e:
+        print(f"[jobs] Deferred embedding for {generated_code}: {e}")
     return {"message": "Job stored", "job_code": generated_code}
 
 
@@ -881,139 +1443,262 @@ def update_job(job_code: str, updated: dict, token_data: dict = Depends(get_curr
         max_pay = float(updated.get("max_pay", job.get("max_pay", 0)))
         if min_pay <= 0 or max_pay <= 0 or min_pay > max_pay:
             raise HTTPException(status_code=400, detail="Invalid pay range")
+    if updated.get("match_limit") is not None:
+        try:
+            match_limit = int(updated["match_limit"])
+        except (TypeError, ValueError):
+            raise HTTPException(status_code=400, detail="Invalid match limit")
+        if not 1 <= match_limit <= MAX_MATCH_LIMIT:
+            raise HTTPException(status_code=400, detail="Invalid match limit")
+        updated["match_limit"] = match_limit
     job.update(updated)
     redis_client.set(key, json.dumps(job))
+    try:
+        get_job_embedding(job_code, job)
+    except Exception as e:
+        print(f"[jobs] Deferred embedding for {job_code}: {e}")
     print(f"✏️ Updated job {job_code}")
     return {"message": "Job updated"}
 
-@app.post("/match")
+def _queue_match(
+    job_code: str,
+    send_emails: bool,
+    limit: int | None,
+    lane: str,
+    delta: bool = False,
+    search: str | None = None,
+    nprobe: int | None = None,
+) -> dict:
+    if not redis_client.exists(f"job:{job_code}"):
+        raise HTTPException(status_code=404, detail="Job not found")
+    match_job_id = enqueue_match(
+        redis_client, job_code, send_emails, limit=limit, lane=lane, delta=delta,
+        search=search, nprobe=nprobe,
+    )
+    print(f"[match] Queued {lane} match {match_job_id} for job {job_code}")
+    return {"match_job_id": match_job_id, "status": "queued"}
+
+
+@app.post("/match", status_code=202)
 def match_job(req: JobCodeRequest, current_user: dict = Depends(get_current_user)):
-    """Compute matches for a job and notify candidates."""
-    matches = _perform_match(req.job_code, send_emails=True)
-    return {"matches": matches}
+    """Queue a match for a job; candidates are notified when it runs."""
+    return _queue_match(
+        req.job_code, send_emails=True, limit=req.limit, lane=INTERACTIVE_LANE,
+        search=req.search, nprobe=req.nprobe,
+    )
 
 
-@app.post("/rematches/{job_code}")
-def rematch_job(job_code: str, current_user: dict = Depends(get_current_user)):
-    """Recompute matches without notifying students."""
-    matches = _perform_match(job_code, send_emails=False)
-    return {"matches": matches}
+@app.post("/match/batch", status_code=202)
+def match_jobs_batch(req: BatchMatchRequest, current_user: dict = Depends(get_current_user)):
+    """Queue one match that scores several jobs together; candidates are notified."""
+    codes = list(dict.fromkeys(req.job_codes))
+    found = redis_client.mget([f"job:{code}" for code in codes])
+    missing = [code for code, raw in zip(codes, found) if not raw]
+    if missing:
+        raise HTTPException(status_code=404, detail=f"Jobs not found: {', '.join(missing)}")
+    match_job_id = enqueue_match(
+        redis_client, codes, True, limit=req.limit, lane=INTERACTIVE_LANE
+    )
+    print(f"[match] Queued batch match {match_job_id} for {len(codes)} jobs")
+    return {"match_job_id": match_job_id, "status": "queued"}
+
+
+@app.post("/rematches/{job_code}", status_code=202)
+def rematch_job(
+    job_code: str,
+    limit: int | None = Query(default=None, ge=1, le=MAX_MATCH_LIMIT),
+    priority: str = Query(default=INTERACTIVE_LANE, pattern="^(" + "|".join(LANES) + ")$"),
+    full: bool = Query(default=False),
+    search: str | None = Query(default=None, pattern="^(exact|approx)$"),
+    nprobe: int | None = Query(default=None, ge=1),
+    current_user: dict = Depends(get_current_user),
+):
+    """Queue a rematch that does not notify students.
+
+    Only students changed since the previous match are rescored unless
+    ``full`` is set.
+    """
+    return _queue_match(
+        job_code, send_emails=False, limit=limit, lane=priority, delta=not full,
+        search=search, nprobe=nprobe,
+    )
 
 
-def _perform_match(job_code: str, send_emails: bool = True):
-    key = f"job:{job_code}"
-    raw = redis_client.get(key)
-    if not raw:
-        raise HTTPException(status_code=404, detail="Job not found")
-    job = json.loads(raw)
-    job.setdefault("uninterested_students", [])
+@app.get("/match-jobs/{match_job_id}")
+def get_match_job_status(match_job_id: str, current_user: dict = Depends(get_current_user)):
+    """Return a queued match's status and progress, plus its matches once done."""
+    record = get_match_job(redis_client, match_job_id)
+    if not record:
+        raise HTTPException(status_code=404, detail="Match job not found")
+    if record["status"] != "done":
+        return record
+    results = {}
+    for code in record.get("job_codes") or [record["job_code"]]:
+        matches, _ = load_matches(redis_client, code, 0, record["limit"])
+        job_raw = redis_client.get(f"job:{code}")
+        if job_raw:
+            apply_match_status(matches, json.loads(job_raw))
+        results[code] = matches
+    if record["batch"]:
+        record["results"] = results
+    else:
+        record["matches"] = results[record["job_code"]]
+    return record
 
-    poster_code = None
-    poster_raw = redis_client.get(f"user:{job.get('posted_by')}")
-    if poster_raw:
-        try:
-            p_data = json.loads(poster_raw)
-            poster_code = p_data.get("institutional_code") or p_data.get("school_code")
-        except Exception:
-            poster_code = None
 
-    combined = job.get("job_description", "") + " " + ", ".join(job.get("desired_skills", []))
+def run_match_job(match_job_id: str):
+    """Run one queued match and record how it went."""
+    record = get_match_job(redis_client, match_job_id)
+    if not record:
+        print(f"[match] Match job {match_job_id} expired before it ran")
+        return
+    update_match_job(
+        redis_client, match_job_id, status="running", started_at=datetime.now().isoformat()
+    )
+
+    def progress(stage: str, fraction: float):
+        update_match_job(redis_client, match_job_id, stage=stage, progress=round(fraction, 2))
+
     try:
-        resp = client.embeddings.create(input=combined, model="text-embedding-3-small")
-        job_emb = resp.data[0].embedding
+        if record["reverse"]:
+            count = _perform_reverse_match(record["students"])
+        elif record["batch"]:
+            results = _perform_batch_match(
+                record["job_codes"],
+                send_emails=record["send_emails"],
+                limit=record["limit"],
+                progress=progress,
+            )
+            count = sum(len(matches) for matches in results.values())
+        else:
+            count = len(_perform_match(
+                record["job_code"],
+                send_emails=record["send_emails"],
+                limit=record["limit"],
+                progress=progress,
+                delta=record["delta"],
+                search=record.get("search"),
+                nprobe=record.get("nprobe"),
+            ))
     except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Embedding failed: {str(e)}")
+        error = e.detail if isinstance(e, HTTPException) else str(e)
+        print(f"[match] Match job {match_job_id} failed: {error}")
+        update_match_job(
+            redis_client, match_job_id, status="failed", stage="failed", error=error,
+            finished_at=datetime.now().isoformat(),
+        )
+        return
+    update_match_job(
+        redis_client, match_job_id, status="done", stage="done", progress=1,
+        count=count, finished_at=datetime.now().isoformat(),
+    )
 
-    matches = []
-    for key in redis_client.scan_iter("student:*"):
-        student_raw = redis_client.get(key)
-        if not student_raw:
-            print(f"SKIP: {key} - no student data")
-            continue
-        try:
-            student = json.loads(student_raw)
-            emb = student.get("embedding")
-            if not emb:
-                print(f"SKIP: {student.get('email')} - missing embedding")
-                continue
 
-            print(f"\nEVALUATING student: {student.get('email')}")
-            print(f"Job embedding length: {len(job_emb)}, Student embedding length: {len(emb)}")
-            if student.get("email") in job.get("uninterested_students", []):
-                print("  SKIP: student marked not interested")
-                continue
-            student_user_raw = redis_client.get(f"user:{student.get('email')}")
-            if student_user_raw and poster_code:
-                try:
-                    su = json.loads(student_user_raw)
-                    stu_code = su.get("institutional_code") or su.get("school_code")
-                    if su.get("role") == "applicant" and stu_code != poster_code:
-                        print(f"  SKIP: institutional code mismatch ({stu_code} != {poster_code})")
-                        continue
-                except Exception as ex:
-                    print(f"  SKIP: error loading user ({ex})")
-                    pass
-
-            dist = get_driving_distance_miles(
-                student.get("lat"),
-                student.get("lng"),
-                job.get("lat"),
-                job.get("lng"),
-            )
-            print(f"  Distance: {dist} | Student max travel: {student.get('max_travel', 0)}")
+def process_match_queue(timeout: int | None = None) -> bool:
+    """Run the next queued match, if any. Returns whether one was run."""
+    match_job_id = next_match_job(redis_client, WORKER_ID, timeout=timeout)
+    if not match_job_id:
+        return False
+    try:
+        run_match_job(match_job_id)
+    finally:
+        ack_match_job(redis_client, WORKER_ID, match_job_id)
+    return True
 
-            if dist > float(student.get("max_travel", 0)):
-                print(f"  SKIP: distance too far ({dist} > {student.get('max_travel', 0)})")
-                continue
 
-            score = sum(a * b for a, b in zip(job_emb, emb))
-            print(f"  SCORE: {score}")
+async def match_worker():
+    while True:
+        try:
+            await asyncio.to_thread(process_match_queue, MATCH_QUEUE_POLL_SECONDS)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            print(f"[match] Worker error: {e}")
+            await asyncio.sleep(1)
 
-            matches.append({
-                "name": f"{student.get('first_name', '')} {student.get('last_name', '')}",
-                "email": student.get("email"),
-                "score": score,
-                "distance_miles": round(dist, 1),
-            })
-        except Exception as ex:
-            print(f"  SKIP: exception during evaluation: {ex}")
-            continue
 
-    # Include applicant user records with a matching institutional code when no
-    # student profile exists for them
-    for ukey in redis_client.scan_iter("user:*"):
-        u_raw = redis_client.get(ukey)
-        if not u_raw:
-            continue
+async def match_worker_heartbeat():
+    """Keep this process's match jobs claimed and requeue those of stopped processes."""
+    while True:
         try:
-            udata = json.loads(u_raw)
-        except Exception:
-            continue
-        if udata.get("role") != "applicant" or not poster_code:
-            continue
-        ucode = udata.get("institutional_code") or udata.get("school_code")
-        if ucode != poster_code:
-            continue
-        email = ukey.split("user:", 1)[1]
-        if email in job.get("uninterested_students", []):
+            await asyncio.to_thread(heartbeat, redis_client, WORKER_ID, MATCH_WORKER_HEARTBEAT_TTL)
+            await asyncio.to_thread(requeue_stale, redis_client)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            print(f"[match] Heartbeat failed: {e}")
+        await asyncio.sleep(MATCH_QUEUE_POLL_SECONDS)
+
+
+async def score_worker():
+    while True:
+        try:
+            await asyncio.to_thread(
+                serve_score_task, redis_client, student_index, MATCH_QUEUE_POLL_SECONDS,
+                sync_student_index,
+            )
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            print(f"[shards] Worker error: {e}")
+            await asyncio.sleep(1)
+
+
+def _lookup_distances(pool, rows, job: dict) -> list[float | None]:
+    """Return driving distances from the given pool rows to the job."""
+    if not len(rows):
+        return []
+    try:
+        return get_driving_distances_miles(
+            [(pool.lat[i], pool.lng[i]) for i in rows],
+            job.get("lat"),
+            job.get("lng"),
+        )
+    except Exception as ex:
+        print(f"  SKIP: driving distance lookup failed ({ex})")
+        return [None] * len(rows)
+
+
+def _verify_in_range(pool, rows, job: dict, distances: dict | None = None) -> list[dict]:
+    """Look up driving distances for pool rows and return those within range.
+
+    ``distances`` maps emails to miles already known for this job; only the
+    missing ones are looked up, and they are added to it.
+    """
+    distances = {} if distances is None else distances
+    missing = [i for i in rows if pool.emails[i] not in distances]
+    for i, dist in zip(missing, _lookup_distances(pool, missing, job)):
+        if dist is not None:
+            distances[pool.emails[i]] = dist
+    verified = []
+    for i in rows:
+        email = pool.emails[i]
+        dist = distances.get(email)
+        if dist is None:
+            print(f"  SKIP: {email} - no driving distance")
             continue
-        if redis_client.exists(f"student:{email}"):
+        print(f"  {email} Distance: {dist} | Student max travel: {pool.max_travel[i]}")
+        if dist > pool.max_travel[i]:
+            print(f"  SKIP: distance too far ({dist} > {pool.max_travel[i]})")
             continue
-        matches.append(
-            {
-                "name": f"{udata.get('first_name', '')} {udata.get('last_name', '')}",
-                "email": email,
-                "score": 0.0,
-                "distance_miles": None,
-            }
-        )
 
-    matches.sort(key=lambda x: x["score"], reverse=True)
-    top_matches = matches[:5]
+        score = float(pool.scores[i])
+        print(f"  SCORE: {score}")
+
+        verified.append({
+            "name": pool.names[i],
+            "email": email,
+            "score": score,
+            "distance_miles": round(dist, 1),
+        })
+    return verified
 
+
+def apply_match_status(matches: list[dict], job: dict):
+    """Set each match's status from the job's assigned and placed lists."""
     assigned = set(job.get("assigned_students", []))
     placed = set(job.get("placed_students", []))
-    for m in top_matches:
+    for m in matches:
         if m["email"] in placed:
             m["status"] = "placed"
         elif m["email"] in assigned:
@@ -1022,16 +1707,398 @@ def _perform_match(job_code: str, send_emails: bool = True):
             m["status"] = None
 
 
+def job_poster_code(job: dict) -> str | None:
+    """Return the institutional code of the user who posted a job, if any."""
+    poster_raw = redis_client.get(f"user:{job.get('posted_by')}")
+    if not poster_raw:
+        return None
+    try:
+        p_data = json.loads(poster_raw)
+    except Exception:
+        return None
+    return p_data.get("institutional_code") or p_data.get("school_code")
+
+
+def match_fingerprint(job: dict, poster_code: str | None, nprobe: int | None = None) -> str:
+    """Hash the job fields a retained candidate pool depends on."""
+    parts = [
+        embedding_signature(),
+        student_index.dimensions,
+        student_index.quantization,
+        nprobe,
+        job_embedding_text(job),
+        job.get("lat"),
+        job.get("lng"),
+        poster_code,
+        sorted(job.get("uninterested_students", [])),
+    ]
+    return hashlib.sha256(json.dumps(parts).encode("utf-8")).hexdigest()
+
+
+def _rescore_exact(pool, rows, job_emb) -> np.ndarray:
+    """Rescore ``rows`` on their full embeddings; returns the rows now scored exactly.
+
+    Rows whose full embedding is missing keep only an approximate score and
+    are left out of the result.
+    """
+    rows = np.asarray(rows, dtype=np.intp)
+    query = np.asarray(job_emb, dtype=np.float32)
+    vectors = load_student_embeddings(redis_bytes, [pool.emails[i] for i in rows])
+    full = [(i, vec) for i, vec in zip(rows, vectors) if vec is not None and len(vec) == len(query)]
+    if not full:
+        return rows[:0]
+    exact = np.asarray([i for i, _ in full], dtype=np.intp)
+    pool.scores[exact] = np.stack([vec for _, vec in full]) @ query
+    return exact
+
+
+def _exact_blocks(pool, rows, job_emb, block: int):
+    """Yield ``rows`` best first, a block at a time, ranked only on exact scores.
+
+    On a lossy index the next ``MATCH_RESCORE_DEPTH`` rows by index score
+    are rescored on full embeddings before they are yielded, so approximate
+    and exact scores are never ranked against each other.
+    """
+    rows = np.asarray(rows, dtype=np.intp)
+    if not student_index.lossy or not MATCH_RESCORE_DEPTH:
+        for top in ranked_blocks(pool.scores[rows], block):
+            yield rows[top]
+        return
+    for top in ranked_blocks(pool.scores[rows], MATCH_RESCORE_DEPTH):
+        exact = _rescore_exact(pool, rows[top], job_emb)
+        yield exact[np.argsort(-pool.scores[exact], kind="stable")]
+
+
+def _ivf_nprobe(search: str | None, nprobe: int | None) -> int | None:
+    """Return how many IVF lists to probe, or ``None`` to score every student.
+
+    Approximate search trains the inverted file on first use and falls back
+    to exact scoring while the pool is smaller than ``IVF_MIN_STUDENTS``.
+    """
+    if (search or MATCH_SEARCH) != "approx":
+        return None
+    if not student_index.ivf_lists:
+        if len(student_index) < IVF_MIN_STUDENTS:
+            return None
+        if not redis_bytes.exists(IVF_CENTROIDS_KEY):
+            student_index.train_ivf(redis_client, redis_bytes, nlist=IVF_LISTS or None)
+        sync_student_index()
+        if not student_index.ivf_lists:
+            # A mapped copy is only labelled once the writer republishes it
+            return None
+    return nprobe or IVF_NPROBE
+
+
+class MatchBatch(NamedTuple):
+    """Scores of several jobs from one matrix product, shared while matching each."""
+
+    pool: ScoredPool
+    rows: dict[str, int]
+    job_embs: list[list[float]]
+    column: int
+    # Poster code -> eligible students, looked up once per batch
+    eligible: dict[str, set[str]]
+    # Student-change watermark taken before the batch was scored
+    watermark: int
+
+    def job_pool(self, emails=None) -> ScoredPool:
+        if emails is None:
+            return self.pool.take(np.arange(len(self.pool.emails)), self.column)
+        return self.pool.take(sorted(self.rows[e] for e in emails if e in self.rows), self.column)
+
+
+def _scatter_pool(job: dict, job_emb, poster_code: str | None, limit: int):
+    """Score a job on the score workers of every replica.
+
+    Shards that miss the deadline are scored on this worker's index. Returns
+    the merged shard top-k, or ``None`` when no shard answered in time.
+    """
+    shards = MATCH_SCATTER_SHARDS
+    request = score_request(
+        job_emb, shards, max(limit, MATCH_SCATTER_TOP_K), job.get("lat"), job.get("lng"),
+        poster_code, job.get("uninterested_students", []),
+    )
+    request_id = scatter(redis_client, request, MATCH_SCATTER_DEADLINE_SECONDS)
+
+    def score_locally(shard: int):
+        print(f"[match] Shard {shard} of request {request_id} missed the deadline, scoring locally")
+        return score_shard(redis_client, student_index, request, shard)
 
-    redis_client.set(
-        f"match_results:{job_code}", json.dumps(top_matches)
+    pool, answered = gather(
+        redis_client, request_id, shards, MATCH_SCATTER_DEADLINE_SECONDS, fallback=score_locally
     )
+    if not answered:
+        print(f"[match] No score worker answered request {request_id}, scoring locally")
+        return None
+    return pool
+
+
+def _score_candidates(job, job_emb, poster_code, uninterested, nprobe=None, batch=None):
+    """Score the eligible students near the job on this worker's index or from ``batch``."""
+    # Posters with an institutional code only see their own applicants
+    if not poster_code:
+        eligible = None
+    elif batch is not None:
+        if poster_code not in batch.eligible:
+            batch.eligible[poster_code] = eligible_students(redis_client, poster_code)
+        eligible = batch.eligible[poster_code]
+    else:
+        eligible = eligible_students(redis_client, poster_code)
+    # Only students within the largest travel radius can possibly match
+    candidate_emails = eligible
+    try:
+        nearby = students_within(
+            redis_client, job.get("lat"), job.get("lng"), student_index.max_travel_limit()
+        )
+        candidate_emails = nearby if eligible is None else nearby & eligible
+    except Exception as e:
+        print(f"[match] GEO candidate search failed, scoring full pool: {e}")
+    if candidate_emails is not None:
+        candidate_emails = candidate_emails - uninterested
+    if batch is not None:
+        pool = batch.job_pool(candidate_emails)
+    else:
+        try:
+            pool = student_index.score(job_emb, emails=candidate_emails, nprobe=nprobe)
+        except ValueError as e:
+            raise HTTPException(status_code=500, detail=str(e))
+    return pool
+
+
+def _match_full(
+    job_code, job, job_emb, poster_code, limit, watermark, progress, nprobe=None, batch=None,
+    scatter_shards=True,
+):
+    """Score every candidate, verify the best in score order and retain the pool.
+
+    With ``nprobe`` only students in the nearest IVF lists are scored. With a
+    ``batch`` the job's scores come from the batch instead of the index, and
+    with ``MATCH_SCATTER_SHARDS`` from score workers across the replicas. A
+    scattered pool holds only each shard's top-k, so it is retained as
+    partial and scored again locally if it yields fewer than ``limit`` matches.
+    """
+    uninterested = set(job.get("uninterested_students", []))
+    pool = None
+    if scatter_shards and MATCH_SCATTER_SHARDS and batch is None and not nprobe:
+        pool = _scatter_pool(job, job_emb, poster_code, limit)
+    scattered = pool is not None
+    if pool is None:
+        pool = _score_candidates(job, job_emb, poster_code, uninterested, nprobe, batch)
+
+    too_far = beyond_travel_range(
+        pool.lat, pool.lng, pool.max_travel, job.get("lat"), job.get("lng")
+    )
+    distance_calls_skipped = 0
+
+    candidates = []
+    for i, email in enumerate(pool.emails):
+        if email in uninterested:
+            print(f"  SKIP: {email} - student marked not interested")
+            continue
+        if too_far[i]:
+            print(f"  SKIP: {email} - straight-line distance exceeds max travel ({pool.max_travel[i]})")
+            distance_calls_skipped += 1
+            continue
+        candidates.append(i)
+
+    # Scores are cheap and distance lookups are not: walk candidates from the
+    # best score down and stop once enough are confirmed within range.
+    candidates = np.asarray(candidates, dtype=np.intp)
+    matches = []
+    distances = {}
+    looked_up = 0
+    scored = []
+    for ranked in _exact_blocks(pool, candidates, job_emb, limit):
+        scored.append(ranked)
+        pos = 0
+        while pos < len(ranked) and len(matches) < limit:
+            chunk = ranked[pos:pos + limit - len(matches)]
+            pos += len(chunk)
+            looked_up += len(chunk)
+            matches.extend(_verify_in_range(pool, chunk, job, distances))
+            progress("distances", 0.3 + 0.6 * min(1.0, len(matches) / limit))
+        if len(matches) >= limit:
+            break
+    distance_calls_skipped += len(candidates) - looked_up
+    if scattered and len(matches) < limit:
+        print(f"[match] Scattered pool for {job_code} ran out, scoring locally")
+        return _match_full(
+            job_code, job, job_emb, poster_code, limit, watermark, progress, nprobe, batch,
+            scatter_shards=False,
+        )
+
+    # A lossy index only retains the rows rescored exactly, so that every
+    # pooled score is comparable with the rescores of later delta rematches
+    complete = not (student_index.lossy and MATCH_RESCORE_DEPTH)
+    retained = candidates if complete else np.concatenate([candidates[:0], *scored])
+    save_match_pool(
+        redis_client,
+        job_code,
+        {pool.emails[i]: float(pool.scores[i]) for i in retained},
+        distances,
+        watermark,
+        match_fingerprint(job, poster_code, nprobe),
+        complete=not scattered and (complete or len(retained) == len(candidates)),
+    )
+    return matches, distance_calls_skipped
+
+
+def _match_delta(job_code, job, job_emb, poster_code, limit, state, watermark, progress):
+    """Rescore students changed since the last match and walk the retained pool.
+
+    Returns ``None`` when a partial pool runs out before ``limit`` matches,
+    as students left out of it may still qualify.
+    """
+    since = state["watermark"]
+    complete = state["complete"]
+    uninterested = set(job.get("uninterested_students", []))
+    changed = students_changed_since(redis_client, since)
+    rescored = {}
+    if changed:
+        keep = set(changed) - uninterested
+        if poster_code:
+            allowed = {institution_students_key(poster_code), UNAFFILIATED_STUDENTS_KEY}
+            groups = redis_client.hmget(ELIGIBILITY_KEY, changed)
+            keep &= {e for e, g in zip(changed, groups) if g in allowed}
+        try:
+            pool = student_index.score(job_emb, emails=keep)
+        except ValueError as e:
+            raise HTTPException(status_code=500, detail=str(e))
+        too_far = beyond_travel_range(
+            pool.lat, pool.lng, pool.max_travel, job.get("lat"), job.get("lng")
+        )
+        in_range = np.flatnonzero(~too_far)
+        exact = next(_exact_blocks(pool, in_range, job_emb, len(in_range)), in_range[:0])
+        rescored = {pool.emails[i]: float(pool.scores[i]) for i in exact}
+        complete = complete and len(exact) == len(in_range)
+    update_match_pool(redis_client, job_code, changed, rescored, watermark, complete)
+    print(
+        f"[match] Delta rematch for {job_code}: {len(changed)} students changed, "
+        f"{len(rescored)} rescored"
+    )
+
+    matches = []
+    start = 0
+    while len(matches) < limit:
+        ranked = ranked_pool(redis_client, job_code, start, limit - len(matches))
+        if not ranked:
+            if not complete:
+                print(f"[match] Partial pool for {job_code} ran out, rematching in full")
+                return None
+            break
+        start += len(ranked)
+        emails = [email for email, _ in ranked]
+        try:
+            pool = student_index.score(job_emb, emails=emails)
+        except ValueError as e:
+            raise HTTPException(status_code=500, detail=str(e))
+        rows = {email: i for i, email in enumerate(pool.emails)}
+        # Keep the pooled scores, which may have been rescored on full vectors
+        for email, score in ranked:
+            if email in rows:
+                pool.scores[rows[email]] = score
+        known = pool_distances(redis_client, job_code, emails)
+        before = set(known)
+        matches.extend(
+            _verify_in_range(pool, [rows[e] for e in emails if e in rows], job, known)
+        )
+        save_pool_distances(
+            redis_client, job_code, {e: d for e, d in known.items() if e not in before}
+        )
+        progress("distances", 0.3 + 0.6 * min(1.0, len(matches) / limit))
+    return matches
+
+
+def _perform_match(
+    job_code: str,
+    send_emails: bool = True,
+    limit: int | None = None,
+    progress=None,
+    delta: bool = False,
+    search: str | None = None,
+    nprobe: int | None = None,
+    batch: MatchBatch | None = None,
+):
+    """Match a job against the student pool and store the top results.
+
+    With ``delta`` the job's retained candidate pool is reused when the job
+    has not changed since it was built, so only students changed after the
+    stored watermark are rescored. ``search`` picks exact or IVF approximate
+    scoring (default ``MATCH_SEARCH``) and ``nprobe`` how many lists to probe.
+    A ``batch`` from ``_perform_batch_match`` supplies the job's scores.
+    """
+    progress = progress or (lambda stage, fraction: None)
+    key = f"job:{job_code}"
+    raw = redis_client.get(key)
+    if not raw:
+        raise HTTPException(status_code=404, detail="Job not found")
+    job = json.loads(raw)
+    job.setdefault("uninterested_students", [])
+    poster_code = job_poster_code(job)
+
+    progress("scoring", 0.2)
+    if batch is not None:
+        job_emb = batch.job_embs[batch.column]
+        nprobe = None
+        watermark = batch.watermark
+    else:
+        try:
+            job_emb = get_job_embedding(job_code, job)
+        except Exception as e:
+            raise HTTPException(status_code=500, detail=f"Embedding failed: {str(e)}")
+        # Taken before scoring so changes made while matching are picked up next time
+        watermark = student_change_watermark(redis_client)
+        sync_student_index()
+        nprobe = _ivf_nprobe(search, nprobe)
+    uninterested = set(job.get("uninterested_students", []))
+    limit = limit or job.get("match_limit") or DEFAULT_MATCH_LIMIT
+    state = get_match_state(redis_client, job_code) if delta else {}
+    matches = None
+    if (
+        state.get("watermark") is not None
+        and state.get("fingerprint") == match_fingerprint(job, poster_code, nprobe)
+    ):
+        matches = _match_delta(
+            job_code, job, job_emb, poster_code, limit, state, watermark, progress
+        )
+        distance_calls_skipped = 0
+    if matches is None:
+        matches, distance_calls_skipped = _match_full(
+            job_code, job, job_emb, poster_code, limit, watermark, progress, nprobe, batch
+        )
+
+    # Include applicant user records with a matching institutional code when no
+    # student profile exists for them
+    if poster_code:
+        applicant_emails = sorted(applicants_without_profile(redis_client, poster_code) - uninterested)
+        users = redis_client.mget([f"user:{e}" for e in applicant_emails]) if applicant_emails else []
+        for email, u_raw in zip(applicant_emails, users):
+            if not u_raw:
+                continue
+            try:
+                udata = json.loads(u_raw)
+            except Exception:
+                continue
+            matches.append(
+                {
+                    "name": f"{udata.get('first_name', '')} {udata.get('last_name', '')}",
+                    "email": email,
+                    "score": 0.0,
+                    "distance_miles": None,
+                }
+            )
+
+    top_matches = heapq.nlargest(limit, matches, key=lambda x: x["score"])
+
+    save_matches(redis_client, job_code, top_matches, limit=limit)
+    apply_match_status(top_matches, job)
     print(
         f"✅ Stored {len(top_matches)} matches for job {job_code}"
     )
 
     if send_emails:
-        for m in top_matches:
+        progress("notifying", 0.9)
+        for m in top_matches[:MATCH_NOTIFY_LIMIT]:
             send_email(
                 m["email"],
                 f"New Job Match: {job.get('job_title')}",
@@ -1054,6 +2121,8 @@ def _perform_match(job_code: str, send_emails: bool = True):
         else:
             redis_client.incr("metrics:total_rematches")
         redis_client.incrbyfloat("metrics:total_match_score", avg_score)
+        if distance_calls_skipped:
+            redis_client.incr("metrics:distance_calls_skipped", distance_calls_skipped)
         redis_client.set(
             "metrics:last_match_timestamp", datetime.now().isoformat()
         )
@@ -1063,45 +2132,220 @@ def _perform_match(job_code: str, send_emails: bool = True):
     return top_matches
 
 
-@app.get("/match/{job_code}")
-def get_match_results(job_code: str, current_user: dict = Depends(get_current_user)):
-    key = f"match_results:{job_code}"
-    results_json = redis_client.get(key)
+def _perform_batch_match(
+    job_codes: list[str], send_emails: bool = True, limit: int | None = None, progress=None
+) -> dict[str, list[dict]]:
+    """Match several jobs at once and store each job's top results.
 
-    if results_json is None:
-        print(f"⚠️ No match results found for job {job_code}")
-        return {"matches": []}
+    Stale job embeddings are fetched in one embeddings call and every job is
+    scored against every student in one matrix product; eligibility lookups
+    are shared between jobs posted under the same code. Always a full match.
+    """
+    progress = progress or (lambda stage, fraction: None)
+    raws = redis_client.mget([f"job:{code}" for code in job_codes])
+    jobs = {code: json.loads(raw) for code, raw in zip(job_codes, raws) if raw}
+    if not jobs:
+        raise HTTPException(status_code=404, detail="Job not found")
+    try:
+        embeddings = get_job_embeddings(jobs)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Embedding failed: {str(e)}")
 
+    progress("scoring", 0.1)
+    # Taken before scoring, as in _perform_match, and shared by every job
+    watermark = student_change_watermark(redis_client)
+    sync_student_index()
+    codes = list(jobs)
+    job_embs = [embeddings[code] for code in codes]
     try:
-        matches = json.loads(results_json)
-        print(f"📦 Returning {len(matches)} stored matches for job {job_code}")
+        pool = student_index.score_many(job_embs)
+    except ValueError as e:
+        raise HTTPException(status_code=500, detail=str(e))
+    batch = MatchBatch(
+        pool=pool,
+        rows={email: i for i, email in enumerate(pool.emails)},
+        job_embs=job_embs,
+        column=0,
+        eligible={},
+        watermark=watermark,
+    )
+    print(f"[match] Scored {len(codes)} jobs against {len(pool.emails)} students in one batch")
+
+    results = {}
+    for j, code in enumerate(codes):
+        def job_progress(stage: str, fraction: float, j=j):
+            progress(stage, 0.1 + 0.9 * (j + fraction) / len(codes))
+
+        results[code] = _perform_match(
+            code, send_emails=send_emails, limit=limit, progress=job_progress,
+            batch=batch._replace(column=j),
+        )
+    return results
+
+
+def reverse_match_students(students: list[tuple[str, dict, list[float]]]) -> int:
+    """Merge newly saved students into the stored matches of every matched job.
+
+    Every matched job's stored embedding is scored against the students in
+    one matrix product. Eligibility, travel range and driving distance are
+    only checked for jobs where a student beats the stored tail or is
+    already listed, so match sets stay fresh without a full rematch.
+    """
+    codes = matched_jobs(redis_client)
+    students = [s for s in students if s[2] is not None and len(s[2])]
+    if not codes or not students:
+        return 0
+    dim = len(students[0][2])
+    students = [s for s in students if len(s[2]) == dim]
+
+    job_codes, job_vectors = [], []
+    for code, raw in zip(codes, redis_client.mget([f"job_embedding:{c}" for c in codes])):
+        try:
+            emb = json.loads(raw).get("embedding") if raw else None
+        except Exception:
+            emb = None
+        if emb and len(emb) == dim:
+            job_codes.append(code)
+            job_vectors.append(emb)
+    if not job_codes:
+        return 0
+
+    emails = [email for email, _, _ in students]
+    scores = np.asarray(job_vectors, dtype=np.float32) @ np.asarray(
+        [emb for _, _, emb in students], dtype=np.float32
+    ).T
+    tails = match_tails(redis_client, job_codes, emails)
+    # A match scored after a student's latest change already saw that student
+    seqs = student_change_seqs(redis_client, emails)
+
+    lat = np.array([float(data.get("lat") or 0.0) for _, data, _ in students])
+    lng = np.array([float(data.get("lng") or 0.0) for _, data, _ in students])
+    max_travel = np.array([float(data.get("max_travel") or 0.0) for _, data, _ in students])
+    groups = redis_client.hmget(ELIGIBILITY_KEY, emails)
+
+    merged = 0
+    for j, code in enumerate(job_codes):
+        tail = tails[j]
+        limit = tail["limit"] or max(tail["count"], DEFAULT_MATCH_LIMIT)
+        listed = [tail["scores"][i] is not None for i in range(len(students))]
+        contenders = [
+            i for i in range(len(students))
+            if (seqs[i] is None or seqs[i] > tail["watermark"])
+            and (listed[i] or tail["count"] < limit or scores[j, i] > tail["tail"])
+        ]
+        if not contenders:
+            continue
+        raw = redis_client.get(f"job:{code}")
+        if not raw:
+            continue
+        job = json.loads(raw)
+        uninterested = set(job.get("uninterested_students", []))
+        poster_code = job_poster_code(job)
+        allowed = (
+            {institution_students_key(poster_code), UNAFFILIATED_STUDENTS_KEY}
+            if poster_code
+            else None
+        )
+        rows = np.asarray(contenders, dtype=np.intp)
+        too_far = beyond_travel_range(
+            lat[rows], lng[rows], max_travel[rows], job.get("lat"), job.get("lng")
+        )
+        checks = [
+            i for i, far in zip(contenders, too_far)
+            if not far
+            and emails[i] not in uninterested
+            and (allowed is None or groups[i] in allowed)
+        ]
+        distances = []
+        if checks:
+            try:
+                distances = get_driving_distances_miles(
+                    [(lat[i], lng[i]) for i in checks], job.get("lat"), job.get("lng")
+                )
+            except Exception as ex:
+                print(f"[match] Reverse match distance lookup failed for {code}: {ex}")
+                continue
+        matches = [
+            {
+                "name": f"{students[i][1].get('first_name', '')} {students[i][1].get('last_name', '')}",
+                "email": emails[i],
+                "score": float(scores[j, i]),
+                "distance_miles": round(dist, 1),
+            }
+            for i, dist in zip(checks, distances)
+            if dist is not None and dist <= max_travel[i]
+        ]
+        kept = {m["email"] for m in matches}
+        drop = [emails[i] for i in contenders if listed[i] and emails[i] not in kept]
+        if not matches and not drop:
+            continue
+        evicted = merge_candidates(redis_client, code, matches, drop, limit)
+        merged += len(kept - set(evicted))
+        print(
+            f"[match] Merged {len(kept)} students into {code} "
+            f"(dropped {len(drop)}, evicted {len(evicted)})"
+        )
+    if merged:
+        print(f"[match] Reverse matching placed {merged} students into stored matches")
+    return merged
+
+
+def _perform_reverse_match(emails: list[str]) -> int:
+    """Reverse match students as currently stored; returns how many were placed."""
+    raws = redis_client.mget([f"student:{e}" for e in emails]) if emails else []
+    students = []
+    for email, raw, embedding in zip(emails, raws, load_student_embeddings(redis_bytes, emails)):
+        if not raw or embedding is None:
+            continue
+        try:
+            students.append((email, json.loads(raw), embedding))
+        except Exception:
+            continue
+    return reverse_match_students(students)
+
+
+def refresh_student_matches(emails: list[str]):
+    """Queue a background reverse match after student profiles are saved.
+
+    Distance lookups for every matched job would otherwise hold up the save.
+    """
+    if not emails:
+        return
+    try:
+        enqueue_reverse_match(redis_client, emails)
+    except Exception as e:
+        print(f"[match] Failed to queue reverse match: {e}")
+
+
+@app.get("/match/{job_code}")
+def get_match_results(
+    job_code: str,
+    offset: int = Query(default=0, ge=0),
+    limit: int | None = Query(default=None, ge=1, le=MAX_MATCH_LIMIT),
+    current_user: dict = Depends(get_current_user),
+):
+    """Return a page of the stored matches for a job."""
+    try:
+        matches, total = load_matches(redis_client, job_code, offset, limit)
+        if not total:
+            print(f"⚠️ No match results found for job {job_code}")
+            return {"matches": [], "total": 0}
+        print(f"📦 Returning {len(matches)} of {total} stored matches for job {job_code}")
 
         job_raw = redis_client.get(f"job:{job_code}")
         if not job_raw:
             raise HTTPException(status_code=404, detail="Job not found")
 
-        job = json.loads(job_raw)
-        assigned = set(job.get("assigned_students", []))
-        placed = set(job.get("placed_students", []))
-
-        for m in matches:
-            if m["email"] in placed:
-                m["status"] = "placed"
-            elif m["email"] in assigned:
-                m["status"] = "assigned"
-            else:
-                m["status"] = None
-
-        return {"matches": matches}
+        apply_match_status(matches, json.loads(job_raw))
+        return {"matches": matches, "total": total}
     except Exception as e:
         print(f"❌ Failed to load match results for {job_code}: {e}")
-        return {"matches": []}
+        return {"matches": [], "total": 0}
 
 
 @app.get("/has-match/{job_code}")
 def has_match_data(job_code: str):
-    exists = redis_client.exists(f"match_results:{job_code}")
-    return {"has_match": bool(exists)}
+    return {"has_match": has_matches(redis_client, job_code)}
 
 @app.get("/jobs")
 def list_jobs(current_user: dict = Depends(get_current_user)):
@@ -1124,13 +2368,13 @@ def delete_job(job_code: str, token_data: dict = Depends(get_current_user)):
         raise HTTPException(status_code=403, detail="Admin access required")
 
     job_key = f"job:{job_code}"
-    match_key = f"match_results:{job_code}"
 
     if not redis_client.exists(job_key):
         raise HTTPException(status_code=404, detail="Job not found")
 
     redis_client.delete(job_key)
-    redis_client.delete(match_key)
+    delete_matches(redis_client, job_code)
+    redis_client.delete(f"job_embedding:{job_code}")
 
     return {"message": f"Job {job_code} deleted successfully"}
 
@@ -1156,15 +2400,7 @@ def get_metrics(current_user: dict = Depends(get_current_user)):
             pending += 1
 
     students = 0
-    for key in redis_client.scan_iter("*"):
-        skey = str(key)
-        if (
-            skey.startswith("user:")
-            or skey.startswith("job:")
-            or skey.startswith("metrics:")
-            or skey.startswith("school_code:")
-        ):
-            continue
+    for key in redis_client.scan_iter("student:*"):
         if redis_client.get(key):
             students += 1
 
@@ -1179,6 +2415,11 @@ def get_metrics(current_user: dict = Depends(get_current_user)):
         total_placements,
         total_rematches,
         sum_time_to_place,
+        distance_calls_skipped,
+        distance_cache_hits,
+        distance_cache_misses,
+        embedding_cache_hits,
+        embedding_cache_misses,
     ) = [
         redis_client.get(k)
         for k in [
@@ -1187,6 +2428,11 @@ def get_metrics(current_user: dict = Depends(get_current_user)):
             "metrics:total_placements",
             "metrics:total_rematches",
             "metrics:sum_time_to_place",
+            "metrics:distance_calls_skipped",
+            "metrics:distance_cache_hits",
+            "metrics:distance_cache_misses",
+            "metrics:embedding_cache_hits",
+            "metrics:embedding_cache_misses",
         ]
     ]
     total_matches = int(total_matches or 0)
@@ -1194,6 +2440,12 @@ def get_metrics(current_user: dict = Depends(get_current_user)):
     total_placements = int(total_placements or 0)
     total_rematches = int(total_rematches or 0)
     sum_time_to_place = float(sum_time_to_place or 0.0)
+    distance_calls_skipped = int(distance_calls_skipped or 0)
+    distance_cache_hits = int(distance_cache_hits or 0)
+    distance_cache_misses = int(distance_cache_misses or 0)
+    embedding_cache_hits = int(embedding_cache_hits or 0)
+    embedding_cache_misses = int(embedding_cache_misses or 0)
+    embedding_lookups = embedding_cache_hits + embedding_cache_misses
 
     avg_match_score = (
         total_match_score / total_matches if total_matches else None
@@ -1233,6 +2485,14 @@ def get_metrics(current_user: dict = Depends(get_current_user)):
         "avg_time_to_placement_days": avg_time_to_place,
         "license_breakdown": license_counts,
         "rematch_rate": rematch_rate,
+        "distance_calls_skipped": distance_calls_skipped,
+        "distance_cache_hits": distance_cache_hits,
+        "distance_cache_misses": distance_cache_misses,
+        "embedding_cache_hits": embedding_cache_hits,
+        "embedding_cache_misses": embedding_cache_misses,
+        "embedding_cache_hit_rate": (
+            embedding_cache_hits / embedding_lookups if embedding_lookups else 0
+        ),
     }
 
 
@@ -1652,6 +2912,20 @@ def get_placements(
     return student.get("placement_history", [])
 
 
+@app.post("/admin/student-index/ivf")
+def rebuild_student_ivf(
+    nlist: int | None = Query(default=None, ge=1),
+    current_user: dict = Depends(get_current_user),
+):
+    """Retrain the IVF lists used by approximate matching, e.g. after large imports."""
+    if current_user.get("role") != "admin":
+        raise HTTPException(status_code=403, detail="Admin privileges required")
+    sync_student_index()
+    lists = student_index.train_ivf(redis_client, redis_bytes, nlist=nlist or IVF_LISTS or None)
+    sync_student_index()
+    return {"lists": lists, "students": len(student_index)}
+
+
 @app.delete("/admin/reset-jobs")
 def reset_jobs(current_user: dict = Depends(get_current_user)):
     """Delete all job postings and their stored match results."""
@@ -1664,6 +2938,14 @@ def reset_jobs(current_user: dict = Depends(get_current_user)):
         deleted += 1
     for key in list(redis_client.scan_iter("match_results:*")):
         redis_client.delete(key)
+    for key in list(redis_client.scan_iter("match_details:*")):
+        redis_client.delete(key)
+    for prefix in ("match_state", "match_pool", "match_distances"):
+        for key in list(redis_client.scan_iter(f"{prefix}:*")):
+            redis_client.delete(key)
+    redis_client.delete(MATCHED_JOBS_KEY)
+    for key in list(redis_client.scan_iter("job_embedding:*")):
+        redis_client.delete(key)
 
     return {"message": f"Deleted {deleted} jobs and match data"}
 
@@ -1678,7 +2960,9 @@ def delete_student(email: str, current_user: dict = Depends(get_current_user)):
         raise HTTPException(status_code=404, detail="Student not found")
 
     # Delete student profile
-    redis_client.delete(student_key)
+    redis_client.delete(student_key, embedding_key(email))
+    redis_client.hdel(STUDENT_EMBEDDING_SIGNATURES_KEY, email)
+    unindex_student(email)
 
     # Clean up from job assignments/placements
     for job_key in redis_client.scan_iter("job:*"):
@@ -1712,18 +2996,9 @@ def delete_student(email: str, current_user: dict = Depends(get_current_user)):
     for key in redis_client.scan_iter(f"job_description:*:{email}"):
         redis_client.delete(key)
 
-    # (Optional) Clean match results if student appears
-    for match_key in redis_client.scan_iter("match_results:*"):
-        raw = redis_client.get(match_key)
-        if not raw:
-            continue
-        try:
-            matches = json.loads(raw)
-            new_matches = [m for m in matches if m.get("email") != email]
-            if len(new_matches) != len(matches):
-                redis_client.set(match_key, json.dumps(new_matches))
-        except Exception:
-            continue
+    # Drop the student from any stored match results
+    for job_code in matched_jobs(redis_client):
+        remove_candidate(redis_client, job_code, email)
 
     return {"message": f"Student {email} and related data deleted successfully"}
 
@@ -0,0 +1,93 @@
+"""Redis-side indexes used to pick match candidates without scanning every profile."""
+
+STUDENT_GEO_KEY = "students:geo"
+# Students whose user record does not tie them to an institution
+UNAFFILIATED_STUDENTS_KEY = "students:unaffiliated"
+# email -> eligibility set the email currently belongs to
+ELIGIBILITY_KEY = "eligibility:members"
+
+
+def add_student_location(redis_client, email: str, lat: float, lng: float):
+    """Record or move a student in the GEO set."""
+    try:
+        redis_client.geoadd(STUDENT_GEO_KEY, [float(lng), float(lat), email])
+    except Exception as e:
+        print(f"[candidates] Failed to index location for {email}: {e}")
+
+
+def remove_student_location(redis_client, email: str):
+    """Drop a student from the GEO set."""
+    try:
+        redis_client.zrem(STUDENT_GEO_KEY, email)
+    except Exception as e:
+        print(f"[candidates] Failed to remove location for {email}: {e}")
+
+
+def students_within(redis_client, lat: float, lng: float, radius_miles: float) -> set[str]:
+    """Return emails of students located within ``radius_miles`` of a point."""
+    members = redis_client.geosearch(
+        STUDENT_GEO_KEY,
+        longitude=float(lng),
+        latitude=float(lat),
+        radius=float(radius_miles),
+        unit="mi",
+    )
+    return set(members)
+
+
+def institution_students_key(code: str) -> str:
+    return f"institution:{code}:students"
+
+
+def institution_applicants_key(code: str) -> str:
+    return f"institution:{code}:applicants"
+
+
+def eligibility_set(user: dict | None, has_profile: bool) -> str | None:
+    """Return the eligibility set an email belongs in.
+
+    Applicants are partitioned by institutional code: those with a student
+    profile go in the institution's student set, the rest in its applicant
+    set. Profiles without an applicant user record match any poster.
+    """
+    if user and user.get("role") == "applicant":
+        code = user.get("institutional_code") or user.get("school_code")
+        if not code:
+            return None
+        if has_profile:
+            return institution_students_key(code)
+        return institution_applicants_key(code)
+    if has_profile:
+        return UNAFFILIATED_STUDENTS_KEY
+    return None
+
+
+def update_eligibility(redis_client, email: str, user: dict | None, has_profile: bool) -> bool:
+    """Move an email into the eligibility set matching its user record and profile.
+
+    Returns whether the email changed sets.
+    """
+    new = eligibility_set(user, has_profile)
+    old = redis_client.hget(ELIGIBILITY_KEY, email)
+    if old == new:
+        return False
+    if old:
+        redis_client.srem(old, email)
+    if new:
+        redis_client.sadd(new, email)
+        redis_client.hset(ELIGIBILITY_KEY, email, new)
+    else:
+        redis_client.hdel(ELIGIBILITY_KEY, email)
+    return True
+
+
+def eligible_students(redis_client, poster_code: str) -> set[str]:
+    """Return students a poster from ``poster_code`` may be matched with."""
+    return set(
+        redis_client.sunion(institution_students_key(poster_code), UNAFFILIATED_STUDENTS_KEY)
+    )
+
+
+def applicants_without_profile(redis_client, poster_code: str) -> set[str]:
+    """Return applicants of ``poster_code`` who have not created a student profile."""
+    return set(redis_client.smembers(institution_applicants_key(poster_code)))
@@ -0,0 +1,262 @@
+"""Distance helpers used when matching students to jobs."""
+
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+import httpx
+import numpy as np
+
+DISTANCE_MATRIX_URL = "https://maps.googleapis.com/maps/api/distancematrix/json"
+# Google allows at most 25 origins per Distance Matrix request
+MAX_ORIGINS_PER_REQUEST = 25
+METERS_PER_MILE = 1609.34
+
+DISTANCE_CACHE_PREFIX = "distance_cache"
+DISTANCE_CACHE_HITS_KEY = "metrics:distance_cache_hits"
+DISTANCE_CACHE_MISSES_KEY = "metrics:distance_cache_misses"
+_GEOHASH_BASE32 = "0123456789bcdefghjkmnpqrstuvwxyz"
+
+EARTH_RADIUS_MILES = 3958.8
+# The spherical model can overshoot the true geodesic by a fraction of a
+# percent, so shave a little off before using it as a lower bound.
+HAVERSINE_SLACK = 0.995
+
+
+def haversine_miles(lat, lng, dest_lat: float, dest_lng: float) -> np.ndarray:
+    """Return great-circle distances in miles from each origin to one destination."""
+    lat1 = np.radians(np.asarray(lat, dtype=np.float64))
+    lng1 = np.radians(np.asarray(lng, dtype=np.float64))
+    lat2 = np.radians(float(dest_lat))
+    lng2 = np.radians(float(dest_lng))
+    a = (
+        np.sin((lat2 - lat1) / 2) ** 2
+        + np.cos(lat1) * np.cos(lat2) * np.sin((lng2 - lng1) / 2) ** 2
+    )
+    return 2 * EARTH_RADIUS_MILES * np.arcsin(np.sqrt(np.clip(a, 0.0, 1.0)))
+
+
+def beyond_travel_range(lat, lng, max_travel, dest_lat: float, dest_lng: float) -> np.ndarray:
+    """Flag origins whose straight-line distance already exceeds their max travel.
+
+    Driving distance is never shorter than the great-circle distance, so these
+    students can be rejected without asking the Distance Matrix API.
+    """
+    lower_bound = haversine_miles(lat, lng, dest_lat, dest_lng) * HAVERSINE_SLACK
+    return lower_bound > np.asarray(max_travel, dtype=np.float64)
+
+
+def geohash(lat: float, lng: float, precision: int = 7) -> str:
+    """Encode a coordinate as a geohash cell (precision 7 is roughly 150 m)."""
+    lat_range = [-90.0, 90.0]
+    lng_range = [-180.0, 180.0]
+    chars = []
+    ch = 0
+    bits = 0
+    even = True
+    while len(chars) < precision:
+        rng, value = (lng_range, float(lng)) if even else (lat_range, float(lat))
+        mid = (rng[0] + rng[1]) / 2
+        if value >= mid:
+            ch = (ch << 1) | 1
+            rng[0] = mid
+        else:
+            ch <<= 1
+            rng[1] = mid
+        even = not even
+        bits += 1
+        if bits == 5:
+            chars.append(_GEOHASH_BASE32[ch])
+            ch = 0
+            bits = 0
+    return "".join(chars)
+
+
+class DistanceCache:
+    """Driving distances cached in Redis per (origin cell, destination cell) pair.
+
+    A small in-process LRU sits in front of Redis so repeated matches in the
+    same worker do not even need a round trip.
+    """
+
+    def __init__(self, ttl: int = 30 * 24 * 3600, lru_size: int = 10000, precision: int = 7):
+        self.ttl = ttl
+        self.lru_size = lru_size
+        self.precision = precision
+        self._lru: OrderedDict[str, tuple[float, float]] = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def key(self, orig_lat: float, orig_lng: float, dest_lat: float, dest_lng: float) -> str:
+        origin = geohash(orig_lat, orig_lng, self.precision)
+        dest = geohash(dest_lat, dest_lng, self.precision)
+        return f"{DISTANCE_CACHE_PREFIX}:{origin}:{dest}"
+
+    def _lru_get(self, key: str) -> float | None:
+        entry = self._lru.get(key)
+        if entry is None:
+            return None
+        miles, expires_at = entry
+        if expires_at < time.monotonic():
+            del self._lru[key]
+            return None
+        self._lru.move_to_end(key)
+        return miles
+
+    def _lru_put(self, key: str, miles: float):
+        self._lru[key] = (miles, time.monotonic() + self.ttl)
+        self._lru.move_to_end(key)
+        while len(self._lru) > self.lru_size:
+            self._lru.popitem(last=False)
+
+    def get_many(
+        self,
+        redis_client,
+        origins: list[tuple[float, float]],
+        dest_lat: float,
+        dest_lng: float,
+    ) -> list[float | None]:
+        """Return cached miles for each origin, ``None`` where nothing is cached."""
+        keys = [self.key(lat, lng, dest_lat, dest_lng) for lat, lng in origins]
+        results: list[float | None] = [None] * len(keys)
+        remote = []
+        with self._lock:
+            for i, key in enumerate(keys):
+                results[i] = self._lru_get(key)
+                if results[i] is None:
+                    remote.append(i)
+        if remote:
+            try:
+                values = redis_client.mget([keys[i] for i in remote])
+            except Exception as e:
+                print(f"[distance] Cache read failed: {e}")
+                values = [None] * len(remote)
+            with self._lock:
+                for i, raw in zip(remote, values):
+                    if raw is None:
+                        continue
+                    results[i] = float(raw)
+                    self._lru_put(keys[i], results[i])
+
+        hits = sum(1 for r in results if r is not None)
+        self._count(redis_client, hits, len(results) - hits)
+        return results
+
+    def put_many(
+        self,
+        redis_client,
+        origins: list[tuple[float, float]],
+        dest_lat: float,
+        dest_lng: float,
+        distances: list[float | None],
+    ):
+        """Store freshly fetched distances; unknown distances are not cached."""
+        entries = [
+            (self.key(lat, lng, dest_lat, dest_lng), miles)
+            for (lat, lng), miles in zip(origins, distances)
+            if miles is not None
+        ]
+        if not entries:
+            return
+        with self._lock:
+            for key, miles in entries:
+                self._lru_put(key, miles)
+        try:
+            pipe = redis_client.pipeline(transaction=False)
+            for key, miles in entries:
+                pipe.setex(key, self.ttl, repr(float(miles)))
+            pipe.execute()
+        except Exception as e:
+            print(f"[distance] Cache write failed: {e}")
+
+    def _count(self, redis_client, hits: int, misses: int):
+        with self._lock:
+            self.hits += hits
+            self.misses += misses
+        try:
+            if hits:
+                redis_client.incr(DISTANCE_CACHE_HITS_KEY, hits)
+            if misses:
+                redis_client.incr(DISTANCE_CACHE_MISSES_KEY, misses)
+        except Exception:
+            pass
+
+
+class DistanceMatrixClient:
+    """Batched Google Distance Matrix client on a shared keep-alive connection pool.
+
+    Origins are packed up to ``MAX_ORIGINS_PER_REQUEST`` per request against a
+    single destination, and batches run concurrently on a bounded thread pool
+    shared by every match in the process.
+    """
+
+    def __init__(self, max_concurrency: int = 4, timeout: float = 10.0):
+        self.max_concurrency = max(1, max_concurrency)
+        self._http = httpx.Client(
+            timeout=timeout,
+            limits=httpx.Limits(
+                max_connections=self.max_concurrency,
+                max_keepalive_connections=self.max_concurrency,
+            ),
+        )
+        self._executor = ThreadPoolExecutor(
+            max_workers=self.max_concurrency, thread_name_prefix="distance"
+        )
+
+    def close(self):
+        self._executor.shutdown(wait=False)
+        self._http.close()
+
+    def _fetch_batch(
+        self,
+        origins: list[tuple[float, float]],
+        dest_lat: float,
+        dest_lng: float,
+        api_key: str,
+    ) -> list[float | None]:
+        params = {
+            "origins": "|".join(f"{float(lat)},{float(lng)}" for lat, lng in origins),
+            "destinations": f"{float(dest_lat)},{float(dest_lng)}",
+            "units": "imperial",
+            "key": api_key,
+        }
+        try:
+            resp = self._http.get(DISTANCE_MATRIX_URL, params=params)
+            rows = resp.json()["rows"]
+        except Exception as e:
+            print(f"[distance] Distance Matrix request failed: {e}")
+            return [None] * len(origins)
+
+        results: list[float | None] = []
+        for row in rows[: len(origins)]:
+            try:
+                element = row["elements"][0]
+                if element.get("status", "OK") != "OK":
+                    results.append(None)
+                    continue
+                results.append(element["distance"]["value"] / METERS_PER_MILE)
+            except Exception:
+                results.append(None)
+        results.extend([None] * (len(origins) - len(results)))
+        return results
+
+    def driving_distances_miles(
+        self,
+        origins: list[tuple[float, float]],
+        dest_lat: float,
+        dest_lng: float,
+        api_key: str,
+    ) -> list[float | None]:
+        """Return driving miles from each origin to the destination, ``None`` if unknown."""
+        batches = [
+            origins[i:i + MAX_ORIGINS_PER_REQUEST]
+            for i in range(0, len(origins), MAX_ORIGINS_PER_REQUEST)
+        ]
+        if len(batches) <= 1:
+            return [d for b in batches for d in self._fetch_batch(b, dest_lat, dest_lng, api_key)]
+        results = self._executor.map(
+            lambda b: self._fetch_batch(b, dest_lat, dest_lng, api_key), batches
+        )
+        return [d for batch in results for d in batch]
@@ -0,0 +1,116 @@
+"""Coalesce concurrent embedding requests into multi-input API calls.
+
+Callers block in ``embed`` while a background thread gathers every request
+that arrives within ``max_wait`` seconds of the first, up to ``max_batch``,
+and sends them as one call. A burst of profile saves then costs one round
+trip, and one unit of the requests-per-minute limit, per batch rather than
+per student.
+"""
+
+import queue
+import threading
+import time
+from concurrent.futures import Future
+
+
+class _CountMismatch(ValueError):
+    """``embed_many`` returned a different number of embeddings than texts."""
+
+
+class EmbeddingBatcher:
+    """Send queued texts to ``embed_many`` in batches.
+
+    ``embed_many`` takes a list of texts and returns one embedding per text
+    in the same order. If a call fails with one of ``input_errors`` (the
+    API rejecting some input) or returns the wrong number of embeddings, the
+    batch is split in half and each half retried, so one bad input fails
+    only its own caller. Any other error, such as a rate limit or timeout,
+    fails the whole batch at once rather than multiplying the calls.
+    """
+
+    def __init__(
+        self,
+        embed_many,
+        max_batch: int = 64,
+        max_wait: float = 0.005,
+        input_errors: tuple[type[Exception], ...] = (),
+    ):
+        self._embed_many = embed_many
+        self.input_errors = input_errors
+        self.max_batch = max(1, max_batch)
+        self.max_wait = max_wait
+        self._queue: queue.Queue = queue.Queue()
+        self._lock = threading.Lock()
+        self._thread: threading.Thread | None = None
+        self.calls = 0
+        self.texts = 0
+
+    def submit(self, text: str) -> Future:
+        """Queue ``text`` and return a future for its embedding."""
+        future = Future()
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(
+                    target=self._run, name="embedding-batcher", daemon=True
+                )
+                self._thread.start()
+            self._queue.put((text, future))
+        return future
+
+    def embed(self, text: str) -> list[float]:
+        return self.submit(text).result()
+
+    def embed_many(self, texts: list[str]) -> list[list[float]]:
+        """Embed several texts, sharing batches with any concurrent callers."""
+        futures = [self.submit(text) for text in texts]
+        return [future.result() for future in futures]
+
+    def close(self):
+        """Stop the batching thread once the queued texts are sent."""
+        with self._lock:
+            if self._thread is not None:
+                self._queue.put(None)
+                self._thread = None
+
+    def _run(self):
+        while True:
+            item = self._queue.get()
+            if item is None:
+                return
+            batch = [item]
+            deadline = time.monotonic() + self.max_wait
+            stop = False
+            while len(batch) < self.max_batch:
+                try:
+                    item = self._queue.get(timeout=max(0.0, deadline - time.monotonic()))
+                except queue.Empty:
+                    break
+                if item is None:
+                    stop = True
+                    break
+                batch.append(item)
+            self._flush(batch)
+            if stop:
+                return
+
+    def _flush(self, batch: list[tuple[str, Future]]):
+        texts = [text for text, _ in batch]
+        try:
+            embeddings = self._embed_many(texts)
+            if len(embeddings) != len(texts):
+                raise _CountMismatch(f"Got {len(embeddings)} embeddings for {len(texts)} texts")
+        except Exception as e:
+            if len(batch) > 1 and isinstance(e, (_CountMismatch, *self.input_errors)):
+                print(f"[embeddings] Batch of {len(texts)} rejected, retrying in halves: {e}")
+                middle = len(batch) // 2
+                self._flush(batch[:middle])
+                self._flush(batch[middle:])
+                return
+            print(f"[embeddings] Batch of {len(texts)} failed: {e}")
+            for _, future in batch:
+                future.set_exception(e)
+            return
+        self.calls += 1
+        self.texts += len(texts)
+        for (_, future), embedding in zip(batch, embeddings):
+            future.set_result(embedding)
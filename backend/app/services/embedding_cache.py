@@ -0,0 +1,111 @@
+"""Content-addressed cache of embeddings shared by students and jobs.
+
+A vector is stored once per (model, dimensions, normalized text) under
+``embedding_cache:{sha256}`` as raw little-endian float32 bytes, so re-saving
+an unchanged profile, re-uploading a CSV or reposting a job reuses it instead
+of calling OpenAI again. ``embedding_cache:lru`` scores every entry by when it
+was last used, and the least recently used entries are dropped once the cache
+holds more than ``max_entries``.
+"""
+
+import hashlib
+import threading
+import time
+import unicodedata
+
+from backend.app.services.student_index import decode_embedding, encode_embedding
+
+EMBEDDING_CACHE_PREFIX = "embedding_cache"
+EMBEDDING_CACHE_LRU_KEY = "embedding_cache:lru"
+EMBEDDING_CACHE_HITS_KEY = "metrics:embedding_cache_hits"
+EMBEDDING_CACHE_MISSES_KEY = "metrics:embedding_cache_misses"
+
+
+def normalize_text(text: str) -> str:
+    """Fold the differences that do not change what a text says: Unicode form and whitespace."""
+    return " ".join(unicodedata.normalize("NFC", text).split())
+
+
+class EmbeddingCache:
+    """Embeddings in Redis keyed by a hash of the model, size and text."""
+
+    def __init__(self, max_entries: int = 100000):
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_entries > 0
+
+    def digest(self, model: str, dimensions: int | None, text: str) -> str:
+        content = f"{model}\0{dimensions or ''}\0{normalize_text(text)}"
+        return hashlib.sha256(content.encode("utf-8")).hexdigest()
+
+    def key(self, digest: str) -> str:
+        return f"{EMBEDDING_CACHE_PREFIX}:{digest}"
+
+    def get_many(
+        self, binary_client, model: str, dimensions: int | None, texts: list[str]
+    ) -> list[list[float] | None]:
+        """Return the cached embedding of each text, ``None`` where nothing is cached."""
+        if not self.enabled or not texts:
+            return [None] * len(texts)
+        digests = [self.digest(model, dimensions, t) for t in texts]
+        try:
+            values = binary_client.mget([self.key(d) for d in digests])
+        except Exception as e:
+            print(f"[embeddings] Cache read failed: {e}")
+            values = [None] * len(texts)
+        results = [None if raw is None else decode_embedding(raw).tolist() for raw in values]
+        found = {d for d, r in zip(digests, results) if r is not None}
+        if found:
+            try:
+                binary_client.zadd(EMBEDDING_CACHE_LRU_KEY, {d: time.time() for d in found})
+            except Exception as e:
+                print(f"[embeddings] Cache touch failed: {e}")
+        hits = sum(1 for r in results if r is not None)
+        self._count(binary_client, hits, len(results) - hits)
+        return results
+
+    def put_many(
+        self,
+        binary_client,
+        model: str,
+        dimensions: int | None,
+        texts: list[str],
+        embeddings: list[list[float]],
+    ):
+        """Store fresh embeddings and evict the least recently used beyond ``max_entries``."""
+        if not self.enabled or not texts:
+            return
+        entries = {self.digest(model, dimensions, t): e for t, e in zip(texts, embeddings)}
+        now = time.time()
+        try:
+            pipe = binary_client.pipeline(transaction=False)
+            for digest, embedding in entries.items():
+                pipe.set(self.key(digest), encode_embedding(embedding))
+            pipe.zadd(EMBEDDING_CACHE_LRU_KEY, {d: now for d in entries})
+            pipe.execute()
+            excess = binary_client.zcard(EMBEDDING_CACHE_LRU_KEY) - self.max_entries
+            if excess > 0:
+                stale = binary_client.zrange(EMBEDDING_CACHE_LRU_KEY, 0, excess - 1)
+                pipe = binary_client.pipeline(transaction=False)
+                pipe.delete(*[self.key(d.decode() if isinstance(d, bytes) else d) for d in stale])
+                pipe.zrem(EMBEDDING_CACHE_LRU_KEY, *stale)
+                pipe.execute()
+        except Exception as e:
+            print(f"[embeddings] Cache write failed: {e}")
+
+    def _count(self, binary_client, hits: int, misses: int):
+        with self._lock:
+            self.hits += hits
+            self.misses += misses
+        try:
+            if hits:
+                binary_client.incr(EMBEDDING_CACHE_HITS_KEY, hits)
+            if misses:
+                binary_client.incr(EMBEDDING_CACHE_MISSES_KEY, misses)
+        except Exception:
+            pass
@@ -0,0 +1,202 @@
+"""Redis-list queue of match jobs with interactive and background lanes.
+
+Each queued match is tracked in a ``match_job:{id}`` hash holding its
+status and progress so clients can poll while a worker runs it. Workers
+take from the interactive lane before the background lane, moving each id
+into their own ``match_processing:{consumer}`` list until the job finishes.
+A consumer whose ``match_consumer:{consumer}`` heartbeat has expired is
+presumed dead, and the jobs left in its processing list are put back at the
+front of their lane.
+
+Besides matches for jobs, the queue carries reverse matches: merging newly
+saved students into every stored match set, off the request path.
+"""
+
+import json
+import uuid
+from datetime import datetime
+
+INTERACTIVE_LANE = "interactive"
+BACKGROUND_LANE = "background"
+LANES = (INTERACTIVE_LANE, BACKGROUND_LANE)
+MATCH_JOB_PREFIX = "match_job"
+# Finished jobs are kept around long enough for clients to pick up the result
+MATCH_JOB_TTL = 24 * 3600
+PROCESSING_PREFIX = "match_processing"
+CONSUMER_PREFIX = "match_consumer"
+# A job requeued this many times is taken to be crashing its workers
+MATCH_JOB_MAX_ATTEMPTS = 3
+
+
+def lane_key(lane: str) -> str:
+    return f"match_queue:{lane}"
+
+
+def match_job_key(match_job_id: str) -> str:
+    return f"{MATCH_JOB_PREFIX}:{match_job_id}"
+
+
+def processing_key(consumer: str) -> str:
+    return f"{PROCESSING_PREFIX}:{consumer}"
+
+
+def consumer_key(consumer: str) -> str:
+    return f"{CONSUMER_PREFIX}:{consumer}"
+
+
+def enqueue_match(
+    redis_client,
+    job_code: str | list[str],
+    send_emails: bool,
+    limit: int | None = None,
+    lane: str = INTERACTIVE_LANE,
+    delta: bool = False,
+    search: str | None = None,
+    nprobe: int | None = None,
+) -> str:
+    """Queue a match for ``job_code`` and return its match job id.
+
+    A list of job codes queues one batch match that scores all of them
+    together.
+    """
+    batch = isinstance(job_code, list)
+    return _enqueue(
+        redis_client,
+        lane,
+        job_code=",".join(job_code) if batch else job_code,
+        batch="1" if batch else "0",
+        send_emails="1" if send_emails else "0",
+        delta="1" if delta else "0",
+        limit="" if limit is None else str(limit),
+        search=search or "",
+        nprobe="" if nprobe is None else str(nprobe),
+    )
+
+
+def enqueue_reverse_match(redis_client, emails: list[str], lane: str = BACKGROUND_LANE) -> str:
+    """Queue merging the saved students ``emails`` into every stored match set."""
+    return _enqueue(
+        redis_client, lane, job_code="", reverse="1", students=json.dumps(emails), send_emails="0"
+    )
+
+
+def _enqueue(redis_client, lane: str, **fields) -> str:
+    if lane not in LANES:
+        raise ValueError(f"Unknown match lane {lane!r}")
+    match_job_id = uuid.uuid4().hex
+    key = match_job_key(match_job_id)
+    redis_client.hset(
+        key,
+        mapping={
+            "id": match_job_id,
+            "lane": lane,
+            **fields,
+            "status": "queued",
+            "stage": "queued",
+            "progress": "0",
+            "created_at": datetime.now().isoformat(),
+        },
+    )
+    redis_client.expire(key, MATCH_JOB_TTL)
+    redis_client.rpush(lane_key(lane), match_job_id)
+    return match_job_id
+
+
+def next_match_job(redis_client, consumer: str, timeout: int | None = None) -> str | None:
+    """Move the next match job id into ``consumer``'s processing list and return it.
+
+    The interactive lane is preferred. With ``timeout`` the call blocks for
+    up to that many seconds on the interactive lane once both lanes are
+    empty; without it the lanes are checked once. Call ``ack_match_job``
+    when the job has finished.
+    """
+    processing = processing_key(consumer)
+    for lane in LANES:
+        match_job_id = redis_client.lmove(lane_key(lane), processing, "LEFT", "RIGHT")
+        if match_job_id:
+            return match_job_id
+    if timeout is not None:
+        return redis_client.blmove(
+            lane_key(INTERACTIVE_LANE), processing, timeout, "LEFT", "RIGHT"
+        )
+    return None
+
+
+def ack_match_job(redis_client, consumer: str, match_job_id: str):
+    """Drop a finished match job from ``consumer``'s processing list."""
+    redis_client.lrem(processing_key(consumer), 1, match_job_id)
+
+
+def heartbeat(redis_client, consumer: str, ttl: int):
+    """Mark ``consumer`` alive for ``ttl`` seconds so its jobs are not requeued."""
+    redis_client.set(consumer_key(consumer), "1", ex=ttl)
+
+
+def requeue_stale(redis_client) -> int:
+    """Put jobs held by consumers without a heartbeat back on their lanes.
+
+    Jobs are pushed to the front of their lane so they run next; one that
+    has already been requeued ``MATCH_JOB_MAX_ATTEMPTS`` times is failed
+    instead. Returns how many jobs were requeued.
+    """
+    requeued = 0
+    for key in redis_client.scan_iter(f"{PROCESSING_PREFIX}:*"):
+        key = key.decode() if isinstance(key, bytes) else key
+        consumer = key[len(PROCESSING_PREFIX) + 1:]
+        if redis_client.exists(consumer_key(consumer)):
+            continue
+        while True:
+            match_job_id = redis_client.lindex(key, 0)
+            if not match_job_id:
+                break
+            record_key = match_job_key(match_job_id)
+            lane = redis_client.hget(record_key, "lane")
+            if lane not in LANES:
+                # The record expired; nobody is waiting for the job any more
+                redis_client.lrem(key, 1, match_job_id)
+                continue
+            attempts = redis_client.hincrby(record_key, "attempts", 1)
+            if attempts > MATCH_JOB_MAX_ATTEMPTS:
+                update_match_job(
+                    redis_client, match_job_id, status="failed", stage="failed",
+                    error="Match worker stopped while running this job",
+                    finished_at=datetime.now().isoformat(),
+                )
+                redis_client.lrem(key, 1, match_job_id)
+                continue
+            update_match_job(redis_client, match_job_id, status="queued", stage="queued")
+            redis_client.lmove(key, lane_key(lane), "LEFT", "LEFT")
+            requeued += 1
+            print(f"[match] Requeued {match_job_id} from stopped worker {consumer}")
+    return requeued
+
+
+def get_match_job(redis_client, match_job_id: str) -> dict | None:
+    """Return a match job's record with typed fields, or ``None`` if unknown."""
+    raw = redis_client.hgetall(match_job_key(match_job_id))
+    if not raw:
+        return None
+    record = dict(raw)
+    record["send_emails"] = record.get("send_emails") == "1"
+    record["batch"] = record.get("batch") == "1"
+    if record["batch"]:
+        record["job_codes"] = record["job_code"].split(",")
+    record["reverse"] = record.get("reverse") == "1"
+    if record["reverse"]:
+        record["students"] = json.loads(record.get("students") or "[]")
+    record["delta"] = record.get("delta") == "1"
+    record["limit"] = int(record["limit"]) if record.get("limit") else None
+    record["search"] = record.get("search") or None
+    record["nprobe"] = int(record["nprobe"]) if record.get("nprobe") else None
+    record["progress"] = float(record.get("progress") or 0.0)
+    if "count" in record:
+        record["count"] = int(record["count"])
+    return record
+
+
+def update_match_job(redis_client, match_job_id: str, **fields):
+    """Record new status or progress fields for a match job."""
+    redis_client.hset(
+        match_job_key(match_job_id),
+        mapping={k: "" if v is None else str(v) for k, v in fields.items()},
+    )
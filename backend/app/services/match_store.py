@@ -0,0 +1,347 @@
+"""Stored match results: a sorted set of candidates plus a hash of details.
+
+``match_results:{job_code}`` is a sorted set of email -> score so pages can
+be read with ``ZREVRANGE`` and single candidates dropped with ``ZREM``.
+``match_details:{job_code}`` maps each email to a compact JSON object with
+the name and driving distance. Assignment status is not stored here; it is
+derived from the job record when results are read.
+
+``match_state:{job_code}`` records how the stored set was computed (its
+depth, the job fingerprint and the student-change watermark) and marks the
+job as matched even when no candidate qualified, and
+``matched_jobs`` lists every job that has stored matches so new students can
+be merged in without rerunning each match.
+
+``match_pool:{job_code}`` retains every scored candidate that passed the
+cheap filters, and ``match_distances:{job_code}`` the driving distances
+already looked up for them. A rematch only rescores students logged in
+``student_changes`` after the watermark and walks the retained pool again.
+"""
+
+import json
+
+from redis.exceptions import WatchError
+
+from backend.app.services.student_index import log_change
+
+MATCH_RESULTS_PREFIX = "match_results"
+MATCH_DETAILS_PREFIX = "match_details"
+MATCH_STATE_PREFIX = "match_state"
+MATCHED_JOBS_KEY = "matched_jobs"
+MATCH_POOL_PREFIX = "match_pool"
+MATCH_DISTANCES_PREFIX = "match_distances"
+# email -> sequence number of the student's latest profile or eligibility change
+STUDENT_CHANGES_KEY = "student_changes"
+STUDENT_CHANGE_SEQ_KEY = "student_changes:seq"
+
+
+def results_key(job_code: str) -> str:
+    return f"{MATCH_RESULTS_PREFIX}:{job_code}"
+
+
+def details_key(job_code: str) -> str:
+    return f"{MATCH_DETAILS_PREFIX}:{job_code}"
+
+
+def state_key(job_code: str) -> str:
+    return f"{MATCH_STATE_PREFIX}:{job_code}"
+
+
+def pool_key(job_code: str) -> str:
+    return f"{MATCH_POOL_PREFIX}:{job_code}"
+
+
+def distances_key(job_code: str) -> str:
+    return f"{MATCH_DISTANCES_PREFIX}:{job_code}"
+
+
+def _details(m: dict) -> str:
+    return json.dumps(
+        {"name": m.get("name", ""), "distance_miles": m.get("distance_miles")},
+        separators=(",", ":"),
+    )
+
+
+def save_matches(redis_client, job_code: str, matches: list[dict], limit: int | None = None):
+    """Replace the stored matches for a job.
+
+    ``limit`` is the depth the match was run with; merges keep the set at
+    that size. Redis drops an empty sorted set, so ``match_state`` carries a
+    ``matched`` marker that tells a match with no results from no match.
+    """
+    pipe = redis_client.pipeline(transaction=True)
+    pipe.delete(results_key(job_code), details_key(job_code))
+    if matches:
+        pipe.zadd(results_key(job_code), {m["email"]: float(m["score"]) for m in matches})
+        pipe.hset(details_key(job_code), mapping={m["email"]: _details(m) for m in matches})
+    state = {"matched": "1"}
+    if limit is not None:
+        state["limit"] = str(limit)
+    pipe.hset(state_key(job_code), mapping=state)
+    pipe.sadd(MATCHED_JOBS_KEY, job_code)
+    pipe.execute()
+
+
+def load_matches(
+    redis_client, job_code: str, offset: int = 0, limit: int | None = None
+) -> tuple[list[dict], int]:
+    """Return a page of stored matches in descending score order and the total."""
+    key = results_key(job_code)
+    total = redis_client.zcard(key)
+    end = offset + limit - 1 if limit is not None else -1
+    ranked = redis_client.zrevrange(key, offset, end, withscores=True)
+    if not ranked:
+        return [], total
+    details = redis_client.hmget(details_key(job_code), [email for email, _ in ranked])
+    matches = []
+    for (email, score), raw in zip(ranked, details):
+        try:
+            info = json.loads(raw) if raw else {}
+        except Exception:
+            info = {}
+        matches.append(
+            {
+                "name": info.get("name", ""),
+                "email": email,
+                "score": float(score),
+                "distance_miles": info.get("distance_miles"),
+            }
+        )
+    return matches, total
+
+
+def has_matches(redis_client, job_code: str) -> bool:
+    """Return whether a job has been matched, including matches that found nobody."""
+    if redis_client.exists(results_key(job_code)):
+        return True
+    return redis_client.hget(state_key(job_code), "matched") == "1"
+
+
+def remove_candidate(redis_client, job_code: str, email: str):
+    """Drop one candidate from a job's stored matches."""
+    redis_client.zrem(results_key(job_code), email)
+    redis_client.hdel(details_key(job_code), email)
+
+
+def delete_matches(redis_client, job_code: str):
+    redis_client.delete(
+        results_key(job_code),
+        details_key(job_code),
+        state_key(job_code),
+        pool_key(job_code),
+        distances_key(job_code),
+    )
+    redis_client.srem(MATCHED_JOBS_KEY, job_code)
+
+
+def matched_jobs(redis_client) -> list[str]:
+    """Return the codes of every job with stored matches."""
+    return sorted(redis_client.smembers(MATCHED_JOBS_KEY))
+
+
+def match_tails(redis_client, job_codes: list[str], emails: list[str]) -> list[dict]:
+    """Return what a merge needs to know about each job's stored matches.
+
+    For every job this is the number of stored matches, the lowest stored
+    score, the depth it was run with, the student-change watermark it was
+    scored at and the current score of each of ``emails`` (``None`` where
+    the email is not stored).
+    """
+    pipe = redis_client.pipeline(transaction=False)
+    for code in job_codes:
+        pipe.zcard(results_key(code))
+        pipe.zrange(results_key(code), 0, 0, withscores=True)
+        pipe.hmget(state_key(code), ["limit", "watermark"])
+        pipe.zmscore(results_key(code), emails)
+    replies = pipe.execute()
+    tails = []
+    for i in range(len(job_codes)):
+        count, lowest, (limit, watermark), scores = replies[4 * i:4 * i + 4]
+        tails.append(
+            {
+                "count": int(count or 0),
+                "tail": float(lowest[0][1]) if lowest else None,
+                "limit": int(limit) if limit else None,
+                "watermark": int(watermark) if watermark else 0,
+                "scores": [None if s is None else float(s) for s in scores],
+            }
+        )
+    return tails
+
+
+def student_change_seqs(redis_client, emails: list[str]) -> list[int | None]:
+    """Return the sequence number of each student's latest logged change."""
+    if not emails:
+        return []
+    return [None if s is None else int(s) for s in redis_client.zmscore(STUDENT_CHANGES_KEY, emails)]
+
+
+def merge_candidates(
+    redis_client, job_code: str, matches: list[dict], drop: list[str], limit: int
+) -> list[str]:
+    """Insert or rescore candidates, drop others, and trim back to ``limit``.
+
+    The set is read and rewritten under ``WATCH``, so a rematch saving the
+    same job in between makes the merge start over on the new set rather
+    than one write silently overwriting the other. Returns the emails
+    evicted from the tail by the trim.
+    """
+    key = results_key(job_code)
+    with redis_client.pipeline(transaction=True) as pipe:
+        while True:
+            try:
+                pipe.watch(key)
+                scores = dict(pipe.zrange(key, 0, -1, withscores=True))
+                for email in drop:
+                    scores.pop(email, None)
+                scores.update({m["email"]: float(m["score"]) for m in matches})
+                ranked = sorted(scores.items(), key=lambda kv: (kv[1], kv[0]))
+                evicted = [email for email, _ in ranked[: max(0, len(ranked) - limit)]]
+                gone = set(evicted)
+                kept = {m["email"]: m for m in matches if m["email"] not in gone}
+                removed = [e for e in drop if e not in kept] + evicted
+                pipe.multi()
+                if removed:
+                    pipe.zrem(key, *removed)
+                    pipe.hdel(details_key(job_code), *removed)
+                if kept:
+                    pipe.zadd(key, {e: float(m["score"]) for e, m in kept.items()})
+                    pipe.hset(details_key(job_code), mapping={e: _details(m) for e, m in kept.items()})
+                pipe.execute()
+                return evicted
+            except WatchError:
+                continue
+
+
+def init_matched_jobs(redis_client) -> int:
+    """Backfill ``matched_jobs`` from stored match results if it does not exist yet."""
+    if redis_client.exists(MATCHED_JOBS_KEY):
+        return 0
+    codes = [key.split(":", 1)[1] for key in redis_client.scan_iter(f"{MATCH_RESULTS_PREFIX}:*")]
+    if codes:
+        redis_client.sadd(MATCHED_JOBS_KEY, *codes)
+    return len(codes)
+
+
+def migrate_legacy_matches(redis_client) -> int:
+    """Convert match results saved as a single JSON array to the sorted-set layout."""
+    migrated = 0
+    for key in list(redis_client.scan_iter(f"{MATCH_RESULTS_PREFIX}:*")):
+        if redis_client.type(key) != "string":
+            continue
+        job_code = key.split(":", 1)[1]
+        try:
+            matches = json.loads(redis_client.get(key) or "[]")
+            save_matches(redis_client, job_code, [m for m in matches if m.get("email")])
+            migrated += 1
+        except Exception as e:
+            print(f"[matches] Failed to migrate {key}: {e}")
+    return migrated
+
+
+def record_student_change(redis_client, email: str):
+    """Log that a student's profile or eligibility changed.
+
+    The sequence number and log entry are written together, so the highest
+    logged number read by ``student_change_watermark`` never skips a change
+    still being written.
+    """
+    log_change(redis_client, STUDENT_CHANGE_SEQ_KEY, STUDENT_CHANGES_KEY, email)
+
+
+def student_change_watermark(redis_client) -> int:
+    """Return the sequence number of the latest logged student change."""
+    latest = redis_client.zrange(STUDENT_CHANGES_KEY, -1, -1, withscores=True)
+    return int(latest[0][1]) if latest else 0
+
+
+def students_changed_since(redis_client, watermark: int) -> list[str]:
+    """Return students whose latest change was logged after ``watermark``."""
+    return list(redis_client.zrangebyscore(STUDENT_CHANGES_KEY, f"({watermark}", "+inf"))
+
+
+def get_match_state(redis_client, job_code: str) -> dict:
+    """Return the stored match state of a job with typed fields."""
+    state = dict(redis_client.hgetall(state_key(job_code)) or {})
+    for field in ("limit", "watermark"):
+        if state.get(field):
+            state[field] = int(state[field])
+    state["complete"] = state.get("complete") != "0"
+    return state
+
+
+def save_match_pool(
+    redis_client,
+    job_code: str,
+    scores: dict[str, float],
+    distances: dict[str, float],
+    watermark: int,
+    fingerprint: str,
+    complete: bool = True,
+):
+    """Replace the retained candidate pool of a job after a full match.
+
+    ``complete`` is false when only part of the candidates were retained,
+    so a delta rematch that runs out of pool knows to fall back to a full one.
+    """
+    pipe = redis_client.pipeline(transaction=True)
+    pipe.delete(pool_key(job_code), distances_key(job_code))
+    if scores:
+        pipe.zadd(pool_key(job_code), scores)
+    if distances:
+        pipe.hset(distances_key(job_code), mapping={e: repr(float(d)) for e, d in distances.items()})
+    pipe.hset(
+        state_key(job_code),
+        mapping={
+            "watermark": str(watermark),
+            "fingerprint": fingerprint,
+            "complete": "1" if complete else "0",
+        },
+    )
+    pipe.execute()
+
+
+def update_match_pool(
+    redis_client,
+    job_code: str,
+    drop: list[str],
+    scores: dict[str, float],
+    watermark: int,
+    complete: bool = True,
+):
+    """Replace the pool entries of changed students and advance the watermark.
+
+    Passing ``complete=False`` marks the pool partial from now on.
+    """
+    pipe = redis_client.pipeline(transaction=True)
+    if drop:
+        pipe.zrem(pool_key(job_code), *drop)
+        pipe.hdel(distances_key(job_code), *drop)
+    if scores:
+        pipe.zadd(pool_key(job_code), scores)
+    state = {"watermark": str(watermark)}
+    if not complete:
+        state["complete"] = "0"
+    pipe.hset(state_key(job_code), mapping=state)
+    pipe.execute()
+
+
+def ranked_pool(redis_client, job_code: str, start: int, count: int) -> list[tuple[str, float]]:
+    """Return ``count`` pooled ``(email, score)`` pairs from rank ``start``, best first."""
+    ranked = redis_client.zrevrange(pool_key(job_code), start, start + count - 1, withscores=True)
+    return [(email, float(score)) for email, score in ranked]
+
+
+def pool_distances(redis_client, job_code: str, emails: list[str]) -> dict[str, float]:
+    """Return the driving distances already known for ``emails``."""
+    if not emails:
+        return {}
+    values = redis_client.hmget(distances_key(job_code), emails)
+    return {e: float(v) for e, v in zip(emails, values) if v is not None}
+
+
+def save_pool_distances(redis_client, job_code: str, distances: dict[str, float]):
+    if distances:
+        redis_client.hset(
+            distances_key(job_code), mapping={e: repr(float(d)) for e, d in distances.items()}
+        )
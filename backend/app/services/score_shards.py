@@ -0,0 +1,210 @@
+"""Scatter-gather scoring of a job across every API replica.
+
+A coordinator stores the job embedding and match filters under
+``score_request:{id}`` and pushes one task per shard onto ``score_tasks``.
+A score worker on any node pops a task and scores the students whose email
+hashes into that shard against its own copy of the student index. It applies
+the cheap filters and pushes its local top-k onto ``score_replies:{id}``.
+The coordinator merges whatever has arrived by the deadline and can score
+the shards that did not answer itself.
+
+The request key expires at the deadline, so workers judge it by the Redis
+server's clock rather than their own.
+
+``python -m backend.app.services.score_shards`` runs standalone score
+workers against the Redis in ``REDIS_URL``.
+"""
+
+import json
+import os
+import socket
+import time
+import uuid
+
+import numpy as np
+
+from backend.app.services.candidates import eligible_students
+from backend.app.services.distance import beyond_travel_range
+from backend.app.services.student_index import ScoredPool, StudentIndex, ranked_blocks
+
+SCORE_TASKS_KEY = "score_tasks"
+SCORE_REQUEST_PREFIX = "score_request"
+SCORE_REPLIES_PREFIX = "score_replies"
+
+
+def request_key(request_id: str) -> str:
+    return f"{SCORE_REQUEST_PREFIX}:{request_id}"
+
+
+def replies_key(request_id: str) -> str:
+    return f"{SCORE_REPLIES_PREFIX}:{request_id}"
+
+
+def score_request(
+    job_emb: list[float],
+    shards: int,
+    top_k: int,
+    lat: float,
+    lng: float,
+    poster_code: str | None = None,
+    uninterested=(),
+) -> dict:
+    """Describe a job to score for ``scatter`` and ``score_shard``."""
+    return {
+        "embedding": [float(x) for x in job_emb],
+        "shards": shards,
+        "top_k": top_k,
+        "lat": lat,
+        "lng": lng,
+        "poster_code": poster_code,
+        "uninterested": sorted(uninterested),
+    }
+
+
+def scatter(redis_client, request: dict, deadline: float) -> str:
+    """Publish a scoring request and one task per shard; returns the request id."""
+    request_id = uuid.uuid4().hex
+    redis_client.set(
+        request_key(request_id), json.dumps(request), px=max(1, int(deadline * 1000))
+    )
+    redis_client.rpush(
+        SCORE_TASKS_KEY, *[f"{request_id}:{shard}" for shard in range(request["shards"])]
+    )
+    return request_id
+
+
+def score_shard(redis_client, index: StudentIndex, request: dict, shard: int) -> list[list]:
+    """Return the local top-k of one shard as ``[email, score, name, lat, lng, max_travel]`` rows."""
+    emails = index.shard(shard, request["shards"])
+    if request.get("poster_code"):
+        emails &= eligible_students(redis_client, request["poster_code"])
+    emails -= set(request.get("uninterested") or [])
+    pool = index.score(request["embedding"], emails=emails)
+    rows = np.flatnonzero(
+        ~beyond_travel_range(pool.lat, pool.lng, pool.max_travel, request["lat"], request["lng"])
+    )
+    top = rows[next(ranked_blocks(pool.scores[rows], request["top_k"]), rows[:0])]
+    return [
+        [pool.emails[i], float(pool.scores[i]), pool.names[i],
+         float(pool.lat[i]), float(pool.lng[i]), float(pool.max_travel[i])]
+        for i in top
+    ]
+
+
+def serve_score_task(
+    redis_client, index: StudentIndex, timeout: float | None = None, refresh=None
+) -> bool:
+    """Score the next queued shard, if any. Returns whether a task was taken.
+
+    ``refresh`` brings ``index`` up to date before scoring. By default the
+    index is synced from ``redis_client``, which must then return raw bytes.
+    """
+    if timeout is not None:
+        popped = redis_client.blpop([SCORE_TASKS_KEY], timeout=timeout)
+        task = popped[1] if popped else None
+    else:
+        task = redis_client.lpop(SCORE_TASKS_KEY)
+    if not task:
+        return False
+    request_id, shard = task.rsplit(":", 1)
+    raw = redis_client.get(request_key(request_id))
+    if not raw:
+        print(f"[shards] SKIP: shard {shard} of {request_id} - past its deadline")
+        return True
+    request = json.loads(raw)
+    if refresh:
+        refresh()
+    else:
+        index.sync(redis_client)
+    students = score_shard(redis_client, index, request, int(shard))
+    key = replies_key(request_id)
+    redis_client.rpush(
+        key, json.dumps({"shard": int(shard), "node": socket.gethostname(), "students": students})
+    )
+    # Outlive the request by a second in case the coordinator is still gathering
+    remaining = redis_client.pttl(request_key(request_id))
+    redis_client.expire(key, max(1, int(np.ceil(max(remaining, 0) / 1000))) + 1)
+    return True
+
+
+def gather(
+    redis_client, request_id: str, shards: int, deadline: float, fallback=None
+) -> tuple[ScoredPool, int]:
+    """Merge shard replies until every shard answered or ``deadline`` seconds passed.
+
+    When some shards answered but not all, ``fallback(shard)`` supplies the
+    rows of each missing one, so its students are not silently dropped.
+    Returns the merged candidates and how many shards the workers answered.
+    """
+    end = time.monotonic() + deadline
+    answered = set()
+    students = {}
+    while len(answered) < shards:
+        remaining = end - time.monotonic()
+        if remaining <= 0:
+            break
+        popped = redis_client.blpop([replies_key(request_id)], timeout=remaining)
+        if not popped:
+            break
+        reply = json.loads(popped[1])
+        answered.add(reply["shard"])
+        for row in reply["students"]:
+            students[row[0]] = row
+    redis_client.delete(request_key(request_id), replies_key(request_id))
+    if answered and fallback is not None:
+        for shard in sorted(set(range(shards)) - answered):
+            for row in fallback(shard):
+                students[row[0]] = row
+    rows = list(students.values())
+    pool = ScoredPool(
+        emails=[r[0] for r in rows],
+        names=[r[2] for r in rows],
+        scores=np.array([r[1] for r in rows], dtype=np.float32),
+        lat=np.array([r[3] for r in rows], dtype=np.float64),
+        lng=np.array([r[4] for r in rows], dtype=np.float64),
+        max_travel=np.array([r[5] for r in rows], dtype=np.float64),
+    )
+    return pool, len(answered)
+
+
+def main():
+    import argparse
+    from concurrent.futures import ThreadPoolExecutor
+
+    import redis
+    from dotenv import load_dotenv
+
+    load_dotenv()
+    parser = argparse.ArgumentParser(description="Serve scatter-gather scoring tasks")
+    parser.add_argument("--workers", type=int, default=1)
+    parser.add_argument("--poll", type=float, default=5.0)
+    args = parser.parse_args()
+
+    url = os.getenv("REDIS_URL", "redis://localhost:6379/0")
+    redis_client = redis.Redis.from_url(url, decode_responses=True)
+    redis_bytes = redis.Redis.from_url(url, decode_responses=False)
+    dimensions = int(os.getenv("EMBEDDING_DIMENSIONS", "0")) or None
+    index = StudentIndex(
+        dimensions=dimensions, quantization=os.getenv("STUDENT_INDEX_QUANTIZATION") or None
+    )
+    index.sync(redis_client, redis_bytes)
+
+    def serve():
+        while True:
+            try:
+                serve_score_task(
+                    redis_client, index, timeout=args.poll,
+                    refresh=lambda: index.sync(redis_client, redis_bytes),
+                )
+            except Exception as e:
+                print(f"[shards] Worker error: {e}")
+                time.sleep(1)
+
+    print(f"[shards] Serving score tasks with {args.workers} workers")
+    with ThreadPoolExecutor(args.workers) as pool:
+        for _ in range(args.workers):
+            pool.submit(serve)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,752 @@
+"""In-memory index of student embeddings used for matching.
+
+Embeddings live apart from the profile JSON under ``student_embedding:{email}``
+as raw little-endian float32 bytes, so profile reads stay small and vectors
+can be bulk-loaded with ``MGET`` and decoded with ``numpy.frombuffer``.
+
+Several worker processes can share one copy of the matrix: a single writer,
+chosen with a lease in Redis, applies changes and publishes the index as
+``.npy`` files under a shared directory, and the other workers map the latest
+published version read-only. The same files double as a snapshot: a worker
+starting up maps them and replays only the changes logged since.
+"""
+
+import json
+import os
+import shutil
+import threading
+import zlib
+from concurrent.futures import ThreadPoolExecutor
+from typing import NamedTuple
+
+import numpy as np
+from redis.exceptions import WatchError
+
+STUDENT_INDEX_VERSION_KEY = "student_index:version"
+# email -> index version of the student's latest change, replayed by stale workers
+STUDENT_INDEX_CHANGES_KEY = "student_index:changes"
+# Index version at which the IVF centroids were last trained
+IVF_VERSION_KEY = "student_index:ivf_version"
+# Lease held by the worker that publishes the shared matrix
+STUDENT_INDEX_WRITER_KEY = "student_index:writer"
+# File in the shared directory naming the latest published version
+PUBLISHED_POINTER = "CURRENT"
+PUBLISHED_KEEP = 2
+# IVF centroids shared by every worker, as raw little-endian float32 rows
+IVF_CENTROIDS_KEY = "student_index:ivf_centroids"
+STUDENT_EMBEDDING_PREFIX = "student_embedding"
+LOAD_BATCH_SIZE = 500
+EMBEDDING_DTYPE = np.dtype("<f4")
+QUANTIZATIONS = ("float16", "int8")
+# Quantized rows are widened to float32 this many at a time while scoring
+SCORE_CHUNK_ROWS = 8192
+# Pools smaller than this many rows per thread are scored on the calling thread
+SCORE_SHARD_ROWS = 16384
+
+
+def embedding_key(email: str) -> str:
+    return f"{STUDENT_EMBEDDING_PREFIX}:{email}"
+
+
+def encode_embedding(embedding) -> bytes:
+    """Pack an embedding as little-endian float32 bytes."""
+    return np.asarray(embedding, dtype=EMBEDDING_DTYPE).tobytes()
+
+
+def decode_embedding(raw: bytes | None) -> np.ndarray | None:
+    """Unpack stored embedding bytes without copying them."""
+    if not raw:
+        return None
+    return np.frombuffer(raw, dtype=EMBEDDING_DTYPE)
+
+
+def save_student_embedding(binary_client, email: str, embedding):
+    binary_client.set(embedding_key(email), encode_embedding(embedding))
+
+
+def load_student_embeddings(binary_client, emails: list[str]) -> list[np.ndarray | None]:
+    """Fetch several students' embeddings with one ``MGET``."""
+    if not emails:
+        return []
+    return [decode_embedding(raw) for raw in binary_client.mget([embedding_key(e) for e in emails])]
+
+
+def log_change(redis_client, counter_key: str, log_key: str, email: str) -> int:
+    """Advance ``counter_key`` and log ``email`` at the new value in the ``log_key`` zset.
+
+    Both writes commit together under ``WATCH``. With a separate ``INCR``
+    and ``ZADD``, a concurrent writer could log version n + 1 before n is
+    in the log, and readers replaying past n + 1 would never see n.
+    """
+    with redis_client.pipeline(transaction=True) as pipe:
+        while True:
+            try:
+                pipe.watch(counter_key)
+                version = int(pipe.get(counter_key) or 0) + 1
+                pipe.multi()
+                pipe.set(counter_key, version)
+                pipe.zadd(log_key, {email: version})
+                pipe.execute()
+                return version
+            except WatchError:
+                continue
+
+
+def claim_writer(redis_client, owner: str, ttl: int) -> bool:
+    """Take or renew the shared-index writer lease; returns whether ``owner`` holds it."""
+    if redis_client.set(STUDENT_INDEX_WRITER_KEY, owner, nx=True, ex=ttl):
+        return True
+    if redis_client.get(STUDENT_INDEX_WRITER_KEY) == owner:
+        redis_client.expire(STUDENT_INDEX_WRITER_KEY, ttl)
+        return True
+    return False
+
+
+class ScoredPool(NamedTuple):
+    """Scores for every indexed student plus the columns matching needs."""
+
+    emails: list[str]
+    names: list[str]
+    scores: np.ndarray
+    lat: np.ndarray
+    lng: np.ndarray
+    max_travel: np.ndarray
+
+    def take(self, rows, column: int | None = None) -> "ScoredPool":
+        """Return the given rows; ``column`` picks one job out of a batch-scored pool."""
+        rows = np.asarray(rows, dtype=np.intp)
+        scores = self.scores[rows] if column is None else self.scores[rows, column]
+        return ScoredPool(
+            emails=[self.emails[r] for r in rows],
+            names=[self.names[r] for r in rows],
+            scores=np.ascontiguousarray(scores),
+            lat=self.lat[rows],
+            lng=self.lng[rows],
+            max_travel=self.max_travel[rows],
+        )
+
+
+class StudentIndex:
+    """Contiguous matrix of student embeddings with a row<->email map.
+
+    The index is loaded once from ``student:*`` and kept in sync by the
+    student endpoints. Every mutation bumps a version counter in Redis and
+    logs the student against the new version, so other workers notice the
+    change and replay just the logged students on their next match.
+
+    With ``dimensions`` only that many leading components of each embedding
+    are kept, renormalised to unit length. This matches what the embeddings
+    API returns for a shortened ``text-embedding-3`` vector.
+
+    ``quantization`` stores rows as ``float16`` or as ``int8`` with one
+    float32 scale per row, cutting memory to a half or a quarter. Either
+    option makes scores approximate; callers re-rank the best candidates on
+    exact vectors when ``lossy`` is set.
+
+    For large pools ``train_ivf`` clusters the rows with spherical k-means
+    into an inverted file: every row carries the label of its nearest
+    centroid, kept current as students are added or removed, and
+    ``score(..., nprobe=n)`` only scores rows in the ``n`` lists whose
+    centroids are closest to the job. Centroids are persisted in Redis so
+    workers share one partitioning without retraining.
+
+    ``publish`` writes the index to a shared directory and ``attach`` maps a
+    published copy read-only; an attached index leaves changes to the
+    writer and only logs them.
+
+    With ``scoring_threads`` above 1, large pools are split into that many
+    row shards scored in parallel. NumPy releases the GIL while gathering,
+    widening and multiplying rows, so the shards run on separate cores
+    against the same matrix.
+    """
+
+    def __init__(
+        self,
+        dimensions: int | None = None,
+        quantization: str | None = None,
+        scoring_threads: int = 0,
+    ):
+        if quantization and quantization not in QUANTIZATIONS:
+            raise ValueError(f"Unknown quantization {quantization!r}")
+        self.dimensions = dimensions
+        self.quantization = quantization or None
+        self.scoring_threads = scoring_threads
+        self._executor = (
+            ThreadPoolExecutor(scoring_threads, thread_name_prefix="index-score")
+            if scoring_threads > 1
+            else None
+        )
+        self._dtype = np.dtype(self.quantization or np.float32)
+        self._lock = threading.RLock()
+        self._loaded = False
+        self.version = 0
+        self.readonly = False
+        self._published: str | None = None
+        self._ivf_version = 0
+        self._centroids: np.ndarray | None = None
+        self._reset(0)
+
+    def _reset(self, dim: int, capacity: int = 0):
+        self.dim = dim
+        self._size = 0
+        self._emails: list[str] = []
+        self._names: list[str] = []
+        self._rows: dict[str, int] = {}
+        self._matrix = np.zeros((capacity, dim), dtype=self._dtype)
+        # Per-row dequantisation factor; only int8 rows use it
+        self._scale = np.ones(capacity, dtype=np.float32)
+        # IVF list of each row, -1 until centroids exist
+        self._list = np.full(capacity, -1, dtype=np.int32)
+        self._lat = np.zeros(capacity, dtype=np.float64)
+        self._lng = np.zeros(capacity, dtype=np.float64)
+        self._max_travel = np.zeros(capacity, dtype=np.float64)
+
+    @property
+    def lossy(self) -> bool:
+        """Whether scores only approximate the full float32 vectors."""
+        return bool(self.dimensions or self.quantization)
+
+    @property
+    def nbytes(self) -> int:
+        """Bytes held by the embedding rows in use."""
+        per_row = self.dim * self._dtype.itemsize + (4 if self.quantization == "int8" else 0)
+        return self._size * per_row
+
+    @property
+    def ivf_lists(self) -> int:
+        """Number of IVF lists, 0 while the inverted file is untrained."""
+        return 0 if self._centroids is None else len(self._centroids)
+
+    @property
+    def loaded(self) -> bool:
+        return self._loaded
+
+    def __len__(self) -> int:
+        return self._size
+
+    def __contains__(self, email: str) -> bool:
+        return email in self._rows
+
+    def _grow(self, needed: int):
+        capacity = self._matrix.shape[0]
+        if needed <= capacity:
+            return
+        new_capacity = max(needed, capacity * 2, 64)
+        matrix = np.zeros((new_capacity, self.dim), dtype=self._dtype)
+        matrix[: self._size] = self._matrix[: self._size]
+        self._matrix = matrix
+        # Unused rows hold the same values as in a new index
+        fills = {"_scale": 1, "_list": -1, "_lat": 0, "_lng": 0, "_max_travel": 0}
+        for name, fill in fills.items():
+            old = getattr(self, name)
+            col = np.full(new_capacity, fill, dtype=old.dtype)
+            col[: self._size] = old[: self._size]
+            setattr(self, name, col)
+
+    def reduce(self, embedding) -> np.ndarray:
+        """Return the part of an embedding the index scores on."""
+        vec = np.asarray(embedding, dtype=np.float32)
+        if self.dimensions and len(vec) > self.dimensions:
+            vec = vec[: self.dimensions]
+            norm = np.linalg.norm(vec)
+            if norm:
+                vec = vec / norm
+        return vec
+
+    def _put(self, email: str, student: dict, emb=None) -> bool:
+        # Profiles written before embeddings moved to their own key carry them inline
+        if emb is None:
+            emb = student.get("embedding")
+        if emb is None or not len(emb):
+            return False
+        emb = self.reduce(emb)
+        if not self.dim:
+            self._reset(len(emb))
+        if len(emb) != self.dim:
+            print(f"[index] SKIP: {email} - embedding length {len(emb)} != {self.dim}")
+            return False
+        row = self._rows.get(email)
+        if row is None:
+            self._grow(self._size + 1)
+            row = self._size
+            self._size += 1
+            self._rows[email] = row
+            self._emails.append(email)
+            self._names.append("")
+        if self.quantization == "int8":
+            peak = float(np.abs(emb).max())
+            scale = peak / 127.0 if peak else 1.0
+            self._matrix[row] = np.round(emb / scale).astype(np.int8)
+            self._scale[row] = scale
+        else:
+            self._matrix[row] = emb
+        if self._centroids is not None:
+            self._list[row] = int(np.argmax(self._centroids @ emb))
+        self._names[row] = f"{student.get('first_name', '')} {student.get('last_name', '')}"
+        self._lat[row] = float(student.get("lat") or 0.0)
+        self._lng[row] = float(student.get("lng") or 0.0)
+        self._max_travel[row] = float(student.get("max_travel") or 0.0)
+        return True
+
+    def _drop(self, email: str):
+        row = self._rows.pop(email, None)
+        if row is None:
+            return
+        last = self._size - 1
+        if row != last:
+            # Move the last row into the hole so the matrix stays contiguous
+            moved = self._emails[last]
+            self._matrix[row] = self._matrix[last]
+            self._scale[row] = self._scale[last]
+            self._list[row] = self._list[last]
+            self._lat[row] = self._lat[last]
+            self._lng[row] = self._lng[last]
+            self._max_travel[row] = self._max_travel[last]
+            self._emails[row] = moved
+            self._names[row] = self._names[last]
+            self._rows[moved] = row
+        self._emails.pop()
+        self._names.pop()
+        self._size = last
+
+    def load(self, redis_client, binary_client=None):
+        """Rebuild the index from every ``student:*`` record in Redis.
+
+        ``binary_client`` must return raw bytes; it defaults to ``redis_client``.
+        """
+        binary_client = binary_client or redis_client
+        with self._lock:
+            version = int(redis_client.get(STUDENT_INDEX_VERSION_KEY) or 0)
+            self._ivf_version = int(redis_client.get(IVF_VERSION_KEY) or 0)
+            self._centroids = None
+            self.readonly = False
+            self._reset(0)
+            keys = [k for k in redis_client.scan_iter("student:*") if str(k).startswith("student:")]
+            for start in range(0, len(keys), LOAD_BATCH_SIZE):
+                batch = keys[start:start + LOAD_BATCH_SIZE]
+                self._refresh(redis_client, binary_client, [k.split("student:", 1)[1] for k in batch])
+            self._load_centroids(binary_client)
+            self.version = version
+            self._loaded = True
+            print(f"[index] Loaded {self._size} student embeddings (version {version})")
+
+    def _refresh(self, redis_client, binary_client, emails: list[str]):
+        """Re-read ``emails`` from Redis, dropping students that no longer exist."""
+        vectors = load_student_embeddings(binary_client, emails)
+        profiles = redis_client.mget([f"student:{e}" for e in emails])
+        for email, raw, emb in zip(emails, profiles, vectors):
+            try:
+                student = json.loads(raw) if raw else None
+            except Exception:
+                student = None
+            if not student or not self._put(email, student, emb):
+                self._drop(email)
+
+    def replay(self, redis_client, binary_client=None) -> int:
+        """Apply the student changes logged after this index's version.
+
+        Returns the number of students re-read from Redis.
+        """
+        binary_client = binary_client or redis_client
+        with self._lock:
+            changes = redis_client.zrangebyscore(
+                STUDENT_INDEX_CHANGES_KEY, f"({self.version}", "+inf", withscores=True
+            )
+            for start in range(0, len(changes), LOAD_BATCH_SIZE):
+                batch = changes[start:start + LOAD_BATCH_SIZE]
+                self._refresh(redis_client, binary_client, [email for email, _ in batch])
+            ivf_version = int(redis_client.get(IVF_VERSION_KEY) or 0)
+            if ivf_version > self._ivf_version:
+                self._ivf_version = ivf_version
+                self._load_centroids(binary_client)
+            self.version = max([self.version, ivf_version] + [int(v) for _, v in changes])
+            if changes:
+                print(f"[index] Replayed {len(changes)} student changes (version {self.version})")
+            return len(changes)
+
+    def _load_centroids(self, binary_client):
+        centroids = decode_embedding(binary_client.get(IVF_CENTROIDS_KEY))
+        if centroids is None or not self.dim or len(centroids) % self.dim:
+            return
+        self._centroids = centroids.reshape(-1, self.dim)
+        self._assign(np.arange(self._size))
+        print(f"[index] Assigned {self._size} students to {self.ivf_lists} IVF lists")
+
+    def _vectors(self, rows) -> np.ndarray:
+        vectors = self._matrix[rows].astype(np.float32)
+        if self.quantization == "int8":
+            vectors *= self._scale[rows][:, None]
+        return vectors
+
+    def _assign(self, rows: np.ndarray):
+        for start in range(0, len(rows), SCORE_CHUNK_ROWS):
+            chunk = rows[start:start + SCORE_CHUNK_ROWS]
+            self._list[chunk] = np.argmax(self._vectors(chunk) @ self._centroids.T, axis=1)
+
+    def train_ivf(
+        self,
+        redis_client,
+        binary_client=None,
+        nlist: int | None = None,
+        iterations: int = 10,
+        seed: int = 0,
+    ) -> int:
+        """Cluster the indexed rows into ``nlist`` IVF lists and persist the centroids.
+
+        ``nlist`` defaults to the square root of the pool size. K-means runs
+        on a sample of up to 64 rows per list. Returns the number of lists.
+        """
+        binary_client = binary_client or redis_client
+        with self._lock:
+            n = self._size
+            if not n:
+                return 0
+            nlist = min(n, nlist or max(1, int(np.sqrt(n))))
+            rng = np.random.default_rng(seed)
+            sample = np.sort(rng.choice(n, size=min(n, nlist * 64), replace=False))
+            points = self._vectors(sample)
+            points /= np.maximum(np.linalg.norm(points, axis=1, keepdims=True), 1e-12)
+            centroids = points[rng.choice(len(points), size=nlist, replace=False)]
+            for _ in range(iterations):
+                labels = np.argmax(points @ centroids.T, axis=1)
+                sums = np.zeros_like(centroids)
+                np.add.at(sums, labels, points)
+                empty = ~np.bincount(labels, minlength=nlist).astype(bool)
+                # Reseed empty lists from random points so every list stays in use
+                sums[empty] = points[rng.choice(len(points), size=int(empty.sum()))]
+                centroids = sums / np.maximum(np.linalg.norm(sums, axis=1, keepdims=True), 1e-12)
+
+            binary_client.set(IVF_CENTROIDS_KEY, encode_embedding(centroids))
+            version = int(redis_client.incr(STUDENT_INDEX_VERSION_KEY))
+            redis_client.set(IVF_VERSION_KEY, version)
+            if version == self.version + 1:
+                self.version = version
+            # A mapped copy cannot be relabelled; the writer picks the centroids up
+            if not self.readonly:
+                self._ivf_version = version
+                self._centroids = centroids.astype(np.float32)
+                self._assign(np.arange(n))
+            print(f"[index] Trained {nlist} IVF lists on {len(sample)} of {n} students")
+            return nlist
+
+    def sync(self, redis_client, binary_client=None):
+        """Load the index, or replay changes other workers made since the last sync."""
+        with self._lock:
+            if not self._loaded:
+                self.load(redis_client, binary_client)
+                return
+            self.make_writable()
+            if int(redis_client.get(STUDENT_INDEX_VERSION_KEY) or 0) != self.version:
+                self.replay(redis_client, binary_client)
+
+    def _bump(self, redis_client, email: str) -> bool:
+        """Log a change to ``email`` and return whether to apply it to this copy."""
+        version = log_change(
+            redis_client, STUDENT_INDEX_VERSION_KEY, STUDENT_INDEX_CHANGES_KEY, email
+        )
+        applied = self._loaded and not self.readonly
+        # Out of step, someone else wrote in between; their changes and this
+        # one are replayed on the next sync. A copy that does not apply the
+        # change must not claim its version either.
+        if applied and version == self.version + 1:
+            self.version = version
+        return applied
+
+    def upsert(self, redis_client, email: str, student: dict, embedding=None):
+        """Insert or replace a student's row after their profile is saved."""
+        with self._lock:
+            if self._bump(redis_client, email):
+                if not self._put(email, student, embedding):
+                    self._drop(email)
+
+    def remove(self, redis_client, email: str):
+        """Drop a student's row after their profile is deleted."""
+        with self._lock:
+            if self._bump(redis_client, email):
+                self._drop(email)
+
+    def publish(self, directory: str) -> str | None:
+        """Write the index under ``directory`` for other workers to map.
+
+        Each version gets its own subdirectory and ``CURRENT`` is switched to
+        it atomically, so readers never see a half-written copy. Returns the
+        published version's name, or ``None`` when it was already published.
+        """
+        with self._lock:
+            name = f"v{self.version}"
+            if name == self._published or not self._loaded:
+                return None
+            n = self._size
+            final = os.path.join(directory, name)
+            staging = os.path.join(directory, f".{name}.{os.getpid()}")
+            shutil.rmtree(staging, ignore_errors=True)
+            os.makedirs(staging)
+            columns = {
+                "matrix": self._matrix[:n],
+                "scale": self._scale[:n],
+                "list": self._list[:n],
+                "lat": self._lat[:n],
+                "lng": self._lng[:n],
+                "max_travel": self._max_travel[:n],
+            }
+            if self._centroids is not None:
+                columns["centroids"] = self._centroids
+            for column, values in columns.items():
+                np.save(os.path.join(staging, f"{column}.npy"), values)
+            meta = {
+                "version": self.version,
+                "ivf_version": self._ivf_version,
+                "dim": self.dim,
+                "dimensions": self.dimensions,
+                "quantization": self.quantization,
+                "emails": self._emails,
+                "names": self._names,
+            }
+            with open(os.path.join(staging, "meta.json"), "w") as f:
+                json.dump(meta, f)
+            shutil.rmtree(final, ignore_errors=True)
+            os.replace(staging, final)
+            pointer = os.path.join(directory, f".{PUBLISHED_POINTER}.{os.getpid()}")
+            with open(pointer, "w") as f:
+                f.write(name)
+            os.replace(pointer, os.path.join(directory, PUBLISHED_POINTER))
+            self._published = name
+
+        # Workers still mapping an older copy keep it until they re-attach
+        published = sorted(
+            (d for d in os.listdir(directory) if d.startswith("v") and d[1:].isdigit()),
+            key=lambda d: int(d[1:]),
+        )
+        for old in published[:-PUBLISHED_KEEP]:
+            shutil.rmtree(os.path.join(directory, old), ignore_errors=True)
+        print(f"[index] Published {n} student embeddings as {name}")
+        return name
+
+    def attach(self, directory: str, writable: bool = False, min_version: int = 0) -> bool:
+        """Map the latest copy published under ``directory`` read-only.
+
+        With ``writable`` the files are mapped copy-on-write, so this worker
+        can apply changes without touching the published copy. Returns
+        ``False`` when nothing usable has been published, e.g. by a writer
+        configured with other dimensions or quantization, or when the latest
+        copy is older than ``min_version``.
+        """
+        try:
+            with open(os.path.join(directory, PUBLISHED_POINTER)) as f:
+                name = f.read().strip()
+        except FileNotFoundError:
+            return False
+        with self._lock:
+            if self.readonly and not writable and name == self._published:
+                return self.version >= min_version
+            path = os.path.join(directory, name)
+            try:
+                with open(os.path.join(path, "meta.json")) as f:
+                    meta = json.load(f)
+            except FileNotFoundError:
+                return False
+            if meta["dimensions"] != self.dimensions or meta["quantization"] != self.quantization:
+                return False
+            if meta["version"] < min_version:
+                return False
+
+            def column(name):
+                return np.load(os.path.join(path, f"{name}.npy"), mmap_mode="c" if writable else "r")
+
+            self._reset(meta["dim"])
+            self._matrix = column("matrix")
+            self._scale = column("scale")
+            self._list = column("list")
+            self._lat = column("lat")
+            self._lng = column("lng")
+            self._max_travel = column("max_travel")
+            self._centroids = (
+                column("centroids") if os.path.exists(os.path.join(path, "centroids.npy")) else None
+            )
+            self._emails = meta["emails"]
+            self._names = meta["names"]
+            self._rows = {email: row for row, email in enumerate(self._emails)}
+            self._size = len(self._emails)
+            self.version = meta["version"]
+            self._ivf_version = meta["ivf_version"]
+            self._published = name
+            self.readonly = not writable
+            self._loaded = True
+            return True
+
+    def restore(self, redis_client, binary_client, directory: str) -> bool:
+        """Start from the snapshot under ``directory`` and replay later changes.
+
+        Returns ``False``, leaving the index unloaded, when there is no usable
+        snapshot or Redis has been reset since it was taken.
+        """
+        with self._lock:
+            if not self.attach(directory, writable=True):
+                return False
+            current = int(redis_client.get(STUDENT_INDEX_VERSION_KEY) or 0)
+            if current < self.version:
+                print(f"[index] Ignoring snapshot {self._published}: Redis is at version {current}")
+                self._published = None
+                self._loaded = False
+                self._reset(0)
+                return False
+            replayed = self.replay(redis_client, binary_client)
+            print(
+                f"[index] Restored {self._size} students from snapshot {self._published}, "
+                f"replayed {replayed} changes"
+            )
+            return True
+
+    def make_writable(self):
+        """Copy a mapped index into private memory so this worker can write to it."""
+        with self._lock:
+            if not self.readonly:
+                return
+            for name in ("_matrix", "_scale", "_list", "_lat", "_lng", "_max_travel"):
+                setattr(self, name, np.array(getattr(self, name)))
+            if self._centroids is not None:
+                self._centroids = np.array(self._centroids)
+            self._emails = list(self._emails)
+            self._names = list(self._names)
+            self.readonly = False
+
+    def locations(self) -> list[tuple[str, float, float]]:
+        """Return ``(email, lat, lng)`` for every indexed student."""
+        with self._lock:
+            return [
+                (self._emails[r], float(self._lat[r]), float(self._lng[r]))
+                for r in range(self._size)
+            ]
+
+    def shard(self, shard: int, shards: int) -> set[str]:
+        """Return the students in ``shard`` of ``shards``.
+
+        Students are split by a CRC of their email, so every node agrees on
+        the split whatever order its rows are in.
+        """
+        with self._lock:
+            return {e for e in self._emails if zlib.crc32(e.encode("utf-8")) % shards == shard}
+
+    def max_travel_limit(self) -> float:
+        """Return the largest ``max_travel`` of any indexed student."""
+        with self._lock:
+            return float(self._max_travel[: self._size].max()) if self._size else 0.0
+
+    def _dot(self, rows, query: np.ndarray) -> np.ndarray:
+        count = rows.stop - rows.start if isinstance(rows, slice) else len(rows)
+        if self._executor is None or count < SCORE_SHARD_ROWS * 2:
+            return self._dot_shard(rows, query)
+        shards = min(self.scoring_threads, count // SCORE_SHARD_ROWS)
+        bounds = np.linspace(0, count, shards + 1).astype(int)
+        scores = np.empty((count,) + query.shape[1:], dtype=np.float32)
+
+        def run(i):
+            lo, hi = bounds[i], bounds[i + 1]
+            part = slice(rows.start + lo, rows.start + hi) if isinstance(rows, slice) else rows[lo:hi]
+            scores[lo:hi] = self._dot_shard(part, query)
+
+        # The caller holds the lock, so no writer can move rows under the shards
+        list(self._executor.map(run, range(shards)))
+        return scores
+
+    def _dot_shard(self, rows, query: np.ndarray) -> np.ndarray:
+        matrix = self._matrix[rows]
+        if not self.quantization:
+            return matrix @ query
+        # Widen quantized rows in chunks so scoring never holds a full float32 copy
+        scores = np.empty((len(matrix),) + query.shape[1:], dtype=np.float32)
+        for start in range(0, len(matrix), SCORE_CHUNK_ROWS):
+            block = matrix[start:start + SCORE_CHUNK_ROWS].astype(np.float32)
+            scores[start:start + len(block)] = block @ query
+        if self.quantization == "int8":
+            scale = self._scale[rows]
+            scores *= scale[:, None] if scores.ndim > 1 else scale
+        return scores
+
+    def score(self, job_emb: list[float], emails=None, nprobe: int | None = None) -> ScoredPool:
+        """Score a job embedding with one matrix-vector product.
+
+        When ``emails`` is given only those students are scored; unknown
+        emails are ignored. With ``nprobe`` and a trained inverted file only
+        rows in the ``nprobe`` lists nearest the job are scored.
+        """
+        job_emb = self.reduce(job_emb)
+        with self._lock:
+            n = self._size
+            if n and len(job_emb) != self.dim:
+                raise ValueError(
+                    f"Job embedding length {len(job_emb)} does not match index dimension {self.dim}"
+                )
+            if emails is None:
+                rows = slice(0, n)
+                picked = list(self._emails)
+                names = list(self._names)
+            else:
+                rows = np.array(sorted(self._rows[e] for e in emails if e in self._rows), dtype=np.intp)
+                picked = [self._emails[r] for r in rows]
+                names = [self._names[r] for r in rows]
+            if nprobe and self._centroids is not None and n:
+                nprobe = min(nprobe, self.ivf_lists)
+                probes = np.argpartition(-(self._centroids @ job_emb), nprobe - 1)[:nprobe]
+                if isinstance(rows, slice):
+                    rows = np.flatnonzero(np.isin(self._list[:n], probes))
+                else:
+                    rows = rows[np.isin(self._list[rows], probes)]
+                picked = [self._emails[r] for r in rows]
+                names = [self._names[r] for r in rows]
+            scores = self._dot(rows, job_emb) if len(picked) else np.zeros(0, dtype=np.float32)
+            return ScoredPool(
+                emails=picked,
+                names=names,
+                scores=scores,
+                lat=self._lat[rows].copy(),
+                lng=self._lng[rows].copy(),
+                max_travel=self._max_travel[rows].copy(),
+            )
+
+    def score_many(self, job_embs: list[list[float]]) -> ScoredPool:
+        """Score several jobs against every student with one matrix product.
+
+        ``scores`` has one column per job, in the order given.
+        """
+        queries = np.stack([self.reduce(emb) for emb in job_embs], axis=1)
+        with self._lock:
+            n = self._size
+            if n and queries.shape[0] != self.dim:
+                raise ValueError(
+                    f"Job embedding length {queries.shape[0]} does not match index dimension {self.dim}"
+                )
+            rows = slice(0, n)
+            scores = (
+                self._dot(rows, queries) if n else np.zeros((0, len(job_embs)), dtype=np.float32)
+            )
+            return ScoredPool(
+                emails=list(self._emails),
+                names=list(self._names),
+                scores=scores,
+                lat=self._lat[rows].copy(),
+                lng=self._lng[rows].copy(),
+                max_travel=self._max_travel[rows].copy(),
+            )
+
+
+def ranked_blocks(scores: np.ndarray, block: int):
+    """Yield positions in descending score order, one block at a time.
+
+    Each block is picked with ``argpartition`` so only the part of the
+    ranking a caller actually consumes is ever sorted. Blocks double in size
+    in case the caller keeps asking for more.
+    """
+    remaining = np.arange(len(scores))
+    block = max(1, block)
+    while len(remaining):
+        if len(remaining) > block:
+            part = np.argpartition(-scores[remaining], block - 1)[:block]
+            top = remaining[part]
+            keep = np.ones(len(remaining), dtype=bool)
+            keep[part] = False
+            remaining = remaining[keep]
+        else:
+            top, remaining = remaining, remaining[:0]
+        yield top[np.argsort(-scores[top], kind="stable")]
+        block *= 2
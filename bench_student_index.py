@@ -0,0 +1,122 @@
+"""Compare quantized student index scoring against the exact float32 path.
+
+Builds a synthetic pool of clustered unit vectors, scores random job queries
+with each storage mode, re-ranks the best candidates on the exact vectors and
+reports recall@5 against exact top-5 along with memory and scoring time.
+
+    python bench_student_index.py --students 50000 --dim 1536 --queries 50 --threads 4
+"""
+
+import argparse
+import time
+
+import numpy as np
+
+from backend.app.services.student_index import StudentIndex, ranked_blocks
+
+
+class _NoRedis:
+    """Just enough of a Redis client for StudentIndex.upsert."""
+
+    def __init__(self):
+        self.version = 0
+
+    def incr(self, key, amount=1):
+        self.version += amount
+        return self.version
+
+    def get(self, key):
+        return self.version
+
+    def set(self, key, value):
+        self.version = int(value)
+
+    def zadd(self, key, mapping):
+        pass
+
+    def pipeline(self, transaction=True):
+        return self
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def watch(self, *keys):
+        pass
+
+    def multi(self):
+        pass
+
+    def execute(self):
+        return []
+
+    def scan_iter(self, pattern="*"):
+        return iter(())
+
+    def mget(self, keys):
+        return [None] * len(keys)
+
+
+def synthetic_pool(students: int, dim: int, clusters: int, rng) -> np.ndarray:
+    centres = rng.normal(size=(clusters, dim)).astype(np.float32)
+    labels = rng.integers(0, clusters, size=students)
+    vectors = centres[labels] + 0.6 * rng.normal(size=(students, dim)).astype(np.float32)
+    return vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+
+
+def build_index(vectors: np.ndarray, quantization: str | None, threads: int = 0) -> StudentIndex:
+    index = StudentIndex(quantization=quantization, scoring_threads=threads)
+    r = _NoRedis()
+    index.sync(r)
+    for i, vec in enumerate(vectors):
+        index.upsert(r, f"s{i}", {"first_name": f"S{i}"}, vec)
+    return index
+
+
+def top_k(scores: np.ndarray, k: int) -> np.ndarray:
+    return next(ranked_blocks(scores, k))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--students", type=int, default=20000)
+    parser.add_argument("--dim", type=int, default=1536)
+    parser.add_argument("--clusters", type=int, default=64)
+    parser.add_argument("--queries", type=int, default=50)
+    parser.add_argument("--rerank", type=int, default=200)
+    parser.add_argument("--k", type=int, default=5)
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--threads", type=int, default=0, help="scoring threads per query")
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(args.seed)
+    vectors = synthetic_pool(args.students, args.dim, args.clusters, rng)
+    queries = synthetic_pool(args.queries, args.dim, args.clusters, rng)
+    exact_top = [set(top_k(vectors @ q, args.k).tolist()) for q in queries]
+
+    print(f"{args.students} students x {args.dim} dims, {args.queries} queries, re-rank top {args.rerank}")
+    print(f"{'mode':<8} {'MiB':>8} {'ms/query':>9} {'recall@k':>9} {'no re-rank':>11}")
+    for mode in (None, "float16", "int8"):
+        index = build_index(vectors, mode, args.threads)
+        hits = raw_hits = 0
+        started = time.perf_counter()
+        for q, expected in zip(queries, exact_top):
+            pool = index.score(q)
+            rows = np.array([int(e[1:]) for e in pool.emails])
+            shortlist = top_k(pool.scores, args.rerank)
+            raw_hits += len(expected & set(rows[shortlist[: args.k]].tolist()))
+            exact = vectors[rows[shortlist]] @ q
+            reranked = rows[shortlist[top_k(exact, args.k)]]
+            hits += len(expected & set(reranked.tolist()))
+        elapsed = (time.perf_counter() - started) / len(queries) * 1000
+        total = args.k * len(queries)
+        print(
+            f"{mode or 'float32':<8} {index.nbytes / 2**20:>8.1f} {elapsed:>9.2f} "
+            f"{hits / total:>9.3f} {raw_hits / total:>11.3f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
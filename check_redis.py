@@ -39,4 +39,4 @@ for key in redis_client.scan_iter("job:*"):
 # If you want to check the last match result, add this:
 print("\n=== Last match results ===")
 match_key = f"match_results:{job_code}"
-print(pretty(redis_client.get(match_key)))
+print(pretty(json.dumps(redis_client.zrevrange(match_key, 0, -1, withscores=True))))
@@ -6,6 +6,9 @@ import AdminMenu from './AdminMenu';
 import loadGoogleMaps from './utils/loadGoogleMaps';
 import './JobPosting.css';
 
+// Give up polling a queued match after this long and show an error instead
+const MATCH_JOB_TIMEOUT_MS = 5 * 60 * 1000;
+
 function JobPosting() {
   const [formData, setFormData] = useState({
     job_title: '',
@@ -29,6 +32,7 @@ function JobPosting() {
   const [selectedRows, setSelectedRows] = useState({});
   const [matches, setMatches] = useState({});
   const [loadingMatches, setLoadingMatches] = useState({});
+  const [matchErrors, setMatchErrors] = useState({});
   const [matchLoaded, setMatchLoaded] = useState({});
   const [matchPresence, setMatchPresence] = useState({});
   const [editMode, setEditMode] = useState({});
@@ -172,21 +176,37 @@ if (shouldRedirect) {
     }
   };
 
+  const waitForMatchJob = async (matchJobId) => {
+    const deadline = Date.now() + MATCH_JOB_TIMEOUT_MS;
+    while (Date.now() < deadline) {
+      const resp = await api.get(`/match-jobs/${matchJobId}`, {
+        headers: { Authorization: `Bearer ${token}` },
+      });
+      if (resp.data.status === 'done') return resp.data;
+      if (resp.data.status === 'failed') throw new Error(resp.data.error);
+      await new Promise((resolve) => setTimeout(resolve, 1000));
+    }
+    throw new Error('Timed out waiting for matches; try again in a few minutes.');
+  };
+
   const handleMatch = async (code) => {
     try {
       setLoadingMatches((prev) => ({ ...prev, [code]: true }));
-      const resp = await api.post(
+      setMatchErrors((prev) => ({ ...prev, [code]: null }));
+      const queued = await api.post(
         '/match',
         { job_code: code },
         {
           headers: { Authorization: `Bearer ${token}` },
         }
       );
+      const resp = { data: await waitForMatchJob(queued.data.match_job_id) };
       const matchResults = resp.data.matches.map((m) => ({ ...m, status: null }));
       setMatches((prev) => ({ ...prev, [code]: matchResults }));
       setMatchPresence((prev) => ({ ...prev, [code]: true }));
     } catch (err) {
       console.error('Error matching job:', err);
+      setMatchErrors((prev) => ({ ...prev, [code]: err.response?.data?.detail || err.message }));
     } finally {
       setLoadingMatches((prev) => ({ ...prev, [code]: false }));
     }
@@ -195,15 +215,18 @@ if (shouldRedirect) {
   const handleRematch = async (code) => {
     try {
       setLoadingMatches((prev) => ({ ...prev, [code]: true }));
-      const resp = await api.post(
+      setMatchErrors((prev) => ({ ...prev, [code]: null }));
+      const queued = await api.post(
         `/rematches/${code}`,
         {},
         { headers: { Authorization: `Bearer ${token}` } }
       );
+      const resp = { data: await waitForMatchJob(queued.data.match_job_id) };
       const matchResults = resp.data.matches.map((m) => ({ ...m, status: null }));
       setMatches((prev) => ({ ...prev, [code]: matchResults }));
     } catch (err) {
       console.error('Error rematching job:', err);
+      setMatchErrors((prev) => ({ ...prev, [code]: err.response?.data?.detail || err.message }));
     } finally {
       setLoadingMatches((prev) => ({ ...prev, [code]: false }));
     }
@@ -466,6 +489,9 @@ if (shouldRedirect) {
         {loadingMatches[job.job_code] && (
           <div className="loader-bar">Loading matches...</div>
         )}
+        {matchErrors[job.job_code] && (
+          <p className="error">Matching failed: {matchErrors[job.job_code]}</p>
+        )}
         <button
           disabled={(selectedRows[job.job_code]?.length || 0) === 0}
           onClick={() => bulkAssign(job)}
@@ -0,0 +1,124 @@
+import httpx
+
+from backend.app.services.distance import (
+    DistanceCache,
+    DistanceMatrixClient,
+    beyond_travel_range,
+    geohash,
+    haversine_miles,
+)
+
+
+def test_haversine_sacramento_to_los_angeles():
+    miles = haversine_miles([38.58], [-121.49], 34.05, -118.24)
+    assert 355 < miles[0] < 365
+
+
+def test_beyond_travel_range_flags_only_far_students():
+    flags = beyond_travel_range([38.58, 34.05], [-121.49, -118.24], [25.0, 25.0], 38.6, -121.5)
+    assert flags.tolist() == [False, True]
+
+
+def test_distance_client_packs_origins_into_batches():
+    requests = []
+
+    def handler(request):
+        origins = request.url.params["origins"].split("|")
+        requests.append(origins)
+        rows = [
+            {"elements": [{"status": "OK", "distance": {"value": 1609.34 * float(o.split(",")[0])}}]}
+            for o in origins
+        ]
+        return httpx.Response(200, json={"rows": rows})
+
+    dm = DistanceMatrixClient(max_concurrency=2)
+    dm._http = httpx.Client(transport=httpx.MockTransport(handler))
+
+    origins = [(float(i), 0.0) for i in range(60)]
+    miles = dm.driving_distances_miles(origins, 0.0, 0.0, "key")
+    dm.close()
+
+    assert sorted(len(r) for r in requests) == [10, 25, 25]
+    assert [round(m) for m in miles] == list(range(60))
+
+
+def test_distance_client_marks_failed_elements_unknown():
+    def handler(request):
+        rows = [
+            {"elements": [{"status": "ZERO_RESULTS"}]},
+            {"elements": [{"status": "OK", "distance": {"value": 1609.34}}]},
+        ]
+        return httpx.Response(200, json={"rows": rows})
+
+    dm = DistanceMatrixClient()
+    dm._http = httpx.Client(transport=httpx.MockTransport(handler))
+    miles = dm.driving_distances_miles([(0.0, 0.0), (1.0, 1.0)], 2.0, 2.0, "key")
+    dm.close()
+
+    assert miles[0] is None
+    assert round(miles[1], 3) == 1.0
+
+
+class DummyRedis:
+    def __init__(self):
+        self.store = {}
+        self.ttls = {}
+
+    def get(self, key):
+        return self.store.get(key)
+
+    def mget(self, keys):
+        return [self.store.get(k) for k in keys]
+
+    def setex(self, key, ttl, value):
+        self.store[key] = value
+        self.ttls[key] = ttl
+
+    def incr(self, key, amount=1):
+        val = int(self.store.get(key, 0)) + amount
+        self.store[key] = val
+        return val
+
+    def pipeline(self, transaction=True):
+        redis = self
+
+        class Pipe:
+            def __init__(self):
+                self.ops = []
+
+            def setex(self, *args):
+                self.ops.append(args)
+
+            def execute(self):
+                for args in self.ops:
+                    redis.setex(*args)
+
+        return Pipe()
+
+
+def test_geohash_known_value():
+    assert geohash(57.64911, 10.40744, 11) == "u4pruydqqvj"
+
+
+def test_distance_cache_round_trip_and_counters():
+    r = DummyRedis()
+    cache = DistanceCache(ttl=60, lru_size=10)
+    origins = [(38.58, -121.49), (34.05, -118.24)]
+
+    assert cache.get_many(r, origins, 38.6, -121.5) == [None, None]
+    cache.put_many(r, origins, 38.6, -121.5, [3.2, None])
+
+    # A second worker with an empty LRU reads through to Redis
+    other = DistanceCache(ttl=60, lru_size=10)
+    assert other.get_many(r, [(38.580001, -121.490001)], 38.6, -121.5) == [3.2]
+    assert set(r.ttls.values()) == {60}
+    assert r.get("metrics:distance_cache_hits") == 1
+    assert r.get("metrics:distance_cache_misses") == 2
+
+
+def test_distance_cache_lru_evicts_oldest():
+    cache = DistanceCache(lru_size=2)
+    r = DummyRedis()
+    cache.put_many(r, [(1.0, 1.0), (2.0, 2.0), (3.0, 3.0)], 0.0, 0.0, [1.0, 2.0, 3.0])
+    assert len(cache._lru) == 2
+    assert cache.key(1.0, 1.0, 0.0, 0.0) not in cache._lru
@@ -0,0 +1,76 @@
+import threading
+
+import pytest
+
+from backend.app.services.embedding_batcher import EmbeddingBatcher
+
+
+def test_concurrent_requests_share_calls_up_to_max_batch():
+    calls = []
+    release = threading.Event()
+
+    def embed_many(texts):
+        calls.append(list(texts))
+        release.wait(1)
+        return [[float(len(t))] for t in texts]
+
+    batcher = EmbeddingBatcher(embed_many, max_batch=3, max_wait=0.05)
+    results = {}
+
+    def worker(text):
+        results[text] = batcher.embed(text)
+
+    threads = [threading.Thread(target=worker, args=("x" * n,)) for n in range(1, 8)]
+    for t in threads:
+        t.start()
+    release.set()
+    for t in threads:
+        t.join(2)
+
+    assert results == {"x" * n: [float(n)] for n in range(1, 8)}
+    assert sum(len(c) for c in calls) == 7
+    assert max(len(c) for c in calls) == 3 and len(calls) < 7
+    assert batcher.embed_many(["ab", "c"]) == [[2.0], [1.0]]
+    batcher.close()
+
+
+def test_failed_batch_raises_for_every_caller():
+    calls = []
+
+    def embed_many(texts):
+        calls.append(list(texts))
+        raise RuntimeError("rate limited")
+
+    batcher = EmbeddingBatcher(embed_many, max_wait=0.05, input_errors=(ValueError,))
+    futures = [batcher.submit("a"), batcher.submit("b")]
+    for future in futures:
+        with pytest.raises(RuntimeError):
+            future.result(1)
+    # Errors that are not about the input are not retried in halves
+    assert calls == [["a", "b"]]
+
+    short = EmbeddingBatcher(lambda texts: [[0.0]] * (len(texts) - 1), max_wait=0.05)
+    futures = [short.submit("a"), short.submit("b")]
+    with pytest.raises(ValueError):
+        futures[1].result(1)
+
+
+def test_one_bad_input_fails_only_its_caller():
+    calls = []
+
+    def embed_many(texts):
+        calls.append(list(texts))
+        if "bad" in texts:
+            raise ValueError("input too long")
+        return [[float(len(t))] for t in texts]
+
+    batcher = EmbeddingBatcher(embed_many, max_wait=0.05, input_errors=(ValueError,))
+    futures = [batcher.submit(t) for t in ("a", "bb", "bad", "cccc")]
+    assert [f.result(1) for f in futures[:2]] == [[1.0], [2.0]]
+    with pytest.raises(ValueError):
+        futures[2].result(1)
+    assert futures[3].result(1) == [4.0]
+    assert calls[0] == ["a", "bb", "bad", "cccc"]
+    assert ["a", "bb"] in calls and ["bad"] in calls and ["cccc"] in calls
+    assert batcher.calls == 2
+    batcher.close()
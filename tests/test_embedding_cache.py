@@ -0,0 +1,82 @@
+import itertools
+
+from backend.app.services import embedding_cache as cache_module
+from backend.app.services.embedding_cache import EmbeddingCache, normalize_text
+
+
+class DummyRedis:
+    def __init__(self):
+        self.store = {}
+
+    def set(self, key, value):
+        self.store[key] = value
+
+    def mget(self, keys):
+        return [self.store.get(k) for k in keys]
+
+    def delete(self, *keys):
+        for key in keys:
+            self.store.pop(key, None)
+
+    def incr(self, key, amount=1):
+        val = int(self.store.get(key, 0)) + amount
+        self.store[key] = val
+        return val
+
+    def zadd(self, key, mapping):
+        self.store.setdefault(key, {}).update(mapping)
+
+    def zcard(self, key):
+        return len(self.store.get(key, {}))
+
+    def zrange(self, key, start, end):
+        items = sorted(self.store.get(key, {}).items(), key=lambda kv: (kv[1], kv[0]))
+        return [m for m, _ in items[start:end + 1]]
+
+    def zrem(self, key, *members):
+        for member in members:
+            self.store.get(key, {}).pop(member, None)
+
+    def pipeline(self, transaction=True):
+        redis = self
+
+        class Pipe:
+            def __init__(self):
+                self.ops = []
+
+            def __getattr__(self, name):
+                return lambda *a: self.ops.append((name, a))
+
+            def execute(self):
+                return [getattr(redis, name)(*a) for name, a in self.ops]
+
+        return Pipe()
+
+
+def test_normalized_text_hits_and_model_or_size_misses():
+    r = DummyRedis()
+    cache = EmbeddingCache(max_entries=10)
+    assert normalize_text("  Python,\n SQL ") == "Python, SQL"
+
+    cache.put_many(r, "m", 256, ["Python,  SQL"], [[0.5, 0.25]])
+    assert cache.get_many(r, "m", 256, [" Python, SQL\n", "Java"]) == [[0.5, 0.25], None]
+    assert cache.get_many(r, "m", None, ["Python, SQL"]) == [None]
+    assert cache.get_many(r, "other", 256, ["Python, SQL"]) == [None]
+    assert (cache.hits, cache.misses) == (1, 3)
+    assert r.store["metrics:embedding_cache_hits"] == 1
+    assert r.store["metrics:embedding_cache_misses"] == 3
+
+
+def test_least_recently_used_entries_are_evicted(monkeypatch):
+    clock = itertools.count()
+    monkeypatch.setattr(cache_module.time, "time", lambda: next(clock))
+    r = DummyRedis()
+    cache = EmbeddingCache(max_entries=2)
+
+    cache.put_many(r, "m", None, ["a", "b"], [[1.0], [2.0]])
+    assert cache.get_many(r, "m", None, ["a"]) == [[1.0]]
+    cache.put_many(r, "m", None, ["c"], [[3.0]])
+
+    assert cache.get_many(r, "m", None, ["a", "b", "c"]) == [[1.0], None, [3.0]]
+    assert r.zcard(cache_module.EMBEDDING_CACHE_LRU_KEY) == 2
+    assert sum(k.startswith("embedding_cache:") for k in r.store) == 3
@@ -6,13 +6,15 @@ os.environ.setdefault("GOOGLE_KEY", "test")
 from fastapi.testclient import TestClient
 import json
 import app.main as main_app
+from backend.app.services.match_store import migrate_legacy_matches, save_matches
+from backend.app.services.student_index import StudentIndex
 
 
 class DummyRedis:
     def __init__(self):
         self.store = {}
 
-    def set(self, key, value):
+    def set(self, key, value, ex=None, px=None):
         self.store[key] = value
 
     def get(self, key):
@@ -21,6 +23,10 @@ class DummyRedis:
     def exists(self, key):
         return key in self.store
 
+    def delete(self, *keys):
+        for key in keys:
+            self.store.pop(key, None)
+
     def scan_iter(self, pattern="*"):
         from fnmatch import fnmatch
         for k in list(self.store.keys()):
@@ -40,11 +46,195 @@ class DummyRedis:
     def mget(self, keys):
         return [self.store.get(k) for k in keys]
 
+    def geoadd(self, key, values):
+        members = self.store.setdefault(key, {})
+        for i in range(0, len(values), 3):
+            lng, lat, member = values[i:i + 3]
+            members[member] = (lng, lat)
+
+    def geosearch(self, key, longitude, latitude, radius, unit="mi"):
+        from math import asin, cos, radians, sin, sqrt
+        found = []
+        for member, (lng, lat) in self.store.get(key, {}).items():
+            a = (
+                sin(radians(lat - latitude) / 2) ** 2
+                + cos(radians(latitude)) * cos(radians(lat)) * sin(radians(lng - longitude) / 2) ** 2
+            )
+            if 2 * 3958.8 * asin(sqrt(a)) <= radius:
+                found.append(member)
+        return found
+
+    def zrem(self, key, *members):
+        removed = 0
+        for member in members:
+            if self.store.get(key, {}).pop(member, None) is not None:
+                removed += 1
+        return removed
+
+    def sadd(self, key, *members):
+        s = self.store.setdefault(key, set())
+        before = len(s)
+        s.update(members)
+        return len(s) - before
+
+    def srem(self, key, *members):
+        s = self.store.get(key, set())
+        before = len(s)
+        s.difference_update(members)
+        return before - len(s)
+
+    def smembers(self, key):
+        return set(self.store.get(key, set()))
+
+    def sunion(self, *keys):
+        result = set()
+        for k in keys:
+            result |= self.store.get(k, set())
+        return result
+
+    def hget(self, key, field):
+        return self.store.get(key, {}).get(field)
+
+    def hset(self, key, field=None, value=None, mapping=None):
+        h = self.store.setdefault(key, {})
+        if field is not None:
+            h[field] = value
+        h.update(mapping or {})
+        return 1
+
+    def hmget(self, key, fields):
+        h = self.store.get(key, {})
+        return [h.get(f) for f in fields]
+
+    def hgetall(self, key):
+        return dict(self.store.get(key, {}))
+
+    def pttl(self, key):
+        return -1 if key in self.store else -2
+
+    def expire(self, key, seconds):
+        return key in self.store
+
+    def rpush(self, key, *values):
+        lst = self.store.setdefault(key, [])
+        lst.extend(values)
+        return len(lst)
+
+    def lpop(self, key):
+        lst = self.store.get(key)
+        return lst.pop(0) if lst else None
+
+    def blpop(self, keys, timeout=0):
+        for key in keys:
+            value = self.lpop(key)
+            if value is not None:
+                return key, value
+        return None
+
+    def lindex(self, key, index):
+        lst = self.store.get(key) or []
+        return lst[index] if -len(lst) <= index < len(lst) else None
+
+    def lrem(self, key, count, value):
+        lst = self.store.get(key) or []
+        if value in lst:
+            lst.remove(value)
+            return 1
+        return 0
+
+    def lmove(self, src, dst, src_side="LEFT", dst_side="RIGHT"):
+        lst = self.store.get(src)
+        if not lst:
+            return None
+        value = lst.pop(0 if src_side == "LEFT" else -1)
+        target = self.store.setdefault(dst, [])
+        target.insert(0 if dst_side == "LEFT" else len(target), value)
+        return value
+
+    def blmove(self, src, dst, timeout, src_side="LEFT", dst_side="RIGHT"):
+        return self.lmove(src, dst, src_side, dst_side)
+
+    def hincrby(self, key, field, amount=1):
+        h = self.store.setdefault(key, {})
+        h[field] = str(int(h.get(field) or 0) + amount)
+        return int(h[field])
+
+    def zadd(self, key, mapping):
+        self.store.setdefault(key, {}).update(mapping)
+
+    def zcard(self, key):
+        return len(self.store.get(key, {}))
+
+    def zrange(self, key, start, end, withscores=False):
+        items = sorted(self.store.get(key, {}).items(), key=lambda kv: (kv[1], kv[0]))
+        items = items[start:] if end == -1 else items[start:end + 1]
+        return items if withscores else [m for m, _ in items]
+
+    def zremrangebyrank(self, key, start, end):
+        for member in self.zrange(key, start, end):
+            self.store[key].pop(member)
+
+    def zrangebyscore(self, key, low, high, withscores=False):
+        low = float(low[1:]) if str(low).startswith("(") else float(low)
+        items = [(m, s) for m, s in self.zrange(key, 0, -1, withscores=True) if s > low]
+        return items if withscores else [m for m, _ in items]
+
+    def zmscore(self, key, members):
+        z = self.store.get(key, {})
+        return [z.get(m) for m in members]
+
+    def zrevrange(self, key, start, end, withscores=False):
+        items = sorted(self.store.get(key, {}).items(), key=lambda kv: (kv[1], kv[0]), reverse=True)
+        items = items[start:] if end == -1 else items[start:end + 1]
+        return items if withscores else [m for m, _ in items]
+
+    def type(self, key):
+        value = self.store.get(key)
+        if value is None:
+            return "none"
+        return "string" if isinstance(value, (str, bytes, int, float)) else "zset"
+
+    def pipeline(self, transaction=True):
+        redis = self
+
+        class Pipe:
+            def __init__(self):
+                self.ops = []
+                self.watching = False
+
+            def __enter__(self):
+                return self
+
+            def __exit__(self, *exc):
+                return False
+
+            def watch(self, *keys):
+                # Like redis-py, commands run immediately until multi()
+                self.watching = True
+
+            def multi(self):
+                self.watching = False
+
+            def __getattr__(self, name):
+                if self.watching:
+                    return getattr(redis, name)
+                return lambda *a, **k: self.ops.append((name, a, k))
+
+            def execute(self):
+                return [getattr(redis, name)(*a, **k) for name, a, k in self.ops]
+
+        return Pipe()
+
+    def hdel(self, key, *fields):
+        h = self.store.get(key, {})
+        return sum(1 for f in fields if h.pop(f, None) is not None)
+
     def flushdb(self):
         self.store.clear()
 
 
 main_app.redis_client = DummyRedis()
+main_app.redis_bytes = main_app.redis_client
 from app.main import app, init_default_admin
 
 client = TestClient(app)
@@ -60,6 +250,15 @@ def login_admin():
     return resp.json()["token"]
 
 
+def run_match(path, headers, **kwargs):
+    """Queue a match, run the queue and return the queued match's status."""
+    resp = client.post(path, headers=headers, **kwargs)
+    assert resp.status_code == 202
+    while main_app.process_match_queue():
+        pass
+    return client.get(f"/match-jobs/{resp.json()['match_job_id']}", headers=headers)
+
+
 def test_create_job_and_match(monkeypatch):
     token = login_admin()
 
@@ -79,10 +278,15 @@ def test_create_job_and_match(monkeypatch):
         for k in list(store.keys()):
             yield k
 
+    def fake_mget(keys):
+        return [store.get(k) for k in keys]
+
     monkeypatch.setattr(main_app.redis_client, "set", fake_set)
     monkeypatch.setattr(main_app.redis_client, "get", fake_get)
     monkeypatch.setattr(main_app.redis_client, "exists", fake_exists)
     monkeypatch.setattr(main_app.redis_client, "scan_iter", fake_scan_iter)
+    monkeypatch.setattr(main_app.redis_client, "mget", fake_mget)
+    monkeypatch.setattr(main_app, "student_index", StudentIndex())
 
     class FakeResp:
         def __init__(self, emb):
@@ -95,7 +299,9 @@ def test_create_job_and_match(monkeypatch):
             return FakeResp([0.0, 1.0])
         return FakeResp([0.5, 0.5])
 
-    monkeypatch.setattr(main_app, "get_driving_distance_miles", lambda *a, **k: 10.0)
+    monkeypatch.setattr(
+        main_app, "get_driving_distances_miles", lambda origins, *a, **k: [10.0] * len(origins)
+    )
 
     monkeypatch.setattr(main_app.client.embeddings, "create", fake_create)
 
@@ -152,7 +358,7 @@ def test_create_job_and_match(monkeypatch):
     assert resp.status_code == 200
     job_code = resp.json()["job_code"]
 
-    match_resp = client.post("/match", json={"job_code": job_code}, headers={"Authorization": f"Bearer {token}"})
+    match_resp = run_match("/match", json={"job_code": job_code}, headers={"Authorization": f"Bearer {token}"})
     assert match_resp.status_code == 200
     data = match_resp.json()["matches"]
     assert len(data) == 2
@@ -174,9 +380,7 @@ def test_get_match_results_status(monkeypatch):
     monkeypatch.setattr(main_app.redis_client, "set", fake_set)
 
     job_code = "XYZ"
-    store[f"match_results:{job_code}"] = json.dumps([
-        {"email": "a@example.com", "score": 1.0}
-    ])
+    save_matches(main_app.redis_client, job_code, [{"email": "a@example.com", "score": 1.0}])
     store[f"job:{job_code}"] = json.dumps({
         "job_code": job_code,
         "assigned_students": ["a@example.com"],
@@ -189,6 +393,17 @@ def test_get_match_results_status(monkeypatch):
     assert data["status"] == "assigned"
 
 
+def test_get_match_results_keeps_its_shape_when_loading_fails():
+    main_app.redis_client.flushdb()
+    init_default_admin()
+    token = login_admin()
+
+    # Stored matches for a job that no longer exists
+    save_matches(main_app.redis_client, "GONE", [{"email": "a@example.com", "score": 1.0}])
+    resp = client.get("/match/GONE", headers={"Authorization": f"Bearer {token}"})
+    assert resp.json() == {"matches": [], "total": 0}
+
+
 def test_get_match_results_status_placed(monkeypatch):
     token = login_admin()
 
@@ -204,9 +419,7 @@ def test_get_match_results_status_placed(monkeypatch):
     monkeypatch.setattr(main_app.redis_client, "set", fake_set)
 
     job_code = "XYZ2"
-    store[f"match_results:{job_code}"] = json.dumps([
-        {"email": "b@example.com", "score": 1.0}
-    ])
+    save_matches(main_app.redis_client, job_code, [{"email": "b@example.com", "score": 1.0}])
     store[f"job:{job_code}"] = json.dumps({
         "job_code": job_code,
         "assigned_students": [],
@@ -237,10 +450,15 @@ def test_match_respects_travel_distance(monkeypatch):
         for k in list(store.keys()):
             yield k
 
+    def fake_mget(keys):
+        return [store.get(k) for k in keys]
+
     monkeypatch.setattr(main_app.redis_client, "set", fake_set)
     monkeypatch.setattr(main_app.redis_client, "get", fake_get)
     monkeypatch.setattr(main_app.redis_client, "exists", fake_exists)
     monkeypatch.setattr(main_app.redis_client, "scan_iter", fake_scan_iter)
+    monkeypatch.setattr(main_app.redis_client, "mget", fake_mget)
+    monkeypatch.setattr(main_app, "student_index", StudentIndex())
 
     class FakeResp:
         def __init__(self, emb):
@@ -252,7 +470,9 @@ def test_match_respects_travel_distance(monkeypatch):
     monkeypatch.setattr(main_app.client.embeddings, "create", fake_create)
 
     # distance always 150 miles
-    monkeypatch.setattr(main_app, "get_driving_distance_miles", lambda *a, **k: 150.0)
+    monkeypatch.setattr(
+        main_app, "get_driving_distances_miles", lambda origins, *a, **k: [150.0] * len(origins)
+    )
 
     s1 = {
         "first_name": "John",
@@ -306,7 +526,7 @@ def test_match_respects_travel_distance(monkeypatch):
     resp = client.post("/jobs", json=job, headers={"Authorization": f"Bearer {token}"})
     job_code = resp.json()["job_code"]
 
-    match_resp = client.post("/match", json={"job_code": job_code}, headers={"Authorization": f"Bearer {token}"})
+    match_resp = run_match("/match", json={"job_code": job_code}, headers={"Authorization": f"Bearer {token}"})
     data = match_resp.json()["matches"]
     assert len(data) == 1
     assert data[0]["email"] == "john@example.com"
@@ -324,7 +544,9 @@ def test_match_ignores_label_changes(monkeypatch):
         return FakeResp([1.0])
 
     monkeypatch.setattr(main_app.client.embeddings, "create", fake_create)
-    monkeypatch.setattr(main_app, "get_driving_distance_miles", lambda *a, **k: 1.0)
+    monkeypatch.setattr(
+        main_app, "get_driving_distances_miles", lambda origins, *a, **k: [1.0] * len(origins)
+    )
 
     # register career user
     career = {
@@ -408,7 +630,7 @@ def test_match_ignores_label_changes(monkeypatch):
     resp = client.post("/jobs", json=job, headers={"Authorization": f"Bearer {career_token}"})
     job_code = resp.json()["job_code"]
 
-    match_resp = client.post(
+    match_resp = run_match(
         "/match", json={"job_code": job_code}, headers={"Authorization": f"Bearer {career_token}"}
     )
     assert match_resp.status_code == 200
@@ -425,7 +647,9 @@ def test_match_includes_applicant_records_without_student(monkeypatch):
             self.data = [type("obj", (), {"embedding": [1.0]})]
 
     monkeypatch.setattr(main_app.client.embeddings, "create", lambda *a, **k: FakeResp())
-    monkeypatch.setattr(main_app, "get_driving_distance_miles", lambda *a, **k: 1.0)
+    monkeypatch.setattr(
+        main_app, "get_driving_distances_miles", lambda origins, *a, **k: [1.0] * len(origins)
+    )
 
     recruiter = {
         "email": "rec@example.com",
@@ -480,7 +704,7 @@ def test_match_includes_applicant_records_without_student(monkeypatch):
     )
     job_code = resp.json()["job_code"]
 
-    match_resp = client.post(
+    match_resp = run_match(
         "/match", json={"job_code": job_code}, headers={"Authorization": f"Bearer {recruiter_token}"}
     )
     assert match_resp.status_code == 200
@@ -497,7 +721,9 @@ def test_rematches_endpoint(monkeypatch):
             self.data = [type("obj", (), {"embedding": emb})]
 
     monkeypatch.setattr(main_app.client.embeddings, "create", lambda *a, **k: FakeResp([1.0]))
-    monkeypatch.setattr(main_app, "get_driving_distance_miles", lambda *a, **k: 1.0)
+    monkeypatch.setattr(
+        main_app, "get_driving_distances_miles", lambda origins, *a, **k: [1.0] * len(origins)
+    )
 
     token = login_admin()
 
@@ -534,8 +760,8 @@ def test_rematches_endpoint(monkeypatch):
     resp = client.post("/jobs", json=job, headers={"Authorization": f"Bearer {token}"})
     job_code = resp.json()["job_code"]
 
-    client.post("/match", json={"job_code": job_code}, headers={"Authorization": f"Bearer {token}"})
-    rematch_resp = client.post(f"/rematches/{job_code}", headers={"Authorization": f"Bearer {token}"})
+    run_match("/match", json={"job_code": job_code}, headers={"Authorization": f"Bearer {token}"})
+    rematch_resp = run_match(f"/rematches/{job_code}", headers={"Authorization": f"Bearer {token}"})
     assert rematch_resp.status_code == 200
     assert main_app.redis_client.get("metrics:total_rematches") == 1
 
@@ -549,7 +775,9 @@ def test_not_interested_filters_out_student(monkeypatch):
             self.data = [type("obj", (), {"embedding": [1.0]})]
 
     monkeypatch.setattr(main_app.client.embeddings, "create", lambda *a, **k: FakeResp())
-    monkeypatch.setattr(main_app, "get_driving_distance_miles", lambda *a, **k: 1.0)
+    monkeypatch.setattr(
+        main_app, "get_driving_distances_miles", lambda origins, *a, **k: [1.0] * len(origins)
+    )
 
     token = login_admin()
 
@@ -604,7 +832,7 @@ def test_not_interested_filters_out_student(monkeypatch):
     resp = client.post("/jobs", json=job, headers={"Authorization": f"Bearer {token}"})
     job_code = resp.json()["job_code"]
 
-    first = client.post("/match", json={"job_code": job_code}, headers={"Authorization": f"Bearer {token}"})
+    first = run_match("/match", json={"job_code": job_code}, headers={"Authorization": f"Bearer {token}"})
     assert len(first.json()["matches"]) == 2
 
     client.post(
@@ -613,7 +841,7 @@ def test_not_interested_filters_out_student(monkeypatch):
         headers={"Authorization": f"Bearer {token}"},
     )
 
-    second = client.post("/match", json={"job_code": job_code}, headers={"Authorization": f"Bearer {token}"})
+    second = run_match("/match", json={"job_code": job_code}, headers={"Authorization": f"Bearer {token}"})
     emails = [m["email"] for m in second.json()["matches"]]
     assert s2["email"] not in emails
     assert s1["email"] in emails
@@ -661,3 +889,977 @@ def test_recruiter_job_source_autopopulated(monkeypatch):
     job_code = resp.json()["job_code"]
     stored = json.loads(main_app.redis_client.get(f"job:{job_code}"))
     assert stored["source"] == "Unitek-Sacramento"
+
+
+def test_match_prefilters_by_geo_radius_and_straight_line_distance(monkeypatch):
+    main_app.redis_client.flushdb()
+    init_default_admin()
+
+    class FakeResp:
+        def __init__(self):
+            self.data = [type("obj", (), {"embedding": [1.0]})]
+
+    calls = []
+
+    def fake_distances(origins, *args, **kwargs):
+        calls.extend(origins)
+        return [1.0] * len(origins)
+
+    monkeypatch.setattr(main_app.client.embeddings, "create", lambda *a, **k: FakeResp())
+    monkeypatch.setattr(main_app, "get_driving_distances_miles", fake_distances)
+
+    token = login_admin()
+
+    near = {
+        "first_name": "Near",
+        "last_name": "By",
+        "email": "near@example.com",
+        "phone": "123",
+        "education_level": "College",
+        "skills": ["python"],
+        "experience_summary": "s1",
+        "interests": "i",
+        "city": "Sacramento",
+        "state": "CA",
+        "lat": 38.58,
+        "lng": -121.49,
+        "max_travel": 25.0,
+    }
+    # Willing to commute from Fresno (~150 miles), which sets the GEO search radius
+    commuter = {
+        **near, "first_name": "Long", "email": "commuter@example.com",
+        "lat": 36.74, "lng": -119.79, "max_travel": 400.0,
+    }
+    # Los Angeles is roughly 360 straight-line miles away: inside the GEO radius
+    # but beyond this student's own max_travel
+    far = {**near, "first_name": "Far", "email": "far@example.com", "lat": 34.05, "lng": -118.24}
+    # Seattle is outside the GEO radius altogether
+    remote = {**near, "first_name": "Remote", "email": "remote@example.com", "lat": 47.61, "lng": -122.33}
+
+    for s in (near, commuter, far, remote):
+        client.post("/students", json=s, headers={"Authorization": f"Bearer {token}"})
+
+    job = {
+        "job_title": "Dev",
+        "job_description": "desc",
+        "desired_skills": ["python"],
+        "source": "x",
+        "min_pay": 1.0,
+        "max_pay": 2.0,
+        "city": "Sacramento",
+        "state": "CA",
+        "lat": 38.6,
+        "lng": -121.5,
+    }
+    resp = client.post("/jobs", json=job, headers={"Authorization": f"Bearer {token}"})
+    job_code = resp.json()["job_code"]
+
+    match_resp = run_match("/match", json={"job_code": job_code}, headers={"Authorization": f"Bearer {token}"})
+    emails = sorted(m["email"] for m in match_resp.json()["matches"])
+    assert emails == ["commuter@example.com", "near@example.com"]
+    assert len(calls) == 2
+    assert main_app.redis_client.get("metrics:distance_calls_skipped") == 1
+
+
+def test_job_embedding_reused_until_text_changes(monkeypatch):
+    main_app.redis_client.flushdb()
+    init_default_admin()
+
+    class FakeResp:
+        def __init__(self):
+            self.data = [type("obj", (), {"embedding": [1.0]})]
+
+    job_inputs = []
+
+    def fake_create(input, model):
+        if "desc" in input:
+            job_inputs.append(input)
+        return FakeResp()
+
+    monkeypatch.setattr(main_app.client.embeddings, "create", fake_create)
+    monkeypatch.setattr(
+        main_app, "get_driving_distances_miles", lambda origins, *a, **k: [1.0] * len(origins)
+    )
+
+    token = login_admin()
+    job = {
+        "job_title": "Dev",
+        "job_description": "desc one",
+        "desired_skills": ["python"],
+        "source": "x",
+        "min_pay": 1.0,
+        "max_pay": 2.0,
+        "city": "c",
+        "state": "s",
+        "lat": 0.0,
+        "lng": 0.0,
+    }
+    resp = client.post("/jobs", json=job, headers={"Authorization": f"Bearer {token}"})
+    job_code = resp.json()["job_code"]
+    assert len(job_inputs) == 1
+    assert main_app.redis_client.get(f"job_embedding:{job_code}")
+
+    run_match("/match", json={"job_code": job_code}, headers={"Authorization": f"Bearer {token}"})
+    run_match(f"/rematches/{job_code}", headers={"Authorization": f"Bearer {token}"})
+    assert len(job_inputs) == 1
+
+    client.put(f"/jobs/{job_code}", json={"min_pay": 1.5}, headers={"Authorization": f"Bearer {token}"})
+    assert len(job_inputs) == 1
+
+    client.put(f"/jobs/{job_code}", json={"job_description": "desc two"}, headers={"Authorization": f"Bearer {token}"})
+    run_match(f"/rematches/{job_code}", headers={"Authorization": f"Bearer {token}"})
+    assert job_inputs == ["desc one python", "desc two python"]
+
+
+def test_match_eligibility_follows_institution_changes(monkeypatch):
+    main_app.redis_client.flushdb()
+    init_default_admin()
+
+    class FakeResp:
+        def __init__(self):
+            self.data = [type("obj", (), {"embedding": [1.0]})]
+
+    monkeypatch.setattr(main_app.client.embeddings, "create", lambda *a, **k: FakeResp())
+    monkeypatch.setattr(
+        main_app, "get_driving_distances_miles", lambda origins, *a, **k: [1.0] * len(origins)
+    )
+
+    def register_approved(email, code, role):
+        client.post(
+            "/register",
+            json={"email": email, "first_name": "F", "last_name": "L", "school_code": code, "password": "pw", "role": role},
+        )
+        key = f"user:{email}"
+        data = json.loads(main_app.redis_client.get(key))
+        data["approved"] = True
+        main_app.redis_client.set(key, json.dumps(data))
+        return client.post("/login", json={"email": email, "password": "pw"}).json()["token"]
+
+    career_token = register_approved("career1@example.com", "1001", "career")
+    other_token = register_approved("other@example.com", "1002", "applicant")
+    register_approved("noprofile@example.com", "1002", "applicant")
+
+    client.post(
+        "/students",
+        json={
+            "first_name": "O", "last_name": "T", "email": "other@example.com", "phone": "1",
+            "education_level": "College", "skills": ["python"], "experience_summary": "e",
+            "interests": "i", "city": "c", "state": "s", "lat": 0.0, "lng": 0.0, "max_travel": 50.0,
+        },
+        headers={"Authorization": f"Bearer {other_token}"},
+    )
+
+    job = {
+        "job_title": "Dev", "job_description": "desc", "desired_skills": ["python"], "source": "x",
+        "min_pay": 1.0, "max_pay": 2.0, "city": "c", "state": "s", "lat": 0.0, "lng": 0.0,
+    }
+    job_code = client.post("/jobs", json=job, headers={"Authorization": f"Bearer {career_token}"}).json()["job_code"]
+
+    first = run_match("/match", json={"job_code": job_code}, headers={"Authorization": f"Bearer {career_token}"})
+    assert first.json()["matches"] == []
+
+    admin_token = login_admin()
+    for email in ("other@example.com", "noprofile@example.com"):
+        client.put(
+            f"/admin/users/{email}",
+            json={"school_code": "1001"},
+            headers={"Authorization": f"Bearer {admin_token}"},
+        )
+
+    second = run_match("/match", json={"job_code": job_code}, headers={"Authorization": f"Bearer {career_token}"})
+    matches = {m["email"]: m for m in second.json()["matches"]}
+    assert set(matches) == {"other@example.com", "noprofile@example.com"}
+    assert matches["noprofile@example.com"]["distance_miles"] is None
+
+
+def test_match_verifies_distance_lazily_in_score_order(monkeypatch):
+    main_app.redis_client.flushdb()
+    init_default_admin()
+
+    class FakeResp:
+        def __init__(self, emb):
+            self.data = [type("obj", (), {"embedding": emb})]
+
+    def fake_create(input, model):
+        if input.startswith("skill"):
+            return FakeResp([float(input[5])])
+        return FakeResp([1.0])
+
+    looked_up = []
+
+    def fake_distances(origins, *args, **kwargs):
+        looked_up.extend(origins)
+        # Students 6 and 7 are close in a straight line but a long drive away
+        return [100.0 if lat == 0.5 else 1.0 for lat, _ in origins]
+
+    monkeypatch.setattr(main_app.client.embeddings, "create", fake_create)
+    monkeypatch.setattr(main_app, "get_driving_distances_miles", fake_distances)
+
+    token = login_admin()
+    for n in range(8):
+        client.post(
+            "/students",
+            json={
+                "first_name": f"S{n}", "last_name": "X", "email": f"s{n}@example.com", "phone": "1",
+                "education_level": "College", "skills": [f"skill{n}"], "experience_summary": "e",
+                "interests": "i", "city": "c", "state": "s",
+                "lat": 0.5 if n >= 6 else 0.0, "lng": 0.0, "max_travel": 50.0,
+            },
+            headers={"Authorization": f"Bearer {token}"},
+        )
+
+    job = {
+        "job_title": "Dev", "job_description": "desc", "desired_skills": ["python"], "source": "x",
+        "min_pay": 1.0, "max_pay": 2.0, "city": "c", "state": "s", "lat": 0.0, "lng": 0.0,
+    }
+    job_code = client.post("/jobs", json=job, headers={"Authorization": f"Bearer {token}"}).json()["job_code"]
+    resp = run_match("/match", json={"job_code": job_code}, headers={"Authorization": f"Bearer {token}"})
+
+    emails = [m["email"] for m in resp.json()["matches"]]
+    assert emails == [f"s{n}@example.com" for n in (5, 4, 3, 2, 1)]
+    # One chunk of five, then two more for the slots freed by students 6 and 7
+    assert len(looked_up) == 7
+    assert main_app.redis_client.get("metrics:distance_calls_skipped") == 1
+
+
+def test_match_depth_and_paging(monkeypatch):
+    main_app.redis_client.flushdb()
+    init_default_admin()
+
+    class FakeResp:
+        def __init__(self, emb):
+            self.data = [type("obj", (), {"embedding": emb})]
+
+    def fake_create(input, model):
+        if input.startswith("skill"):
+            return FakeResp([float(input[5])])
+        return FakeResp([1.0])
+
+    notified = []
+    monkeypatch.setattr(main_app.client.embeddings, "create", fake_create)
+    monkeypatch.setattr(
+        main_app, "get_driving_distances_miles", lambda origins, *a, **k: [1.0] * len(origins)
+    )
+    monkeypatch.setattr(main_app, "send_email", lambda recipient, *a, **k: notified.append(recipient))
+
+    token = login_admin()
+    for n in range(8):
+        client.post(
+            "/students",
+            json={
+                "first_name": f"S{n}", "last_name": "X", "email": f"s{n}@example.com", "phone": "1",
+                "education_level": "College", "skills": [f"skill{n}"], "experience_summary": "e",
+                "interests": "i", "city": "c", "state": "s", "lat": 0.0, "lng": 0.0, "max_travel": 50.0,
+            },
+            headers={"Authorization": f"Bearer {token}"},
+        )
+
+    job = {
+        "job_title": "Dev", "job_description": "desc", "desired_skills": ["python"], "source": "x",
+        "min_pay": 1.0, "max_pay": 2.0, "city": "c", "state": "s", "lat": 0.0, "lng": 0.0,
+        "match_limit": 6,
+    }
+    job_code = client.post("/jobs", json=job, headers={"Authorization": f"Bearer {token}"}).json()["job_code"]
+    headers = {"Authorization": f"Bearer {token}"}
+
+    resp = run_match("/match", json={"job_code": job_code}, headers=headers)
+    assert len(resp.json()["matches"]) == 6
+    assert len(notified) == 5
+
+    run_match(f"/rematches/{job_code}?limit=7", headers=headers)
+    page = client.get(f"/match/{job_code}?offset=5&limit=5", headers=headers).json()
+    assert page["total"] == 7
+    assert [m["email"] for m in page["matches"]] == ["s2@example.com", "s1@example.com"]
+
+    bad = client.put(f"/jobs/{job_code}", json={"match_limit": 0}, headers=headers)
+    assert bad.status_code == 400
+
+
+def test_legacy_match_results_are_migrated_to_sorted_set():
+    main_app.redis_client.flushdb()
+    init_default_admin()
+    token = login_admin()
+
+    main_app.redis_client.set("job:OLD", json.dumps({"job_code": "OLD", "placed_students": ["b@example.com"]}))
+    main_app.redis_client.set(
+        "match_results:OLD",
+        json.dumps([
+            {"name": "A", "email": "a@example.com", "score": 0.4, "distance_miles": 3.0, "status": None},
+            {"name": "B", "email": "b@example.com", "score": 0.8, "distance_miles": 1.5, "status": None},
+        ]),
+    )
+    assert migrate_legacy_matches(main_app.redis_client) == 1
+    assert migrate_legacy_matches(main_app.redis_client) == 0
+
+    resp = client.get("/match/OLD?limit=1", headers={"Authorization": f"Bearer {token}"})
+    assert resp.json() == {
+        "matches": [
+            {"name": "B", "email": "b@example.com", "score": 0.8, "distance_miles": 1.5, "status": "placed"}
+        ],
+        "total": 2,
+    }
+
+
+def test_match_with_no_results_still_counts_as_matched():
+    main_app.redis_client.flushdb()
+
+    assert client.get("/has-match/EMPTY").json() == {"has_match": False}
+    save_matches(main_app.redis_client, "EMPTY", [], limit=5)
+    assert client.get("/has-match/EMPTY").json() == {"has_match": True}
+    main_app.delete_matches(main_app.redis_client, "EMPTY")
+    assert client.get("/has-match/EMPTY").json() == {"has_match": False}
+
+
+def test_match_queue_prefers_interactive_lane_and_reports_failures(monkeypatch):
+    main_app.redis_client.flushdb()
+    init_default_admin()
+    token = login_admin()
+    headers = {"Authorization": f"Bearer {token}"}
+
+    assert client.post("/match", json={"job_code": "NOPE"}, headers=headers).status_code == 404
+
+    for code in ("BG", "FG"):
+        main_app.redis_client.set(f"job:{code}", json.dumps({"job_code": code}))
+    ran = []
+
+    def fake_perform(job_code, send_emails=True, limit=None, progress=None, delta=False, search=None, nprobe=None):
+        ran.append((job_code, send_emails))
+        progress("distances", 0.5)
+        if job_code == "BG":
+            raise main_app.HTTPException(status_code=500, detail="Embedding failed: boom")
+        return [{"email": "a@example.com"}]
+
+    monkeypatch.setattr(main_app, "_perform_match", fake_perform)
+    bg = client.post("/rematches/BG?priority=background", headers=headers).json()["match_job_id"]
+    fg = client.post("/match", json={"job_code": "FG"}, headers=headers).json()["match_job_id"]
+
+    queued = client.get(f"/match-jobs/{fg}", headers=headers).json()
+    assert queued["status"] == "queued"
+    assert queued["send_emails"] is True
+
+    while main_app.process_match_queue():
+        pass
+    assert ran == [("FG", True), ("BG", False)]
+
+    done = client.get(f"/match-jobs/{fg}", headers=headers).json()
+    assert (done["status"], done["progress"], done["count"]) == ("done", 1.0, 1)
+    failed = client.get(f"/match-jobs/{bg}", headers=headers).json()
+    assert (failed["status"], failed["progress"], failed["error"]) == ("failed", 0.5, "Embedding failed: boom")
+    assert client.get("/match-jobs/unknown", headers=headers).status_code == 404
+
+
+def test_jobs_of_stopped_workers_are_requeued(monkeypatch):
+    from backend.app.services import match_queue
+
+    main_app.redis_client.flushdb()
+    init_default_admin()
+    token = login_admin()
+    headers = {"Authorization": f"Bearer {token}"}
+    main_app.redis_client.set("job:FG", json.dumps({"job_code": "FG"}))
+    ran = []
+    monkeypatch.setattr(
+        main_app, "_perform_match", lambda job_code, **k: ran.append(job_code) or []
+    )
+    fg = client.post("/match", json={"job_code": "FG"}, headers=headers).json()["match_job_id"]
+
+    # A live worker holds its job; a stopped one's job goes back on the lane
+    assert match_queue.next_match_job(main_app.redis_client, "alive") == fg
+    match_queue.heartbeat(main_app.redis_client, "alive", 30)
+    assert match_queue.requeue_stale(main_app.redis_client) == 0
+    main_app.redis_client.lmove("match_processing:alive", "match_processing:dead")
+    main_app.redis_client.delete("match_processing:alive")
+    match_queue.update_match_job(main_app.redis_client, fg, status="running", stage="scoring")
+    assert match_queue.requeue_stale(main_app.redis_client) == 1
+    assert client.get(f"/match-jobs/{fg}", headers=headers).json()["status"] == "queued"
+    assert main_app.redis_client.get("match_processing:dead") == []
+
+    while main_app.process_match_queue():
+        pass
+    assert ran == ["FG"]
+    assert client.get(f"/match-jobs/{fg}", headers=headers).json()["status"] == "done"
+    assert main_app.redis_client.get(f"match_processing:{main_app.WORKER_ID}") == []
+
+    # A job that keeps taking its worker down is failed rather than retried forever
+    fg = client.post("/match", json={"job_code": "FG"}, headers=headers).json()["match_job_id"]
+    for _ in range(match_queue.MATCH_JOB_MAX_ATTEMPTS):
+        assert match_queue.next_match_job(main_app.redis_client, "dead") == fg
+        assert match_queue.requeue_stale(main_app.redis_client) == 1
+    assert match_queue.next_match_job(main_app.redis_client, "dead") == fg
+    assert match_queue.requeue_stale(main_app.redis_client) == 0
+    failed = client.get(f"/match-jobs/{fg}", headers=headers).json()
+    assert failed["status"] == "failed"
+    assert main_app.process_match_queue() is False
+
+
+def test_new_students_are_merged_into_stored_matches(monkeypatch):
+    main_app.redis_client.flushdb()
+    init_default_admin()
+
+    class FakeResp:
+        def __init__(self, emb):
+            self.data = [type("obj", (), {"embedding": emb})]
+
+    def fake_create(input, model):
+        if input.startswith("skill"):
+            return FakeResp([float(input[5])])
+        return FakeResp([1.0])
+
+    lookups = []
+
+    def fake_distances(origins, *a, **k):
+        lookups.append(len(origins))
+        return [1.0] * len(origins)
+
+    monkeypatch.setattr(main_app.client.embeddings, "create", fake_create)
+    monkeypatch.setattr(main_app, "get_driving_distances_miles", fake_distances)
+    monkeypatch.setattr(main_app, "send_email", lambda *a, **k: None)
+
+    token = login_admin()
+    headers = {"Authorization": f"Bearer {token}"}
+
+    def student(n, lat=0.0):
+        return {
+            "first_name": f"S{n}", "last_name": "X", "email": f"s{n}@example.com", "phone": "1",
+            "education_level": "College", "skills": [f"skill{n}"], "experience_summary": "e",
+            "interests": "i", "city": "c", "state": "s", "lat": lat, "lng": 0.0, "max_travel": 50.0,
+        }
+
+    for n in (2, 4):
+        client.post("/students", json=student(n), headers=headers)
+    job = {
+        "job_title": "Dev", "job_description": "desc", "desired_skills": ["python"], "source": "x",
+        "min_pay": 1.0, "max_pay": 2.0, "city": "c", "state": "s", "lat": 0.0, "lng": 0.0,
+    }
+    job_code = client.post("/jobs", json=job, headers=headers).json()["job_code"]
+    run_match("/match", json={"job_code": job_code, "limit": 2}, headers=headers)
+
+    def stored():
+        return [m["email"] for m in client.get(f"/match/{job_code}", headers=headers).json()["matches"]]
+
+    assert stored() == ["s4@example.com", "s2@example.com"]
+
+    def drain():
+        while main_app.process_match_queue():
+            pass
+
+    # Below the tail: no distance lookup, nothing stored
+    lookups.clear()
+    client.post("/students", json=student(1), headers=headers)
+    drain()
+    assert lookups == []
+    assert stored() == ["s4@example.com", "s2@example.com"]
+
+    # Beats the tail and evicts it, once the queued reverse match runs
+    client.post("/students", json=student(3), headers=headers)
+    assert main_app.redis_client.get("match_queue:background")
+    assert stored() == ["s4@example.com", "s2@example.com"]
+    drain()
+    assert stored() == ["s4@example.com", "s3@example.com"]
+
+    # Too far away to be listed, however well it scores
+    client.post("/students", json=student(9, lat=10.0), headers=headers)
+    drain()
+    assert stored() == ["s4@example.com", "s3@example.com"]
+
+    # A listed student whose profile moves out of range is dropped
+    client.put("/students/s4@example.com", json=student(4, lat=10.0), headers=headers)
+    drain()
+    assert stored() == ["s3@example.com"]
+
+    # A rematch scored after a change already covers it; the queued merge skips it
+    lookups.clear()
+    client.post("/students", json=student(5), headers=headers)
+    run_match(f"/rematches/{job_code}?full=true&limit=2", headers=headers)
+    assert stored() == ["s5@example.com", "s3@example.com"]
+    assert lookups == [2]
+
+
+def test_rematch_only_rescores_students_changed_since_watermark(monkeypatch):
+    main_app.redis_client.flushdb()
+    init_default_admin()
+
+    class FakeResp:
+        def __init__(self, emb):
+            self.data = [type("obj", (), {"embedding": emb})]
+
+    def fake_create(input, model):
+        if input.startswith("skill"):
+            return FakeResp([float(input[5])])
+        return FakeResp([1.0])
+
+    looked_up = []
+
+    def fake_distances(origins, *a, **k):
+        looked_up.extend(origins)
+        return [1.0] * len(origins)
+
+    monkeypatch.setattr(main_app.client.embeddings, "create", fake_create)
+    monkeypatch.setattr(main_app, "get_driving_distances_miles", fake_distances)
+    monkeypatch.setattr(main_app, "send_email", lambda *a, **k: None)
+
+    token = login_admin()
+    headers = {"Authorization": f"Bearer {token}"}
+
+    def student(n, skill, lat=0.0):
+        return {
+            "first_name": f"S{n}", "last_name": "X", "email": f"s{n}@example.com", "phone": "1",
+            "education_level": "College", "skills": [f"skill{skill}"], "experience_summary": "e",
+            "interests": "i", "city": "c", "state": "s", "lat": lat, "lng": 0.0, "max_travel": 50.0,
+        }
+
+    for n in range(1, 5):
+        client.post("/students", json=student(n, n, lat=n / 100), headers=headers)
+    job = {
+        "job_title": "Dev", "job_description": "desc", "desired_skills": ["python"], "source": "x",
+        "min_pay": 1.0, "max_pay": 2.0, "city": "c", "state": "s", "lat": 0.0, "lng": 0.0,
+    }
+    job_code = client.post("/jobs", json=job, headers=headers).json()["job_code"]
+    first = run_match("/match", json={"job_code": job_code, "limit": 2}, headers=headers).json()
+    assert [m["email"] for m in first["matches"]] == ["s4@example.com", "s3@example.com"]
+    assert len(looked_up) == 2
+
+    # Nothing changed: the retained pool and distances are reused
+    looked_up.clear()
+    again = run_match(f"/rematches/{job_code}?limit=2", headers=headers).json()
+    assert [m["email"] for m in again["matches"]] == ["s4@example.com", "s3@example.com"]
+    assert looked_up == []
+
+    # One student improves: only they need a distance lookup
+    client.put("/students/s1@example.com", json=student(1, 9, lat=0.01), headers=headers)
+    looked_up.clear()
+    delta = run_match(f"/rematches/{job_code}?limit=2", headers=headers).json()
+    assert [m["email"] for m in delta["matches"]] == ["s1@example.com", "s4@example.com"]
+    assert looked_up == [(0.01, 0.0)]
+
+    # A deleted student drops out and the next pooled candidate moves up
+    client.delete("/admin/delete-student/s4@example.com", headers=headers)
+    delta = run_match(f"/rematches/{job_code}?limit=2", headers=headers).json()
+    assert [m["email"] for m in delta["matches"]] == ["s1@example.com", "s3@example.com"]
+
+    looked_up.clear()
+    run_match(f"/rematches/{job_code}?limit=2&full=true", headers=headers)
+    assert len(looked_up) == 2
+
+
+def test_reduced_index_rescores_shortlist_on_full_vectors(monkeypatch):
+    main_app.redis_client.flushdb()
+    init_default_admin()
+
+    vectors = {"skillA": [1.0, 0.0, 0.0], "skillB": [0.9, 0.1, 1.0]}
+    requested = []
+
+    class FakeResp:
+        def __init__(self, emb):
+            self.data = [type("obj", (), {"embedding": emb})]
+
+    def fake_create(input, model, **kwargs):
+        requested.append(kwargs.get("dimensions"))
+        return FakeResp(vectors.get(input.split()[0], [1.0, 0.0, 1.0]))
+
+    monkeypatch.setattr(main_app.client.embeddings, "create", fake_create)
+    monkeypatch.setattr(
+        main_app, "get_driving_distances_miles", lambda origins, *a, **k: [1.0] * len(origins)
+    )
+    monkeypatch.setattr(main_app, "send_email", lambda *a, **k: None)
+    monkeypatch.setattr(main_app, "student_index", StudentIndex(dimensions=2))
+    monkeypatch.setattr(main_app, "EMBEDDING_DIMENSIONS", 2)
+
+    token = login_admin()
+    headers = {"Authorization": f"Bearer {token}"}
+    for name in ("A", "B"):
+        client.post(
+            "/students",
+            json={
+                "first_name": name, "last_name": "X", "email": f"{name.lower()}@example.com",
+                "phone": "1", "education_level": "College", "skills": [f"skill{name}"],
+                "experience_summary": "e", "interests": "i", "city": "c", "state": "s",
+                "lat": 0.0, "lng": 0.0, "max_travel": 50.0,
+            },
+            headers=headers,
+        )
+    job = {
+        "job_title": "Dev", "job_description": "desc", "desired_skills": ["python"], "source": "x",
+        "min_pay": 1.0, "max_pay": 2.0, "city": "c", "state": "s", "lat": 0.0, "lng": 0.0,
+    }
+    job_code = client.post("/jobs", json=job, headers=headers).json()["job_code"]
+
+    # On the first two components A scores higher; on full vectors B does
+    resp = run_match("/match", json={"job_code": job_code, "limit": 1}, headers=headers)
+    assert [m["email"] for m in resp.json()["matches"]] == ["b@example.com"]
+    assert set(requested) == {None}
+
+    monkeypatch.setattr(main_app, "MATCH_RESCORE_DEPTH", 0)
+    resp = run_match(f"/rematches/{job_code}?limit=1&full=true", headers=headers)
+    assert [m["email"] for m in resp.json()["matches"]] == ["a@example.com"]
+    assert requested[-1] == 2
+
+
+
+def test_rescored_blocks_never_rank_against_approximate_scores(monkeypatch):
+    main_app.redis_client.flushdb()
+    init_default_admin()
+
+    vectors = {
+        "skillA": [1.0, 0.0, 0.0], "skillB": [0.9, 0.1, 1.0], "skillC": [0.8, 0.6, 0.0],
+    }
+
+    class FakeResp:
+        def __init__(self, emb):
+            self.data = [type("obj", (), {"embedding": emb})]
+
+    def fake_create(input, model, **kwargs):
+        return FakeResp(vectors.get(input.split()[0], [1.0, 0.0, 1.0]))
+
+    monkeypatch.setattr(main_app.client.embeddings, "create", fake_create)
+    monkeypatch.setattr(
+        main_app, "get_driving_distances_miles", lambda origins, *a, **k: [1.0] * len(origins)
+    )
+    monkeypatch.setattr(main_app, "send_email", lambda *a, **k: None)
+    monkeypatch.setattr(main_app, "student_index", StudentIndex(dimensions=2))
+    monkeypatch.setattr(main_app, "EMBEDDING_DIMENSIONS", 2)
+    monkeypatch.setattr(main_app, "MATCH_RESCORE_DEPTH", 1)
+
+    token = login_admin()
+    headers = {"Authorization": f"Bearer {token}"}
+    for name in ("A", "B", "C"):
+        client.post(
+            "/students",
+            json={
+                "first_name": name, "last_name": "X", "email": f"{name.lower()}@example.com",
+                "phone": "1", "education_level": "College", "skills": [f"skill{name}"],
+                "experience_summary": "e", "interests": "i", "city": "c", "state": "s",
+                "lat": 0.0, "lng": 0.0, "max_travel": 50.0,
+            },
+            headers=headers,
+        )
+    job = {
+        "job_title": "Dev", "job_description": "desc", "desired_skills": ["python"], "source": "x",
+        "min_pay": 1.0, "max_pay": 2.0, "city": "c", "state": "s", "lat": 0.0, "lng": 0.0,
+    }
+    job_code = client.post("/jobs", json=job, headers=headers).json()["job_code"]
+
+    # Only A is in the first rescored block, but B and C are rescored before
+    # they are ranked, so B's exact score puts it first
+    resp = run_match("/match", json={"job_code": job_code, "limit": 3}, headers=headers)
+    matches = resp.json()["matches"]
+    assert [m["email"] for m in matches] == ["b@example.com", "a@example.com", "c@example.com"]
+    assert [round(m["score"], 3) for m in matches] == [1.9, 1.0, 0.8]
+    pool = main_app.redis_client.store[f"match_pool:{job_code}"]
+    assert {e: round(v, 3) for e, v in pool.items()} == {
+        "a@example.com": 1.0, "b@example.com": 1.9, "c@example.com": 0.8,
+    }
+
+    # With only A retained the pool is partial, so a deeper delta rematch
+    # falls back to scoring everyone
+    run_match("/match", json={"job_code": job_code, "limit": 1}, headers=headers)
+    assert set(main_app.redis_client.store[f"match_pool:{job_code}"]) == {"a@example.com"}
+    resp = run_match(f"/rematches/{job_code}?limit=3", headers=headers)
+    assert [m["email"] for m in resp.json()["matches"]] == [
+        "b@example.com", "a@example.com", "c@example.com"
+    ]
+
+
+def test_approx_match_scores_only_probed_ivf_lists(monkeypatch):
+    main_app.redis_client.flushdb()
+    init_default_admin()
+
+    vectors = {"skillA": [1.0, 0.0], "skillB": [0.0, 1.0]}
+
+    class FakeResp:
+        def __init__(self, emb):
+            self.data = [type("obj", (), {"embedding": emb})]
+
+    def fake_create(input, model, **kwargs):
+        return FakeResp(vectors.get(input.split()[0], [1.0, 0.2]))
+
+    monkeypatch.setattr(main_app.client.embeddings, "create", fake_create)
+    monkeypatch.setattr(
+        main_app, "get_driving_distances_miles", lambda origins, *a, **k: [1.0] * len(origins)
+    )
+    monkeypatch.setattr(main_app, "send_email", lambda *a, **k: None)
+    monkeypatch.setattr(main_app, "student_index", StudentIndex())
+    monkeypatch.setattr(main_app, "IVF_MIN_STUDENTS", 2)
+    monkeypatch.setattr(main_app, "IVF_LISTS", 2)
+
+    token = login_admin()
+    headers = {"Authorization": f"Bearer {token}"}
+    for name in ("A", "B"):
+        client.post(
+            "/students",
+            json={
+                "first_name": name, "last_name": "X", "email": f"{name.lower()}@example.com",
+                "phone": "1", "education_level": "College", "skills": [f"skill{name}"],
+                "experience_summary": "e", "interests": "i", "city": "c", "state": "s",
+                "lat": 0.0, "lng": 0.0, "max_travel": 50.0,
+            },
+            headers=headers,
+        )
+    job = {
+        "job_title": "Dev", "job_description": "desc", "desired_skills": ["python"], "source": "x",
+        "min_pay": 1.0, "max_pay": 2.0, "city": "c", "state": "s", "lat": 0.0, "lng": 0.0,
+    }
+    job_code = client.post("/jobs", json=job, headers=headers).json()["job_code"]
+
+    resp = run_match("/match", json={"job_code": job_code, "limit": 2}, headers=headers)
+    assert [m["email"] for m in resp.json()["matches"]] == ["a@example.com", "b@example.com"]
+    assert main_app.student_index.ivf_lists == 0
+
+    resp = run_match(
+        "/match", json={"job_code": job_code, "limit": 2, "search": "approx", "nprobe": 1},
+        headers=headers,
+    )
+    assert resp.json()["search"] == "approx"
+    assert [m["email"] for m in resp.json()["matches"]] == ["a@example.com"]
+    assert main_app.student_index.ivf_lists == 2
+
+
+def test_batch_match_embeds_stale_jobs_in_one_call(monkeypatch):
+    main_app.redis_client.flushdb()
+    init_default_admin()
+
+    calls = []
+
+    class FakeResp:
+        def __init__(self, embs):
+            self.data = [type("obj", (), {"embedding": e, "index": i}) for i, e in enumerate(embs)]
+
+    def fake_create(input, model, **kwargs):
+        texts = input if isinstance(input, list) else [input]
+        calls.append(len(texts))
+        embs = []
+        for text in texts:
+            if text.startswith("skill"):
+                embs.append([1.0, 0.0] if text.startswith("skillA") else [0.0, 1.0])
+            else:
+                embs.append([1.0, 0.1] if "alpha" in text else [0.1, 1.0])
+        return FakeResp(embs)
+
+    monkeypatch.setattr(main_app.client.embeddings, "create", fake_create)
+    monkeypatch.setattr(
+        main_app, "get_driving_distances_miles", lambda origins, *a, **k: [1.0] * len(origins)
+    )
+    monkeypatch.setattr(main_app, "send_email", lambda *a, **k: None)
+    monkeypatch.setattr(main_app, "student_index", StudentIndex())
+
+    token = login_admin()
+    headers = {"Authorization": f"Bearer {token}"}
+    for name in ("A", "B"):
+        client.post(
+            "/students",
+            json={
+                "first_name": name, "last_name": "X", "email": f"{name.lower()}@example.com",
+                "phone": "1", "education_level": "College", "skills": [f"skill{name}"],
+                "experience_summary": "e", "interests": "i", "city": "c", "state": "s",
+                "lat": 0.0, "lng": 0.0, "max_travel": 50.0,
+            },
+            headers=headers,
+        )
+    codes = []
+    for desc in ("alpha", "beta"):
+        job = {
+            "job_title": "Dev", "job_description": desc, "desired_skills": ["python"], "source": "x",
+            "min_pay": 1.0, "max_pay": 2.0, "city": "c", "state": "s", "lat": 0.0, "lng": 0.0,
+        }
+        codes.append(client.post("/jobs", json=job, headers=headers).json()["job_code"])
+    for code in codes:
+        main_app.redis_client.delete(f"job_embedding:{code}")
+    # Forget the descriptions' vectors too, or the embedding cache would serve them
+    main_app.redis_client.delete(*main_app.redis_client.scan_iter("embedding_cache:*"))
+    calls.clear()
+
+    # A student changing after the batch is scored must stay after every
+    # job's watermark, so each job's next delta rematch rescores them
+    real_score_many = main_app.student_index.score_many
+
+    def score_many_then_change(job_embs):
+        pool = real_score_many(job_embs)
+        main_app.record_student_change(main_app.redis_client, "a@example.com")
+        return pool
+
+    monkeypatch.setattr(main_app.student_index, "score_many", score_many_then_change)
+    before = main_app.student_change_watermark(main_app.redis_client)
+    resp = run_match("/match/batch", json={"job_codes": codes, "limit": 1}, headers=headers)
+    assert calls == [2]
+    assert {main_app.get_match_state(main_app.redis_client, c)["watermark"] for c in codes} == {before}
+    body = resp.json()
+    assert body["batch"] and body["count"] == 2
+    assert [m["email"] for m in body["results"][codes[0]]] == ["a@example.com"]
+    assert [m["email"] for m in body["results"][codes[1]]] == ["b@example.com"]
+    resp = client.get(f"/match/{codes[1]}", headers=headers)
+    assert [m["email"] for m in resp.json()["matches"]] == ["b@example.com"]
+
+    resp = client.post("/match/batch", json={"job_codes": [codes[0], "nope"]}, headers=headers)
+    assert resp.status_code == 404
+
+
+def test_scattered_match_merges_shards_from_score_workers(monkeypatch):
+    from backend.app.services.score_shards import serve_score_task
+
+    main_app.redis_client.flushdb()
+    init_default_admin()
+
+    vectors = {"skillA": [1.0, 0.0], "skillB": [0.8, 0.6], "skillC": [0.0, 1.0]}
+
+    class FakeResp:
+        def __init__(self, emb):
+            self.data = [type("obj", (), {"embedding": emb})]
+
+    def fake_create(input, model, **kwargs):
+        return FakeResp(vectors.get(input.split()[0], [1.0, 0.0]))
+
+    monkeypatch.setattr(main_app.client.embeddings, "create", fake_create)
+    monkeypatch.setattr(
+        main_app, "get_driving_distances_miles", lambda origins, *a, **k: [1.0] * len(origins)
+    )
+    monkeypatch.setattr(main_app, "send_email", lambda *a, **k: None)
+    monkeypatch.setattr(main_app, "student_index", StudentIndex())
+    monkeypatch.setattr(main_app, "MATCH_SCATTER_SHARDS", 2)
+    real_gather = main_app.gather
+    served = []
+    workers = {"tasks": None}
+
+    def gather_after_workers_ran(r, request_id, shards, deadline, **kwargs):
+        # Stand-in for score workers on other replicas draining the task list
+        while workers["tasks"] != 0 and serve_score_task(
+            r, main_app.student_index, refresh=main_app.sync_student_index
+        ):
+            served.append(request_id)
+            if workers["tasks"]:
+                workers["tasks"] -= 1
+        return real_gather(r, request_id, shards, 0.01, **kwargs)
+
+    monkeypatch.setattr(main_app, "gather", gather_after_workers_ran)
+
+    token = login_admin()
+    headers = {"Authorization": f"Bearer {token}"}
+    for name in ("A", "B", "C"):
+        client.post(
+            "/students",
+            json={
+                "first_name": name, "last_name": "X", "email": f"{name.lower()}@example.com",
+                "phone": "1", "education_level": "College", "skills": [f"skill{name}"],
+                "experience_summary": "e", "interests": "i", "city": "c", "state": "s",
+                "lat": 0.0, "lng": 0.0, "max_travel": 50.0,
+            },
+            headers=headers,
+        )
+    job = {
+        "job_title": "Dev", "job_description": "desc", "desired_skills": ["python"], "source": "x",
+        "min_pay": 1.0, "max_pay": 2.0, "city": "c", "state": "s", "lat": 0.0, "lng": 0.0,
+    }
+    job_code = client.post("/jobs", json=job, headers=headers).json()["job_code"]
+
+    resp = run_match("/match", json={"job_code": job_code, "limit": 2}, headers=headers)
+    assert len(served) == 2
+    assert [m["email"] for m in resp.json()["matches"]] == ["a@example.com", "b@example.com"]
+
+    # One shard answers in time; the coordinator scores the other itself
+    served.clear()
+    workers["tasks"] = 1
+    resp = run_match(f"/rematches/{job_code}?limit=3&full=true", headers=headers)
+    assert len(served) == 1
+    assert [m["email"] for m in resp.json()["matches"]] == [
+        "a@example.com", "b@example.com", "c@example.com"
+    ]
+
+
+def test_scattered_pool_is_partial_for_delta_rematches(monkeypatch):
+    from backend.app.services.score_shards import serve_score_task
+
+    main_app.redis_client.flushdb()
+    init_default_admin()
+
+    vectors = {"skillA": [1.0, 0.0], "skillB": [0.8, 0.6], "skillC": [0.0, 1.0]}
+
+    class FakeResp:
+        def __init__(self, emb):
+            self.data = [type("obj", (), {"embedding": emb})]
+
+    def fake_create(input, model, **kwargs):
+        return FakeResp(vectors.get(input.split()[0], [1.0, 0.0]))
+
+    # Once "far" is set, students at latitude 0 are out of driving range
+    far = {"on": False}
+
+    def fake_distances(origins, *a, **k):
+        return [100.0 if far["on"] and lat == 0.0 else 1.0 for lat, _ in origins]
+
+    monkeypatch.setattr(main_app.client.embeddings, "create", fake_create)
+    monkeypatch.setattr(main_app, "get_driving_distances_miles", fake_distances)
+    monkeypatch.setattr(main_app, "send_email", lambda *a, **k: None)
+    monkeypatch.setattr(main_app, "student_index", StudentIndex())
+    monkeypatch.setattr(main_app, "MATCH_SCATTER_SHARDS", 1)
+    monkeypatch.setattr(main_app, "MATCH_SCATTER_TOP_K", 1)
+    real_gather = main_app.gather
+
+    def gather_after_workers_ran(r, request_id, shards, deadline, **kwargs):
+        while serve_score_task(r, main_app.student_index, refresh=main_app.sync_student_index):
+            pass
+        return real_gather(r, request_id, shards, 0.01, **kwargs)
+
+    monkeypatch.setattr(main_app, "gather", gather_after_workers_ran)
+
+    token = login_admin()
+    headers = {"Authorization": f"Bearer {token}"}
+    for name, lat in (("A", 0.0), ("B", 0.0), ("C", 0.001)):
+        client.post(
+            "/students",
+            json={
+                "first_name": name, "last_name": "X", "email": f"{name.lower()}@example.com",
+                "phone": "1", "education_level": "College", "skills": [f"skill{name}"],
+                "experience_summary": "e", "interests": "i", "city": "c", "state": "s",
+                "lat": lat, "lng": 0.0, "max_travel": 50.0,
+            },
+            headers=headers,
+        )
+    job = {
+        "job_title": "Dev", "job_description": "desc", "desired_skills": ["python"], "source": "x",
+        "min_pay": 1.0, "max_pay": 2.0, "city": "c", "state": "s", "lat": 0.0, "lng": 0.0,
+    }
+    job_code = client.post("/jobs", json=job, headers=headers).json()["job_code"]
+
+    def emails(resp):
+        return [m["email"] for m in resp.json()["matches"]]
+
+    resp = run_match("/match", json={"job_code": job_code, "limit": 1}, headers=headers)
+    assert emails(resp) == ["a@example.com"]
+    assert main_app.get_match_state(main_app.redis_client, job_code)["complete"] is False
+
+    # The shard top-k pool runs out, so the delta rematch falls back to a full one
+    resp = run_match(f"/rematches/{job_code}?limit=3", headers=headers)
+    assert emails(resp) == ["a@example.com", "b@example.com", "c@example.com"]
+
+    # Every shard candidate fails the driving check, so the job is scored locally
+    far["on"] = True
+    resp = run_match(f"/rematches/{job_code}?limit=1&full=true", headers=headers)
+    assert emails(resp) == ["c@example.com"]
+
+
+def test_reader_does_not_score_with_a_stale_published_index(monkeypatch, tmp_path):
+    main_app.redis_client.flushdb()
+    r = main_app.redis_client
+    writer = StudentIndex()
+    writer.sync(r, r)
+    for email, emb in (("a@example.com", [1.0, 0.0]), ("b@example.com", [0.8, 0.6])):
+        student = {"first_name": email[0], "last_name": "X", "lat": 0.0, "lng": 0.0, "max_travel": 50.0}
+        r.set(f"student:{email}", json.dumps(student))
+        main_app.save_student_embedding(r, email, emb)
+        writer.upsert(r, email, student, emb)
+        if email == "a@example.com":
+            writer.publish(str(tmp_path))
+
+    reader = StudentIndex()
+    monkeypatch.setattr(main_app, "student_index", reader)
+    monkeypatch.setattr(main_app, "redis_bytes", r)
+    monkeypatch.setattr(main_app, "STUDENT_INDEX_SHARED_DIR", str(tmp_path))
+    monkeypatch.setattr(main_app, "claim_writer", lambda *a: False)
+
+    # Only the copy published before b was saved exists, so the reader replays
+    main_app.sync_student_index()
+    assert not reader.readonly
+    assert sorted(reader.score([1.0, 0.0]).emails) == ["a@example.com", "b@example.com"]
+
+    writer.publish(str(tmp_path))
+    main_app.sync_student_index()
+    assert reader.readonly
+    assert sorted(reader.score([1.0, 0.0]).emails) == ["a@example.com", "b@example.com"]
@@ -6,6 +6,7 @@ os.environ.setdefault("GOOGLE_KEY", "test")
 from fastapi.testclient import TestClient
 from jose import jwt
 import json
+import numpy as np
 import app.main as main_app
 
 
@@ -13,7 +14,7 @@ class DummyRedis:
     def __init__(self):
         self.store = {}
 
-    def set(self, key, value):
+    def set(self, key, value, ex=None, px=None):
         self.store[key] = value
 
     def get(self, key):
@@ -22,8 +23,9 @@ class DummyRedis:
     def exists(self, key):
         return key in self.store
 
-    def delete(self, key):
-        self.store.pop(key, None)
+    def delete(self, *keys):
+        for key in keys:
+            self.store.pop(key, None)
 
     def scan_iter(self, pattern="*"):
         from fnmatch import fnmatch
@@ -44,13 +46,198 @@ class DummyRedis:
     def mget(self, keys):
         return [self.store.get(k) for k in keys]
 
+    def geoadd(self, key, values):
+        members = self.store.setdefault(key, {})
+        for i in range(0, len(values), 3):
+            lng, lat, member = values[i:i + 3]
+            members[member] = (lng, lat)
+
+    def geosearch(self, key, longitude, latitude, radius, unit="mi"):
+        from math import asin, cos, radians, sin, sqrt
+        found = []
+        for member, (lng, lat) in self.store.get(key, {}).items():
+            a = (
+                sin(radians(lat - latitude) / 2) ** 2
+                + cos(radians(latitude)) * cos(radians(lat)) * sin(radians(lng - longitude) / 2) ** 2
+            )
+            if 2 * 3958.8 * asin(sqrt(a)) <= radius:
+                found.append(member)
+        return found
+
+    def zrem(self, key, *members):
+        removed = 0
+        for member in members:
+            if self.store.get(key, {}).pop(member, None) is not None:
+                removed += 1
+        return removed
+
+    def sadd(self, key, *members):
+        s = self.store.setdefault(key, set())
+        before = len(s)
+        s.update(members)
+        return len(s) - before
+
+    def srem(self, key, *members):
+        s = self.store.get(key, set())
+        before = len(s)
+        s.difference_update(members)
+        return before - len(s)
+
+    def smembers(self, key):
+        return set(self.store.get(key, set()))
+
+    def sunion(self, *keys):
+        result = set()
+        for k in keys:
+            result |= self.store.get(k, set())
+        return result
+
+    def hget(self, key, field):
+        return self.store.get(key, {}).get(field)
+
+    def hset(self, key, field=None, value=None, mapping=None):
+        h = self.store.setdefault(key, {})
+        if field is not None:
+            h[field] = value
+        h.update(mapping or {})
+        return 1
+
+    def hmget(self, key, fields):
+        h = self.store.get(key, {})
+        return [h.get(f) for f in fields]
+
+    def hgetall(self, key):
+        return dict(self.store.get(key, {}))
+
+    def pttl(self, key):
+        return -1 if key in self.store else -2
+
+    def expire(self, key, seconds):
+        return key in self.store
+
+    def rpush(self, key, *values):
+        lst = self.store.setdefault(key, [])
+        lst.extend(values)
+        return len(lst)
+
+    def lpop(self, key):
+        lst = self.store.get(key)
+        return lst.pop(0) if lst else None
+
+    def blpop(self, keys, timeout=0):
+        for key in keys:
+            value = self.lpop(key)
+            if value is not None:
+                return key, value
+        return None
+
+    def lindex(self, key, index):
+        lst = self.store.get(key) or []
+        return lst[index] if -len(lst) <= index < len(lst) else None
+
+    def lrem(self, key, count, value):
+        lst = self.store.get(key) or []
+        if value in lst:
+            lst.remove(value)
+            return 1
+        return 0
+
+    def lmove(self, src, dst, src_side="LEFT", dst_side="RIGHT"):
+        lst = self.store.get(src)
+        if not lst:
+            return None
+        value = lst.pop(0 if src_side == "LEFT" else -1)
+        target = self.store.setdefault(dst, [])
+        target.insert(0 if dst_side == "LEFT" else len(target), value)
+        return value
+
+    def blmove(self, src, dst, timeout, src_side="LEFT", dst_side="RIGHT"):
+        return self.lmove(src, dst, src_side, dst_side)
+
+    def hincrby(self, key, field, amount=1):
+        h = self.store.setdefault(key, {})
+        h[field] = str(int(h.get(field) or 0) + amount)
+        return int(h[field])
+
+    def zadd(self, key, mapping):
+        self.store.setdefault(key, {}).update(mapping)
+
+    def zcard(self, key):
+        return len(self.store.get(key, {}))
+
+    def zrange(self, key, start, end, withscores=False):
+        items = sorted(self.store.get(key, {}).items(), key=lambda kv: (kv[1], kv[0]))
+        items = items[start:] if end == -1 else items[start:end + 1]
+        return items if withscores else [m for m, _ in items]
+
+    def zremrangebyrank(self, key, start, end):
+        for member in self.zrange(key, start, end):
+            self.store[key].pop(member)
+
+    def zrangebyscore(self, key, low, high, withscores=False):
+        low = float(low[1:]) if str(low).startswith("(") else float(low)
+        items = [(m, s) for m, s in self.zrange(key, 0, -1, withscores=True) if s > low]
+        return items if withscores else [m for m, _ in items]
+
+    def zmscore(self, key, members):
+        z = self.store.get(key, {})
+        return [z.get(m) for m in members]
+
+    def zrevrange(self, key, start, end, withscores=False):
+        items = sorted(self.store.get(key, {}).items(), key=lambda kv: (kv[1], kv[0]), reverse=True)
+        items = items[start:] if end == -1 else items[start:end + 1]
+        return items if withscores else [m for m, _ in items]
+
+    def type(self, key):
+        value = self.store.get(key)
+        if value is None:
+            return "none"
+        return "string" if isinstance(value, (str, bytes, int, float)) else "zset"
+
+    def pipeline(self, transaction=True):
+        redis = self
+
+        class Pipe:
+            def __init__(self):
+                self.ops = []
+                self.watching = False
+
+            def __enter__(self):
+                return self
+
+            def __exit__(self, *exc):
+                return False
+
+            def watch(self, *keys):
+                # Like redis-py, commands run immediately until multi()
+                self.watching = True
+
+            def multi(self):
+                self.watching = False
+
+            def __getattr__(self, name):
+                if self.watching:
+                    return getattr(redis, name)
+                return lambda *a, **k: self.ops.append((name, a, k))
+
+            def execute(self):
+                return [getattr(redis, name)(*a, **k) for name, a, k in self.ops]
+
+        return Pipe()
+
+    def hdel(self, key, *fields):
+        h = self.store.get(key, {})
+        return sum(1 for f in fields if h.pop(f, None) is not None)
+
     def flushdb(self):
         self.store.clear()
 
 
 main_app.redis_client = DummyRedis()
+main_app.redis_bytes = main_app.redis_client
 from app.main import app, JWT_SECRET, ALGORITHM, init_default_admin
 import backend.app.main  # register additional routes
+from backend.app.services.match_store import save_matches
 
 client = TestClient(app)
 
@@ -338,19 +525,18 @@ def test_upload_students(monkeypatch):
     token = login_resp.json()["token"]
 
     class FakeResp:
-        def __init__(self):
-            self.data = [type("obj", (), {"embedding": [0.0, 0.1]})]
-
-    def fake_create(input, model):
-        return FakeResp()
+        def __init__(self, count):
+            self.data = [type("obj", (), {"embedding": [0.0, 0.1]}) for _ in range(count)]
 
     stored = {}
+    calls = []
 
     def fake_set(key, value):
         stored[key] = value
 
     def fake_create(input, model):
-        return FakeResp()
+        calls.append(input)
+        return FakeResp(len(input) if isinstance(input, list) else 1)
 
     monkeypatch.setattr(main_app.client.embeddings, "create", fake_create)
     monkeypatch.setattr(main_app.redis_client, "set", fake_set)
@@ -365,7 +551,38 @@ def test_upload_students(monkeypatch):
     resp = client.post("/students/upload", files=files, headers={"Authorization": f"Bearer {token}"})
     assert resp.status_code == 200
     assert resp.json()["count"] == 2
-    assert len(stored) == 2
+    assert sorted(k for k in stored if k.startswith("student:")) == [
+        "student:jane@example.com",
+        "student:john@example.com",
+    ]
+    assert len([k for k in stored if k.startswith("student_embedding:")]) == 2
+    assert len(calls) == 1 and len(calls[0]) == 2
+
+
+
+def test_create_embeddings_only_sends_uncached_texts(monkeypatch):
+    main_app.redis_client.flushdb()
+    calls = []
+
+    class FakeResp:
+        def __init__(self, texts):
+            self.data = [type("obj", (), {"embedding": [float(len(t)), 1.0]}) for t in texts]
+
+    def fake_create(input, model, **kwargs):
+        texts = input if isinstance(input, list) else [input]
+        calls.append(texts)
+        return FakeResp(texts)
+
+    monkeypatch.setattr(main_app.client.embeddings, "create", fake_create)
+    assert main_app.create_embeddings(["python sql", "rn"]) == [[10.0, 1.0], [2.0, 1.0]]
+    # Whitespace differences share an entry; only the new text is sent
+    assert main_app.create_embeddings(["cna", " python  sql", "rn"]) == [
+        [3.0, 1.0], [10.0, 1.0], [2.0, 1.0]
+    ]
+    assert calls == [["python sql", "rn"], ["cna"]]
+    assert main_app.create_embeddings(["rn"]) == [[2.0, 1.0]]
+    assert len(calls) == 2
+    assert main_app.redis_client.get("metrics:embedding_cache_hits") == 3
 
 
 def test_metrics_endpoint():
@@ -391,8 +608,12 @@ def test_metrics_endpoint():
     main_app.redis_client.set("user:user3@example.com", json.dumps(u3))
 
     # Seed student profiles
-    main_app.redis_client.set("stud1@example.com", json.dumps({"email": "stud1@example.com"}))
-    main_app.redis_client.set("stud2@example.com", json.dumps({"email": "stud2@example.com"}))
+    main_app.redis_client.set("student:stud1@example.com", json.dumps({"email": "stud1@example.com"}))
+    main_app.redis_client.set("student:stud2@example.com", json.dumps({"email": "stud2@example.com"}))
+    # Embeddings, caches and counters kept beside the profiles are not students
+    main_app.redis_client.set("student_embedding:stud1@example.com", b"\x00\x00\x80?")
+    main_app.redis_client.set("distance_cache:9q9p3:9q9p4", "3.2")
+    main_app.redis_client.set("student_index:version", 4)
 
     # Seed jobs
     main_app.redis_client.set("job:abc", json.dumps({"job_code": "abc"}))
@@ -406,6 +627,7 @@ def test_metrics_endpoint():
     main_app.redis_client.set("metrics:sum_time_to_place", 5.0)
     main_app.redis_client.set("metrics:licensed:A", 1)
     main_app.redis_client.set("metrics:licensed:B", 2)
+    main_app.redis_client.set("metrics:distance_calls_skipped", 7)
 
     login_resp = client.post("/login", json={"email": "admin@example.com", "password": "admin123"})
     token = login_resp.json()["token"]
@@ -425,6 +647,7 @@ def test_metrics_endpoint():
     assert abs(data["avg_time_to_placement_days"] - 2.5) < 1e-6
     assert data["license_breakdown"] == {"A": 1, "B": 2}
     assert data["rematch_rate"] == 0.5
+    assert data["distance_calls_skipped"] == 7
 
 
 def test_admin_reset_jobs():
@@ -557,10 +780,100 @@ def test_update_student(monkeypatch):
     saved = json.loads(main_app.redis_client.get("student:stud@example.com"))
     assert saved["first_name"] == "New"
     assert saved["education_level"] == "College"
-    assert saved["embedding"] == [1.0, 2.0]
+    assert "embedding" not in saved
+    raw = main_app.redis_client.get("student_embedding:stud@example.com")
+    assert np.frombuffer(raw, dtype="<f4").tolist() == [1.0, 2.0]
     assert saved["school_code"] == "SC1"
 
 
+
+def test_patch_student_only_re_embeds_changed_text(monkeypatch):
+    main_app.redis_client.flushdb()
+    init_default_admin()
+
+    login_resp = client.post("/login", json={"email": "admin@example.com", "password": "admin123"})
+    headers = {"Authorization": f"Bearer {login_resp.json()['token']}"}
+
+    existing = {
+        "first_name": "Old", "last_name": "Name", "email": "stud@example.com", "phone": "000",
+        "education_level": "HS", "skills": ["python"], "experience_summary": "summary",
+        "interests": "coding", "city": "City", "state": "ST", "lat": 0.0, "lng": 0.0,
+        "max_travel": 100.0,
+    }
+    main_app.save_student("stud@example.com", dict(existing), [0.5, 0.5])
+
+    calls = []
+    indexed = []
+
+    class FakeResp:
+        def __init__(self):
+            self.data = [type("obj", (), {"embedding": [1.0, 2.0]})]
+
+    def fake_create(input, model, **kwargs):
+        calls.append(input)
+        return FakeResp()
+
+    monkeypatch.setattr(main_app.client.embeddings, "create", fake_create)
+    monkeypatch.setattr(
+        main_app, "index_student", lambda email, data, emb: indexed.append(list(emb))
+    )
+    monkeypatch.setattr(main_app, "refresh_student_matches", lambda emails: None)
+
+    def stored():
+        saved = json.loads(main_app.redis_client.get("student:stud@example.com"))
+        raw = main_app.redis_client.get("student_embedding:stud@example.com")
+        return saved, np.frombuffer(raw, dtype="<f4").tolist()
+
+    resp = client.patch("/students/stud@example.com", json={"phone": "111"}, headers=headers)
+    assert resp.status_code == 200
+    saved, emb = stored()
+    assert saved["phone"] == "111" and saved["city"] == "City"
+    assert emb == [0.5, 0.5] and not calls and not indexed
+
+    client.patch("/students/stud@example.com", json={"lat": 1.0, "max_travel": 20.0}, headers=headers)
+    saved, emb = stored()
+    assert (saved["lat"], saved["max_travel"]) == (1.0, 20.0)
+    assert not calls and indexed == [[0.5, 0.5]]
+
+    client.patch(
+        "/students/stud@example.com", json={"skills": ["python", "sql"]}, headers=headers
+    )
+    saved, emb = stored()
+    assert calls == ["python, sql summary coding"]
+    assert saved["skills"] == ["python", "sql"] and emb == [1.0, 2.0]
+
+    # The same text embedded with another model is not reused
+    calls.clear()
+    monkeypatch.setattr(main_app, "EMBEDDING_MODEL", "text-embedding-3-large")
+    client.patch("/students/stud@example.com", json={"phone": "222"}, headers=headers)
+    assert calls == ["python, sql summary coding"]
+    client.patch("/students/stud@example.com", json={"phone": "333"}, headers=headers)
+    assert len(calls) == 1
+
+    bad = client.patch("/students/stud@example.com", json={"max_travel": 0}, headers=headers)
+    assert bad.status_code == 422
+    missing = client.patch("/students/nobody@example.com", json={"phone": "1"}, headers=headers)
+    assert missing.status_code == 404
+
+
+
+def test_migrate_student_embeddings_runs_once():
+    main_app.redis_client.flushdb()
+    main_app.redis_client.set(
+        "student:a@example.com", json.dumps({"email": "a@example.com", "embedding": [1.0, 0.5]})
+    )
+    main_app.migrate_student_embeddings()
+    assert "embedding" not in json.loads(main_app.redis_client.get("student:a@example.com"))
+    raw = main_app.redis_client.get("student_embedding:a@example.com")
+    assert np.frombuffer(raw, dtype="<f4").tolist() == [1.0, 0.5]
+
+    # Later boots skip the scan
+    late = json.dumps({"email": "b@example.com", "embedding": [0.0, 1.0]})
+    main_app.redis_client.set("student:b@example.com", late)
+    main_app.migrate_student_embeddings()
+    assert main_app.redis_client.get("student:b@example.com") == late
+
+
 def test_generate_description(monkeypatch):
     main_app.redis_client.flushdb()
     init_default_admin()
@@ -1048,7 +1361,11 @@ def test_admin_delete_student_cleans_up():
     )
     main_app.redis_client.set("resume:j1:del@example.com", "resume")
     main_app.redis_client.set("job_description:j1:del@example.com", "desc")
-    main_app.redis_client.set("match_results:j1", json.dumps([{"email": "del@example.com"}]))
+    save_matches(
+        main_app.redis_client,
+        "j1",
+        [{"email": "del@example.com", "score": 0.9}, {"email": "keep@example.com", "score": 0.5}],
+    )
 
     login_resp = client.post("/login", json={"email": "admin@example.com", "password": "admin123"})
     token = login_resp.json()["token"]
@@ -1065,7 +1382,29 @@ def test_admin_delete_student_cleans_up():
     assert "del@example.com" not in job.get("placed_students", [])
     assert main_app.redis_client.get("resume:j1:del@example.com") is None
     assert main_app.redis_client.get("job_description:j1:del@example.com") is None
-    assert main_app.redis_client.get("match_results:j1") == "[]"
+    assert main_app.redis_client.zrevrange("match_results:j1", 0, -1) == ["keep@example.com"]
+    assert main_app.redis_client.hmget("match_details:j1", ["del@example.com"]) == [None]
+
+
+def test_delete_student_survives_geo_index_failure(monkeypatch):
+    main_app.redis_client.flushdb()
+    init_default_admin()
+    main_app.redis_client.set("student:del@example.com", json.dumps({"email": "del@example.com"}))
+    zrem = main_app.redis_client.zrem
+
+    def failing_zrem(key, *members):
+        if key == main_app.STUDENT_GEO_KEY:
+            raise ConnectionError("geo index unavailable")
+        return zrem(key, *members)
+
+    monkeypatch.setattr(main_app.redis_client, "zrem", failing_zrem)
+    login_resp = client.post("/login", json={"email": "admin@example.com", "password": "admin123"})
+    resp = client.delete(
+        "/admin/delete-student/del@example.com",
+        headers={"Authorization": f"Bearer {login_resp.json()['token']}"},
+    )
+    assert resp.status_code == 200
+    assert not main_app.redis_client.exists("student:del@example.com")
 
 
 def test_delete_student_not_found():
@@ -1529,3 +1868,50 @@ def test_test_notification_forbidden():
     )
     assert resp.status_code == 403
 
+
+
+def test_concurrent_student_creates_share_one_embedding_call(monkeypatch):
+    import asyncio
+
+    import httpx
+    from backend.app.services.embedding_batcher import EmbeddingBatcher
+
+    main_app.redis_client.flushdb()
+    init_default_admin()
+    token = client.post(
+        "/login", json={"email": "admin@example.com", "password": "admin123"}
+    ).json()["token"]
+    calls = []
+
+    class FakeResp:
+        def __init__(self, n):
+            self.data = [type("obj", (), {"embedding": [1.0, 0.0]}) for _ in range(n)]
+
+    def fake_create(input, model, **kwargs):
+        calls.append(input)
+        return FakeResp(1 if isinstance(input, str) else len(input))
+
+    monkeypatch.setattr(main_app.client.embeddings, "create", fake_create)
+    batcher = EmbeddingBatcher(main_app.create_embeddings, max_wait=0.5)
+    monkeypatch.setattr(main_app, "embedding_batcher", batcher)
+
+    def profile(n):
+        return {
+            "first_name": f"S{n}", "last_name": "X", "email": f"s{n}@example.com", "phone": "1",
+            "education_level": "College", "skills": [f"skill{n}"], "experience_summary": "e",
+            "interests": "i", "city": "c", "state": "s", "lat": 0.0, "lng": 0.0,
+            "max_travel": 50.0,
+        }
+
+    async def post_both():
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as ac:
+            return await asyncio.gather(*[
+                ac.post("/students", json=profile(n), headers={"Authorization": f"Bearer {token}"})
+                for n in (1, 2)
+            ])
+
+    responses = asyncio.run(post_both())
+    batcher.close()
+    assert [r.status_code for r in responses] == [200, 200]
+    assert len(calls) == 1 and sorted(calls[0]) == ["skill1 e i", "skill2 e i"]
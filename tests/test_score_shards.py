@@ -0,0 +1,123 @@
+import numpy as np
+
+from backend.app.services import score_shards
+from backend.app.services.student_index import StudentIndex
+
+
+class DummyRedis:
+    def __init__(self):
+        self.store = {}
+        self.ttls = {}
+
+    def set(self, key, value, px=None):
+        self.store[key] = value
+        self.ttls[key] = px
+
+    def pttl(self, key):
+        return self.ttls.get(key, -1) if key in self.store else -2
+
+    def get(self, key):
+        return self.store.get(key)
+
+    def delete(self, *keys):
+        for key in keys:
+            self.store.pop(key, None)
+
+    def expire(self, key, seconds):
+        pass
+
+    def incr(self, key, amount=1):
+        self.store[key] = int(self.store.get(key, 0)) + amount
+        return self.store[key]
+
+    def zadd(self, key, mapping):
+        self.store.setdefault(key, {}).update(mapping)
+
+    def rpush(self, key, *values):
+        self.store.setdefault(key, []).extend(values)
+
+    def lpop(self, key):
+        lst = self.store.get(key)
+        return lst.pop(0) if lst else None
+
+    def blpop(self, keys, timeout=0):
+        for key in keys:
+            value = self.lpop(key)
+            if value is not None:
+                return key, value
+        return None
+
+    def sunion(self, *keys):
+        return set().union(*(self.store.get(k, set()) for k in keys))
+
+
+def node_index(r, students):
+    index = StudentIndex()
+    index.sync = lambda *a, **k: None
+    for email, emb, lat, max_travel in students:
+        index._put(email, {"first_name": email[0], "lat": lat, "lng": 0.0, "max_travel": max_travel}, emb)
+    index._loaded = True
+    return index
+
+
+def test_shards_score_on_any_node_and_merge_top_k():
+    r = DummyRedis()
+    students = [(f"s{i}@example.com", [1.0, i / 10], 0.0, 50.0) for i in range(10)]
+    students.append(("far@example.com", [1.0, 2.0], 10.0, 5.0))
+    # Two nodes holding the same students in different row orders
+    nodes = [node_index(r, students), node_index(r, students[::-1])]
+
+    request = score_shards.score_request(
+        [0.0, 1.0], shards=3, top_k=2, lat=0.0, lng=0.0, uninterested=["s9@example.com"]
+    )
+    request_id = score_shards.scatter(r, request, deadline=5)
+    assert r.pttl(score_shards.request_key(request_id)) == 5000
+    served = 0
+    while score_shards.serve_score_task(r, nodes[served % 2]):
+        served += 1
+    assert served == 3
+
+    pool, answered = score_shards.gather(r, request_id, 3, deadline=1)
+    assert answered == 3
+    assert "far@example.com" not in pool.emails and "s9@example.com" not in pool.emails
+    # Scores grow with the student number, so each shard keeps its two highest
+    expected = []
+    for shard in range(3):
+        members = nodes[0].shard(shard, 3) - {"far@example.com", "s9@example.com"}
+        expected.extend(sorted(members, key=lambda e: -int(e[1:].split("@")[0]))[:2])
+    assert sorted(pool.emails) == sorted(expected)
+    assert r.get(score_shards.request_key(request_id)) is None
+
+
+def test_expired_shard_tasks_are_skipped():
+    r = DummyRedis()
+    index = node_index(r, [("a@example.com", [1.0, 0.0], 0.0, 50.0)])
+    request = score_shards.score_request([1.0, 0.0], 1, 5, lat=0.0, lng=0.0)
+    request_id = score_shards.scatter(r, request, deadline=5)
+    # Redis drops the request at its deadline, whatever the workers' clocks say
+    r.delete(score_shards.request_key(request_id))
+
+    assert score_shards.serve_score_task(r, index)
+    pool, answered = score_shards.gather(r, request_id, 1, deadline=0.1)
+    assert answered == 0 and pool.emails == [] and pool.scores.dtype == np.float32
+
+
+def test_missing_shards_are_scored_by_the_fallback():
+    r = DummyRedis()
+    students = [(f"s{i}@example.com", [1.0, i / 10], 0.0, 50.0) for i in range(6)]
+    index = node_index(r, students)
+    request = score_shards.score_request([0.0, 1.0], shards=2, top_k=10, lat=0.0, lng=0.0)
+    request_id = score_shards.scatter(r, request, deadline=5)
+    # Only the first shard's worker answers
+    assert score_shards.serve_score_task(r, index)
+    r.delete(score_shards.SCORE_TASKS_KEY)
+
+    missed = []
+
+    def fallback(shard):
+        missed.append(shard)
+        return score_shards.score_shard(r, index, request, shard)
+
+    pool, answered = score_shards.gather(r, request_id, 2, deadline=0.1, fallback=fallback)
+    assert answered == 1 and missed == [1]
+    assert sorted(pool.emails) == sorted(e for e, *_ in students)
@@ -0,0 +1,404 @@
+import json
+
+import numpy as np
+import pytest
+from redis.exceptions import WatchError
+
+from backend.app.services.student_index import StudentIndex
+
+
+class DummyRedis:
+    def __init__(self):
+        self.store = {}
+
+    def set(self, key, value, nx=False, ex=None):
+        if nx and key in self.store:
+            return None
+        self.store[key] = value
+        return True
+
+    def get(self, key):
+        return self.store.get(key)
+
+    def scan_iter(self, pattern="*"):
+        from fnmatch import fnmatch
+        for k in list(self.store.keys()):
+            if fnmatch(k, pattern):
+                yield k
+
+    def incr(self, key, amount=1):
+        val = int(self.store.get(key, 0)) + amount
+        self.store[key] = val
+        return val
+
+    def mget(self, keys):
+        return [self.store.get(k) for k in keys]
+
+    def expire(self, key, seconds):
+        pass
+
+    def zadd(self, key, mapping):
+        self.store.setdefault(key, {}).update(mapping)
+
+    def zrangebyscore(self, key, low, high, withscores=False):
+        low = float(str(low).lstrip("("))
+        items = sorted((kv for kv in self.store.get(key, {}).items() if kv[1] > low), key=lambda kv: kv[1])
+        return items if withscores else [m for m, _ in items]
+
+    def pipeline(self, transaction=True):
+        redis = self
+
+        class Pipe:
+            def __init__(self):
+                self.ops = []
+                self.watching = False
+
+            def __enter__(self):
+                return self
+
+            def __exit__(self, *exc):
+                return False
+
+            def watch(self, *keys):
+                self.watching = True
+                self.watched = {k: redis.store.get(k) for k in keys}
+
+            def multi(self):
+                self.watching = False
+
+            def __getattr__(self, name):
+                if self.watching:
+                    return getattr(redis, name)
+                return lambda *a, **k: self.ops.append((name, a, k))
+
+            def execute(self):
+                ops, self.ops = self.ops, []
+                if any(redis.store.get(k) != v for k, v in getattr(self, "watched", {}).items()):
+                    raise WatchError()
+                return [getattr(redis, name)(*a, **k) for name, a, k in ops]
+
+        return Pipe()
+
+
+def make_student(email, emb, lat=0.0, lng=0.0, max_travel=50.0):
+    return {
+        "first_name": email.split("@")[0],
+        "last_name": "X",
+        "email": email,
+        "embedding": emb,
+        "lat": lat,
+        "lng": lng,
+        "max_travel": max_travel,
+    }
+
+
+def test_load_and_score():
+    r = DummyRedis()
+    r.set("student:a@example.com", json.dumps(make_student("a@example.com", [1.0, 0.0])))
+    r.set("student:b@example.com", json.dumps(make_student("b@example.com", [0.0, 1.0])))
+    r.set("job:x", json.dumps({"job_code": "x"}))
+
+    index = StudentIndex()
+    index.sync(r)
+    assert len(index) == 2
+
+    pool = index.score([1.0, 0.0])
+    scores = dict(zip(pool.emails, pool.scores.tolist()))
+    assert scores == {"a@example.com": 1.0, "b@example.com": 0.0}
+    assert pool.scores.dtype == np.float32
+
+
+def test_upsert_and_remove_keep_rows_contiguous():
+    r = DummyRedis()
+    index = StudentIndex()
+    index.sync(r)
+    for i in range(3):
+        index.upsert(r, f"s{i}@example.com", make_student(f"s{i}@example.com", [float(i), 1.0]))
+    index.remove(r, "s0@example.com")
+    index.upsert(r, "s2@example.com", make_student("s2@example.com", [5.0, 1.0], max_travel=10.0))
+
+    pool = index.score([1.0, 0.0])
+    assert sorted(pool.emails) == ["s1@example.com", "s2@example.com"]
+    row = pool.emails.index("s2@example.com")
+    assert pool.scores[row] == 5.0
+    assert pool.max_travel[row] == 10.0
+
+
+def test_other_worker_changes_trigger_reload():
+    r = DummyRedis()
+    worker_a = StudentIndex()
+    worker_b = StudentIndex()
+    worker_a.sync(r)
+    worker_b.sync(r)
+
+    student = make_student("new@example.com", [1.0, 1.0])
+    r.set("student:new@example.com", json.dumps(student))
+    worker_a.upsert(r, "new@example.com", student)
+    assert "new@example.com" in worker_a
+    assert "new@example.com" not in worker_b
+
+    worker_b.sync(r)
+    assert "new@example.com" in worker_b
+
+
+def test_score_restricted_to_candidate_emails():
+    r = DummyRedis()
+    index = StudentIndex()
+    index.sync(r)
+    index.upsert(r, "a@example.com", make_student("a@example.com", [1.0, 0.0], max_travel=20.0))
+    index.upsert(r, "b@example.com", make_student("b@example.com", [0.0, 1.0], max_travel=80.0))
+
+    pool = index.score([1.0, 1.0], emails={"b@example.com", "unknown@example.com"})
+    assert pool.emails == ["b@example.com"]
+    assert pool.max_travel.tolist() == [80.0]
+    assert index.max_travel_limit() == 80.0
+
+
+def test_ranked_blocks_yields_descending_order():
+    from backend.app.services.student_index import ranked_blocks
+
+    scores = np.array([0.3, 0.9, 0.1, 0.7, 0.5, 0.2, 0.8], dtype=np.float32)
+    blocks = list(ranked_blocks(scores, 2))
+    assert [len(b) for b in blocks] == [2, 4, 1]
+    order = np.concatenate(blocks)
+    assert scores[order].tolist() == sorted(scores.tolist(), reverse=True)
+
+
+def test_load_reads_binary_embeddings_and_legacy_inline_ones():
+    from backend.app.services.student_index import encode_embedding, embedding_key
+
+    r = DummyRedis()
+    profile = make_student("bin@example.com", None)
+    del profile["embedding"]
+    r.set("student:bin@example.com", json.dumps(profile))
+    r.set(embedding_key("bin@example.com"), encode_embedding([0.5, 0.25]))
+    r.set("student:old@example.com", json.dumps(make_student("old@example.com", [1.0, 0.0])))
+
+    assert len(encode_embedding([0.5, 0.25])) == 8
+    index = StudentIndex()
+    index.sync(r)
+    pool = index.score([1.0, 1.0])
+    assert dict(zip(pool.emails, pool.scores.tolist())) == {
+        "bin@example.com": 0.75,
+        "old@example.com": 1.0,
+    }
+
+
+def test_reduced_dimensions_truncate_and_renormalise():
+    r = DummyRedis()
+    index = StudentIndex(dimensions=2)
+    index.sync(r)
+    index.upsert(r, "a@example.com", make_student("a@example.com", [3.0, 4.0, 9.0]))
+
+    assert index.dim == 2
+    pool = index.score([1.0, 0.0, 5.0])
+    assert np.isclose(pool.scores[0], 0.6)
+
+
+def test_quantized_index_scores_close_to_exact():
+    rng = np.random.default_rng(0)
+    vectors = rng.normal(size=(20, 16)).astype(np.float32)
+    query = rng.normal(size=16).astype(np.float32)
+    exact = vectors @ query
+
+    for mode, tol in (("float16", 1e-2), ("int8", 5e-2)):
+        r = DummyRedis()
+        index = StudentIndex(quantization=mode)
+        index.sync(r)
+        for i, vec in enumerate(vectors):
+            index.upsert(r, f"s{i}@example.com", make_student(f"s{i}@example.com", vec.tolist()))
+        index.remove(r, "s0@example.com")
+
+        pool = index.score(query.tolist())
+        got = {e: s for e, s in zip(pool.emails, pool.scores.tolist())}
+        assert len(got) == 19 and index.lossy
+        for i in range(1, 20):
+            assert abs(got[f"s{i}@example.com"] - exact[i]) <= tol * np.linalg.norm(query) * np.linalg.norm(vectors[i])
+    assert StudentIndex(quantization="int8").nbytes == 0
+
+
+def test_grown_rows_are_not_assigned_to_an_ivf_list():
+    r = DummyRedis()
+    index = StudentIndex()
+    index.sync(r)
+    for i in range(3):
+        index.upsert(r, f"s{i}@example.com", make_student(f"s{i}@example.com", [float(i), 1.0]))
+
+    assert index._matrix.shape[0] > 3
+    assert (index._list[3:] == -1).all()
+    assert (index._scale[3:] == 1).all()
+    assert (index._max_travel[3:] == 0).all()
+
+
+def test_ivf_probes_nearest_lists_and_assigns_new_rows():
+    rng = np.random.default_rng(1)
+    centres = np.eye(4, dtype=np.float32)[:2] * 5
+    r = DummyRedis()
+    index = StudentIndex()
+    index.sync(r)
+    for i in range(40):
+        email = f"s{i}@example.com"
+        student = make_student(email, (centres[i % 2] + rng.normal(scale=0.1, size=4)).tolist())
+        r.set(f"student:{email}", json.dumps(student))
+        index.upsert(r, email, student)
+
+    assert index.train_ivf(r, nlist=2) == 2
+    assert index.ivf_lists == 2
+    pool = index.score([1.0, 0.0, 0.0, 0.0], nprobe=1)
+    assert sorted(pool.emails) == sorted(f"s{i}@example.com" for i in range(0, 40, 2))
+    assert len(index.score([1.0, 0.0, 0.0, 0.0]).emails) == 40
+
+    index.upsert(r, "new@example.com", make_student("new@example.com", [0.0, 4.0, 0.0, 0.0]))
+    pool = index.score([0.0, 1.0, 0.0, 0.0], emails={"new@example.com", "s0@example.com"}, nprobe=1)
+    assert pool.emails == ["new@example.com"]
+
+    # Other workers pick up the persisted centroids when they load
+    other = StudentIndex()
+    other.sync(r)
+    assert other.ivf_lists == 2
+    assert len(other.score([0.0, 1.0, 0.0, 0.0], nprobe=1).emails) == 20
+
+
+def test_writer_publishes_and_readers_map_the_shared_copy(tmp_path):
+    from backend.app.services.student_index import claim_writer
+
+    r = DummyRedis()
+    assert claim_writer(r, "w1", 30)
+    assert not claim_writer(r, "w2", 30)
+    assert claim_writer(r, "w1", 30)
+
+    writer = StudentIndex()
+    writer.sync(r)
+    for email, emb in (("a@example.com", [1.0, 0.0]), ("b@example.com", [0.0, 1.0])):
+        student = make_student(email, emb)
+        r.set(f"student:{email}", json.dumps(student))
+        writer.upsert(r, email, student)
+    assert writer.publish(str(tmp_path)) == "v2"
+    assert writer.publish(str(tmp_path)) is None
+
+    reader = StudentIndex()
+    assert reader.attach(str(tmp_path))
+    assert reader.readonly and reader.version == 2
+    pool = reader.score([1.0, 0.0])
+    assert dict(zip(pool.emails, pool.scores.tolist())) == {"a@example.com": 1.0, "b@example.com": 0.0}
+    assert not StudentIndex(quantization="int8").attach(str(tmp_path))
+
+    # A reader only logs changes; the writer replays them and republishes
+    del r.store["student:a@example.com"]
+    reader.remove(r, "a@example.com")
+    assert "a@example.com" in reader
+    assert reader.version == 2 and r.get("student_index:version") == 3
+    # A copy behind the logged version is not good enough to score with
+    assert not reader.attach(str(tmp_path), min_version=3)
+    writer.sync(r)
+    assert "a@example.com" not in writer
+    assert writer.publish(str(tmp_path)) == "v3"
+    assert reader.attach(str(tmp_path), min_version=3)
+    assert reader.score([1.0, 0.0]).emails == ["b@example.com"]
+
+    # A reader that takes over as writer still replays what it only logged
+    b = make_student("b@example.com", [0.0, 1.0], lat=5.0)
+    r.set("student:b@example.com", json.dumps(b))
+    reader.upsert(r, "b@example.com", b)
+    reader.sync(r)
+    assert reader.version == 4 and reader.score([0.0, 1.0]).lat.tolist() == [5.0]
+
+
+def test_restore_maps_snapshot_and_replays_later_changes(tmp_path):
+    r = DummyRedis()
+    writer = StudentIndex()
+    writer.sync(r)
+    for email, emb in (("a@example.com", [1.0, 0.0]), ("b@example.com", [0.0, 1.0])):
+        student = make_student(email, emb)
+        r.set(f"student:{email}", json.dumps(student))
+        writer.upsert(r, email, student)
+    writer.publish(str(tmp_path))
+
+    # Changed after the snapshot was taken
+    student = make_student("c@example.com", [0.6, 0.8])
+    r.set("student:c@example.com", json.dumps(student))
+    writer.upsert(r, "c@example.com", student)
+    del r.store["student:a@example.com"]
+    writer.remove(r, "a@example.com")
+
+    restarted = StudentIndex()
+    assert restarted.restore(r, r, str(tmp_path))
+    assert not restarted.readonly and restarted.version == 4
+    pool = restarted.score([1.0, 0.0])
+    assert dict(zip(pool.emails, pool.scores.tolist())) == pytest.approx(
+        {"b@example.com": 0.0, "c@example.com": 0.6}
+    )
+    # The snapshot itself is mapped copy-on-write and left untouched
+    snapshot = StudentIndex()
+    assert snapshot.attach(str(tmp_path))
+    assert sorted(snapshot.score([1.0, 0.0]).emails) == ["a@example.com", "b@example.com"]
+
+    r.store["student_index:version"] = 1
+    assert not StudentIndex().restore(r, r, str(tmp_path))
+
+
+def test_score_many_matches_single_job_scores():
+    rng = np.random.default_rng(2)
+    vectors = rng.normal(size=(10, 8)).astype(np.float32)
+    queries = rng.normal(size=(3, 8)).astype(np.float32)
+    for mode in (None, "int8"):
+        r = DummyRedis()
+        index = StudentIndex(quantization=mode)
+        index.sync(r)
+        for i, vec in enumerate(vectors):
+            index.upsert(r, f"s{i}@example.com", make_student(f"s{i}@example.com", vec.tolist()))
+
+        batch = index.score_many([q.tolist() for q in queries])
+        assert batch.scores.shape == (10, 3)
+        for j, q in enumerate(queries):
+            single = index.score(q.tolist())
+            assert np.allclose(batch.take(np.arange(10), j).scores, single.scores, atol=1e-5)
+        picked = batch.take([2, 5], 1)
+        assert picked.emails == ["s2@example.com", "s5@example.com"]
+        assert picked.scores.shape == (2,)
+
+
+def test_sharded_scoring_matches_single_thread(monkeypatch):
+    from backend.app.services import student_index as module
+
+    monkeypatch.setattr(module, "SCORE_SHARD_ROWS", 4)
+    rng = np.random.default_rng(3)
+    vectors = rng.normal(size=(30, 8)).astype(np.float32)
+    query = rng.normal(size=8).astype(np.float32)
+    for mode in (None, "int8"):
+        r = DummyRedis()
+        serial = StudentIndex(quantization=mode)
+        sharded = StudentIndex(quantization=mode, scoring_threads=3)
+        for index in (serial, sharded):
+            index.sync(r)
+            for i, vec in enumerate(vectors):
+                index._put(f"s{i}@example.com", make_student(f"s{i}@example.com", vec.tolist()))
+
+        assert np.allclose(sharded.score(query).scores, serial.score(query).scores, atol=1e-5)
+        some = {f"s{i}@example.com" for i in range(0, 30, 2)}
+        assert np.allclose(
+            sharded.score(query, emails=some).scores, serial.score(query, emails=some).scores, atol=1e-5
+        )
+        assert np.allclose(
+            sharded.score_many([query, -query]).scores, serial.score_many([query, -query]).scores, atol=1e-5
+        )
+
+
+def test_log_change_retries_when_another_writer_commits_first():
+    from backend.app.services.student_index import log_change
+
+    r = DummyRedis()
+    real_get = r.get
+
+    def racing_get(key):
+        value = real_get(key)
+        if r.get is racing_get:
+            # Another writer logs its change between our read and our commit
+            r.get = real_get
+            log_change(r, "seq", "log", "other@example.com")
+        return value
+
+    r.get = racing_get
+    assert log_change(r, "seq", "log", "me@example.com") == 2
+    assert r.store["log"] == {"other@example.com": 1, "me@example.com": 2}
+    assert r.store["seq"] == 2